@@ -13,12 +13,15 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import stats
+from leaplib import transport
+
 OPENSUSE = 'openSUSE:Leap:15.6'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class Checks(object):
     def __init__(self, project, verbose, identical):
@@ -83,6 +86,7 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
@@ -92,6 +96,7 @@ if __name__ == '__main__':
                         help='show the diff')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
@@ -1,21 +1,29 @@
 #!/usr/bin/python3
 
 import argparse
+import hashlib
+import json
 import logging
+import os
 import sys
 
 from urllib.error import HTTPError
 
 import re
-from lxml import etree as ET
 from collections import namedtuple
 
 import osc.conf
 import osc.core
-from osc.core import http_GET
 from osc.core import makeurl
 from osc import oscerr
 
+from leaplib import cache
+from leaplib import listing
+from leaplib import pool
+from leaplib import stats
+from leaplib import xmlstream
+from leaplib.transport import http_GET
+
 SUPPORTED_ARCHS = ['x86_64', 'aarch64', 'ppc64le', 's390x']
 DEFAULT_REPOSITORY = 'standard'
 
@@ -23,11 +31,12 @@ BINARY_REGEX = r'(?:.*::)?(?P<filename>(?P<name>.*)-(?P<version>[^-]+)-(?P<relea
 RPM_REGEX = BINARY_REGEX + r'\.rpm'
 
 class SLEMover(object):
-    def __init__(self, opensuse_project, sle_project, print_full):
+    def __init__(self, opensuse_project, sle_project, print_full, jobs=None):
         self.upload_project = opensuse_project
         self.opensuse_project = opensuse_project
         self.sle_project = sle_project
         self.print_full = print_full
+        self.jobs = jobs
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
         self.exceptions = ["python-numpy", "openblas", "timescaledb",
@@ -38,18 +47,52 @@ class SLEMover(object):
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
-        return packages
+    def source_state(self, project):
+        """
+        Digest of the sources of `project`, from its view=info listing.
 
-    def get_project_binary_list(self, project, repository, arch, package_binaries={}):
+        The listing is revalidated with the server every time (a 304 when
+        nothing changed), a listing cached for its TTL could hide a source
+        change behind the cached binaries.
+        """
+        digest = hashlib.sha256()
+        url = makeurl(self.apiurl, ['source', project], {'view': 'info', 'nofilename': '1'})
+        with cache.default_cache().open(url, 0) as f:
+            for si in xmlstream.iter_elements(f, 'sourceinfo'):
+                digest.update(('%s %s\n' % (si.get('package'), si.get('verifymd5') or si.get('srcmd5'))).encode('utf-8'))
+        return digest.hexdigest()
+
+    def build_state(self, project, repository, arch, source_state):
+        """
+        Key of the binaries of project/repository/arch, None while the
+        scheduler has not caught up with the repository.
+
+        Binary names change when sources change, when packages start or
+        stop building, and when a rebuild without a source change builds
+        other subpackages (conditional subpackages, a changed dependency).
+        The source digest, the per package build codes and the scheduler
+        state of the _result cover the first two and every finished
+        rebuild. A rebuild the scheduler has not noticed yet is not
+        covered, the repository is dirty then and nothing is cached.
+        """
+        digest = hashlib.sha256(('%s %s\n' % (source_state, self.print_full)).encode('utf-8'))
+        url = makeurl(self.apiurl, ['build', project, '_result'], {'repository': repository, 'arch': arch})
+        for ancestors, status in xmlstream.iter_with_ancestors(http_GET(url), 'status'):
+            if ancestors[-1].get('dirty') == 'true':
+                return None
+            digest.update(('%s %s %s\n' % (ancestors[0].get('state'), status.get('package'),
+                                           status.get('code'))).encode('utf-8'))
+        return digest.hexdigest()
+
+    def binary_cache_path(self, project, repository, arch):
+        return os.path.join(cache.cache_dir(), 'binaryversions',
+                            '%s_%s_%s.json' % (project.replace(':', '_'), repository, arch))
+
+    def get_project_binary_list(self, project, repository, arch, source_state=None):
         """
-        Returns binarylist of a project
+        Returns the binary names per package of a project for one arch
         """
 
         # Use pool repository for SUSE namespace project.
@@ -58,17 +101,28 @@ class SLEMover(object):
         if project.startswith('SUSE:'):
             repository = 'pool'
 
-        path = ['build', project, repository, arch]
-        url = makeurl(self.apiurl, path, {'view': 'binaryversions'})
-        root = ET.parse(http_GET(url)).getroot()
-
-        for binary_list in root:
+        path = self.binary_cache_path(project, repository, arch)
+        state = None
+        if source_state is not None:
+            state = self.build_state(project, repository, arch, source_state)
+        if state is not None:
+            try:
+                with open(path, 'r') as f:
+                    cached = json.load(f)
+                if cached['state'] == state:
+                    logging.debug("Binaries of %s/%s/%s unchanged" % (project, repository, arch))
+                    return cached['binaries']
+            except (OSError, ValueError, KeyError):
+                pass
+
+        url = makeurl(self.apiurl, ['build', project, repository, arch], {'view': 'binaryversions'})
+        package_binaries = {}
+        for binary_list in xmlstream.iter_children(http_GET(url)):
             package = binary_list.get('package')
             package = package.split(':', 1)[0]
-            index = package + "_" + arch
 
-            if index not in package_binaries:
-                package_binaries[index] = []
+            # dict keys dedup the names and keep them in listing order
+            names = package_binaries.setdefault(package, {})
             for binary in binary_list:
                 filename = binary.get('name')
                 result = re.match(RPM_REGEX, filename)
@@ -83,8 +137,14 @@ class SLEMover(object):
                     if result.group('name').endswith('-debugsource'):
                         continue
 
-                if result.group('name') not in package_binaries[index]:
-                    package_binaries[index].append(result.group('name'))
+                names[result.group('name')] = None
+
+        package_binaries = dict((package, list(names)) for package, names in package_binaries.items())
+        if state is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'state': state, 'binaries': package_binaries}, f)
+            os.replace(path + '.tmp', path)
 
         return package_binaries
 
@@ -93,13 +153,16 @@ class SLEMover(object):
 
         leap_pkglist = self.get_source_packages(self.opensuse_project)
         sle_pkglist = self.get_source_packages(self.sle_project, True)
-        package_binaries = {}
 
-        inter_pkglist = set(leap_pkglist) & set(sle_pkglist)
+        inter_pkglist = leap_pkglist & sle_pkglist
+
+        # Binarylist of every arch, fetched concurrently and reused from the
+        # previous run when the project did not change
+        source_state = self.source_state(self.opensuse_project)
 
-        # Inject binarylist to a list per package name no matter what archtectures was
-        for arch in SUPPORTED_ARCHS:
-            package_binaries = self.get_project_binary_list(self.opensuse_project, DEFAULT_REPOSITORY, arch, package_binaries)
+        def binary_list(arch):
+            return self.get_project_binary_list(self.opensuse_project, DEFAULT_REPOSITORY, arch, source_state)
+        package_binaries = dict(zip(SUPPORTED_ARCHS, pool.ordered_map(binary_list, SUPPORTED_ARCHS, self.jobs)))
 
         for pkg in sorted(inter_pkglist):
             # these complicate multibuild package need to go thru one by one by
@@ -108,9 +171,9 @@ class SLEMover(object):
                 continue
             print("Name: %s" % pkg)
             for arch in SUPPORTED_ARCHS:
-                if pkg + "_" + arch in package_binaries:
+                if pkg in package_binaries[arch]:
                     print("--- %s ---" % arch)
-                    print("\n".join(package_binaries[pkg + "_" + arch]))
+                    print("\n".join(package_binaries[arch][pkg]))
             print("\n")
 
 def main(args):
@@ -121,7 +184,7 @@ def main(args):
         print("Please pass --opensuse-project and --sle-project argument. See usage with --help.")
         quit()
 
-    uc = SLEMover(args.opensuse_project, args.sle_project, args.print_full)
+    uc = SLEMover(args.opensuse_project, args.sle_project, args.print_full, args.jobs)
     uc.crawl()
 
 
@@ -131,14 +194,18 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-o', '--opensuse-project', dest='opensuse_project', metavar='OPENSUSE_PROJECT',
                         help='openSUSE project on buildservice')
     parser.add_argument('-s', '--sle-project', dest='sle_project', metavar='SLE_PROJECT',
                         help='SLE project on buildservice')
     parser.add_argument('-f', '--print-full', action='store_true',
                         help='show full RPMs including src, debuginfo and debugsource')
+    parser.add_argument('-j', '--jobs', type=int, default=pool.default_jobs(),
+                        help='number of OBS queries in flight (default: %(default)s)')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     logging.basicConfig(level=logging.DEBUG if args.debug
                         else logging.INFO)
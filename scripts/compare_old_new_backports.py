@@ -3,6 +3,7 @@
 import argparse
 import logging
 import sys
+import time
 from urllib.error import HTTPError
 
 import re
@@ -13,6 +14,13 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib.pkgindex import PackageIndex
+from leaplib import stats
+from leaplib import transport
+from leaplib.snapshot import SnapshotStore
+from leaplib.snapshot import format_date
+
 OPENSUSE = 'openSUSE:Leap:15.4'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.3:Update'
 NEW_BACKPORTS = 'openSUSE:Backports:SLE-15-SP4'
@@ -20,28 +28,24 @@ OLD_BACKPORTS = 'openSUSE:Backports:SLE-15-SP3'
 SLE = 'SUSE:SLE-15-SP4:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindBP(object):
-    def __init__(self, project, verbose, identical):
+    def __init__(self, project, verbose, identical, max_age=0):
         self.project = project
         self.verbose = verbose
         self.identical = identical
+        # hours a stored snapshot may be old to be used instead of the live listing
+        self.max_age = max_age
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.store = SnapshotStore() if max_age > 0 else None
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def item_exists(self, project, package=None):
         """
@@ -73,13 +77,6 @@ class FindBP(object):
                 return True
         return False
 
-    def origin_metadata_get(self, project, package):
-        meta = ET.fromstringlist(osc.core.show_package_meta(self.apiurl, project, package))
-        if meta is not None:
-            return meta.get('project'), meta.get('name')
-
-        return None, None
-
     def is_links(self, project, package, reverse=False):
         query = {'withlinked': 1}
         u = makeurl(self.apiurl, ['source', project, package], query=query)
@@ -96,13 +93,25 @@ class FindBP(object):
                 return True
         return False
 
+    def project_packages(self, project, expand=False):
+        """
+        Return the package names of `project`, from the latest stored
+        snapshot if it is younger than max_age hours, otherwise listed on
+        OBS. Nothing is written to the snapshot store.
+        """
+        snapshot = self.store.latest(project) if self.store else None
+        if snapshot is not None and time.time() - self.store.taken(snapshot) <= self.max_age * 3600:
+            logging.info("Using the snapshot of %s taken %s" % (project, format_date(self.store.taken(snapshot))))
+            return PackageIndex(sorted(self.store.names(snapshot)))
+        return self.get_source_packages(project, expand)
+
     def crawl(self):
         """Main method"""
         # get souce packages from SLE
-        sle_pkglist = self.get_source_packages(SLE, True)
+        sle_pkglist = self.project_packages(SLE, True)
         # get souce packages from backports
-        new_bp_pkglist = self.get_source_packages(NEW_BACKPORTS)
-        old_bp_pkglist = self.get_source_packages(OLD_BACKPORTS)
+        new_bp_pkglist = self.project_packages(NEW_BACKPORTS)
+        old_bp_pkglist = self.project_packages(OLD_BACKPORTS)
         newadded_pkglist = []
         deleted_pkglist = []
 
@@ -130,7 +139,7 @@ def main(args):
     osc.conf.get_config(override_apiurl=args.apiurl)
     osc.conf.config['debug'] = args.debug
 
-    uc = FindBP(args.project, args.verbose, args.identical)
+    uc = FindBP(args.project, args.verbose, args.identical, args.max_age)
     uc.crawl()
 
 if __name__ == '__main__':
@@ -139,6 +148,7 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
@@ -146,8 +156,12 @@ if __name__ == '__main__':
                         help='show identical package')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='show the diff')
+    parser.add_argument('--max-age', type=float, default=0, metavar='HOURS',
+                        help='use stored project snapshots (python3 -m leaplib.snapshot take --names-only) '
+                             'up to this old instead of listing the projects (default: always list them)')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
@@ -17,49 +17,37 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+from leaplib.diff import DiffEngine
+from leaplib.incremental import VerdictCache
+
 OPENSUSE = 'openSUSE:Leap:15.6'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.5:Update'
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP6'
 SLE = 'SUSE:SLE-15-SP6:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindBP(object):
-    def __init__(self, project, identical):
+    def __init__(self, project, identical, incremental=False):
         self.project = project
         self.identical = identical
+        self.incremental = incremental
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.differ = DiffEngine(self.apiurl)
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def has_diff(self, project, package, target_prj, target_pkg):
-        changes_file = package + ".changes"
-        query = {'cmd': 'diff',
-                 'view': 'xml',
-                 'file': changes_file,
-                 'oproject': project,
-                 'opackage': package}
-        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
-        root = ET.parse(http_POST(u)).getroot()
-        if root:
-            # check if it has diff element
-            diffs = root.findall('files/file/diff')
-            if diffs:
-                return True
-        return False
+        return self.differ.has_diff(project, package, target_prj, target_pkg)
 
     def is_links(self, project, package, reverse=False):
         query = {'withlinked': 1}
@@ -86,19 +74,32 @@ class FindBP(object):
         weird_pkglist = []
         new_pkglist = []
 
-        for pkg in os_pkglist:
-            if pkg.startswith('patchinfo') or pkg.startswith('00'):
-                continue
-            if pkg in bp_pkglist:
-                if self.has_diff(BACKPORTS, pkg, OPENSUSE, pkg):
-                    if self.is_links(OPENSUSE, pkg):
-                        continue
-                    else:
-                        print("eval \"osc copypac -e -m 'Sync package from Backports' %s %s %s %s\"" % (BACKPORTS, pkg, OPENSUSE, pkg))
-                else:
-                    if self.identical:
-                        print("eval \"osc rdelete -m 'No need to fork this package from Backports' %s %s\"" % (OPENSUSE, pkg))
-                    pass
+        all_pairs = [(BACKPORTS, pkg, OPENSUSE, pkg) for pkg in os_pkglist
+                     if not (pkg.startswith('patchinfo') or pkg.startswith('00')) and pkg in bp_pkglist]
+        # pairs unchanged since the last run print what they printed then
+        verdicts = VerdictCache('find_bp_to_leap_identical' if self.identical else 'find_bp_to_leap',
+                                self.differ, self.incremental)
+        pairs = verdicts.unknown(all_pairs)
+
+        self.differ.prefetch(pairs)
+
+        for pair in pairs:
+            verdicts.store(pair, self.check_pair(pair[1]))
+
+        for pair in all_pairs:
+            for line in verdicts.lines(pair):
+                print(line)
+        verdicts.save()
+
+    def check_pair(self, pkg):
+        """Return the lines to print for a package in both Backports and Leap."""
+        if self.has_diff(BACKPORTS, pkg, OPENSUSE, pkg):
+            if self.is_links(OPENSUSE, pkg):
+                return []
+            return ["eval \"osc copypac -e -m 'Sync package from Backports' %s %s %s %s\"" % (BACKPORTS, pkg, OPENSUSE, pkg)]
+        if self.identical:
+            return ["eval \"osc rdelete -m 'No need to fork this package from Backports' %s %s\"" % (OPENSUSE, pkg)]
+        return []
 
 
 def main(args):
@@ -106,7 +107,7 @@ def main(args):
     osc.conf.get_config(override_apiurl=args.apiurl)
     osc.conf.config['debug'] = args.debug
 
-    uc = FindBP(args.project, args.identical)
+    uc = FindBP(args.project, args.identical, args.incremental)
     uc.crawl()
 
 if __name__ == '__main__':
@@ -115,13 +116,17 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
     parser.add_argument('-i', '--identical', action='store_true',
                         help='show identical package')
+    parser.add_argument('-I', '--incremental', action='store_true',
+                        help='only check packages changed since the last run')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
@@ -17,33 +17,34 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+from leaplib.diff import DiffEngine
+from leaplib.incremental import VerdictCache
+
 OPENSUSE = 'openSUSE:Leap:15.6'
 LEAP_NF = 'openSUSE:Leap:15.6:NonFree'
 TEST_NF = 'home:mlin7442:rebuild_fails_156:nonfree'
 FACTORY_NF = 'openSUSE:Factory:NonFree'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindNF(object):
-    def __init__(self, project, verbose):
+    def __init__(self, project, verbose, incremental=False):
         self.project = project
         self.verbose = verbose
+        self.incremental = incremental
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.differ = DiffEngine(self.apiurl)
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def item_exists(self, project, package=None):
         """
@@ -60,20 +61,7 @@ class FindNF(object):
         return True
 
     def has_diff(self, project, package, target_prj, target_pkg):
-        changes_file = package + ".changes"
-        query = {'cmd': 'diff',
-                 'view': 'xml',
-                 'file': changes_file,
-                 'oproject': project,
-                 'opackage': package}
-        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
-        root = ET.parse(http_POST(u)).getroot()
-        if root:
-            # check if it has diff element
-            diffs = root.findall('files/file/diff')
-            if diffs:
-                return True
-        return False
+        return self.differ.has_diff(project, package, target_prj, target_pkg)
 
     def origin_metadata_get(self, project, package):
         meta = ET.fromstringlist(osc.core.show_package_meta(self.apiurl, project, package))
@@ -103,18 +91,34 @@ class FindNF(object):
         leap_pkglist = self.get_source_packages(LEAP_NF)
         factory_pkglist = self.get_source_packages(FACTORY_NF)
 
+        pairs = [(FACTORY_NF, pkg, LEAP_NF, pkg) for pkg in factory_pkglist
+                 if not (pkg.startswith('patchinfo') or "." in pkg or pkg.startswith('00')) and
+                 pkg in leap_pkglist]
+        # pairs unchanged since the last run print what they printed then
+        verdicts = VerdictCache('find_nonfree_to_nonfree', self.differ, self.incremental)
+        todo = verdicts.unknown(pairs)
+
+        self.differ.prefetch(todo)
+
+        for pair in todo:
+            verdicts.store(pair, self.check_pair(pair[1]))
+
         for pkg in factory_pkglist:
             if pkg.startswith('patchinfo') or "." in pkg or pkg.startswith('00'):
                 continue
             if pkg in leap_pkglist:
-                if self.has_diff(FACTORY_NF, pkg, LEAP_NF, pkg):
-                    if self.is_links(FACTORY_NF, pkg):
-                        continue
-                    else:
-                        print("eval \"osc copypac -e -m 'Newer package in Factory NonFree' %s %s %s %s\"" % (FACTORY_NF, pkg, TEST_NF, pkg))
+                for line in verdicts.lines((FACTORY_NF, pkg, LEAP_NF, pkg)):
+                    print(line)
             else:
                 print("New package: %s" % pkg)
                 print("eval \"osc copypac -e -m 'New package in Factory NonFree' %s %s %s %s\"" % (FACTORY_NF, pkg, TEST_NF, pkg))
+        verdicts.save()
+
+    def check_pair(self, pkg):
+        """Return the lines to print for a package in both NonFree projects."""
+        if self.has_diff(FACTORY_NF, pkg, LEAP_NF, pkg) and not self.is_links(FACTORY_NF, pkg):
+            return ["eval \"osc copypac -e -m 'Newer package in Factory NonFree' %s %s %s %s\"" % (FACTORY_NF, pkg, TEST_NF, pkg)]
+        return []
 
 
 def main(args):
@@ -122,7 +126,7 @@ def main(args):
     osc.conf.get_config(override_apiurl=args.apiurl)
     osc.conf.config['debug'] = args.debug
 
-    uc = FindNF(args.project, args.verbose)
+    uc = FindNF(args.project, args.verbose, args.incremental)
     uc.crawl()
 
 if __name__ == '__main__':
@@ -131,13 +135,17 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='show the diff')
+    parser.add_argument('-I', '--incremental', action='store_true',
+                        help='only check packages changed since the last run')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
@@ -17,6 +17,10 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+
 OPENSUSE = 'openSUSE:Leap:15.5'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.4:Update'
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP5'
@@ -24,9 +28,9 @@ SLEFORK = 'openSUSE:Backports:SLE-15-SP5:SLEFork'
 SLE = 'SUSE:SLE-15-SP5:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindSLE(object):
     def __init__(self, project, verbose, check_slefork):
@@ -38,14 +42,7 @@ class FindSLE(object):
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def item_exists(self, project, package=None):
         """
@@ -144,6 +141,7 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
@@ -153,6 +151,7 @@ if __name__ == '__main__':
                         help='check SLEFork project')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
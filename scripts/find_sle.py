@@ -10,13 +10,20 @@ except ImportError:
     from urllib2 import HTTPError
 
 import re
-from xml.etree import cElementTree as ET
 
 import osc.conf
 import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import pool
+from leaplib import stats
+from leaplib import transport
+from leaplib.diff import DiffEngine
+from leaplib.incremental import VerdictCache
+from leaplib.linkgraph import LinkGraph
+
 OPENSUSE = 'openSUSE:Leap:15.6'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.5:Update'
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP6'
@@ -24,69 +31,84 @@ SLEFORK = 'openSUSE:Backports:SLE-15-SP6:SLEFork'
 SLE = 'SUSE:SLE-15-SP6:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class SLESync(object):
-    def __init__(self, project, check_slefork):
+    def __init__(self, project, check_slefork, jobs=None, incremental=False):
         self.project = project
         self.check_slefork = check_slefork
+        self.jobs = jobs
+        self.incremental = incremental
+        self.slefork_pkglist = []
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.links = LinkGraph(self.apiurl)
+        self.differ = DiffEngine(self.apiurl, jobs)
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def has_diff(self, project, package, target_prj, target_pkg):
-        changes_file = package + ".changes"
-        query = {'cmd': 'diff',
-                 'view': 'xml',
-                 'file': changes_file,
-                 'oproject': project,
-                 'opackage': package}
-        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
-        root = ET.parse(http_POST(u)).getroot()
-        if root:
-            # check if it has diff element
-            diffs = root.findall('files/file/diff')
-            if diffs:
-                return True
-        return False
-
-    def origin_metadata_get(self, project, package):
-        meta = ET.fromstringlist(osc.core.show_package_meta(self.apiurl, project, package))
-        if meta is not None:
-            return meta.get('project'), meta.get('name')
-
-        return None, None
-
-    def parse_package_link(self, project, package, reverse=False):
-        query = {'withlinked': 1}
-        u = makeurl(self.apiurl, ['source', project, package], query=query)
-        root = ET.parse(http_GET(u)).getroot()
-        links = root.findall('linkinfo/linked')
-        linkinfo = None
-        if reverse and links:
-            return True
-        if not links:
+        return self.differ.has_diff(project, package, target_prj, target_pkg)
+
+    def parse_package_link(self, project, package):
+        """
+        Return the incident package `package` links to within `project`,
+        None if it links elsewhere and False if it is no link.
+        """
+        target = self.links.link_target(project, package)
+        if target is None:
             return False
-
-        for linked in links:
-            linkinfo = linked.get('package')
-            if linked.get('project') == project and linked.get('package').startswith("%s." % package):
-                return linkinfo
-            else:
-                return None
-        return False
+        if target[0] == project and target[1].startswith("%s." % package):
+            return target[1]
+        return None
+
+    def resolve_origin(self, package):
+        """Return the origin project, origin package and link source of a SLE package."""
+        orig_prj, orig_pkg = self.links.origin(SLE, package)
+        src_pkg = self.parse_package_link(orig_prj, orig_pkg)
+        return orig_prj, orig_pkg, src_pkg
+
+    def backports_lines(self, pkg, origin):
+        """Return the copypac lines syncing pkg from SLE to Backports."""
+        orig_prj, orig_pkg, src_pkg = origin
+        lines = []
+        # python311 stack update
+        if src_pkg and (src_pkg.endswith('.30661') or src_pkg.endswith('.30963')):
+            return lines
+        if self.check_slefork and (src_pkg in self.slefork_pkglist or orig_pkg in self.slefork_pkglist):
+            return lines
+        if orig_prj != SLE:
+            if src_pkg:
+                lines.append("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
+                             (orig_prj, src_pkg, orig_prj, src_pkg, BACKPORTS, pkg))
+            if orig_prj.endswith(':GA'):
+                logging.debug("Package %s got overrided in %s %s" % (orig_pkg, BACKPORTS, pkg))
+        else:
+            lines.append("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
+                         (SLE, pkg, SLE, pkg, BACKPORTS, pkg))
+        return lines
+
+    def leap_lines(self, pkg, origin):
+        """Return the copypac lines syncing pkg from SLE to Leap."""
+        orig_prj, orig_pkg, src_pkg = origin
+        lines = []
+        if orig_prj != SLE:
+            # python311 stack update
+            if src_pkg and (src_pkg.endswith('.30661') or src_pkg.endswith('.30963')):
+                return lines
+            if src_pkg:
+                lines.append("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
+                             (orig_prj, src_pkg, orig_prj, src_pkg, OPENSUSE, pkg))
+            if orig_prj.endswith(':GA'):
+                logging.debug("Package %s got overrided in %s %s" % (orig_pkg, OPENSUSE, pkg))
+        else:
+            lines.append("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
+                         (SLE, pkg, SLE, pkg, OPENSUSE, pkg))
+        return lines
 
     def crawl(self):
         """Main method"""
@@ -95,7 +117,36 @@ class SLESync(object):
         # get souce packages from backports
         bp_pkglist = self.get_source_packages(BACKPORTS)
         os_pkglist = self.get_source_packages(OPENSUSE)
-        slefork_pkglist = self.get_source_packages(SLEFORK)
+        self.slefork_pkglist = self.get_source_packages(SLEFORK)
+
+        bp_pairs = [(SLE, pkg, BACKPORTS, pkg) for pkg in bp_pkglist
+                    if not pkg.startswith('patchinfo') and pkg in sle_pkglist]
+        os_pairs = [(SLE, pkg, OPENSUSE, pkg) for pkg in os_pkglist
+                    if not pkg.startswith('patchinfo') and pkg in sle_pkglist]
+
+        # only pairs where either side changed since the last run are
+        # evaluated, the others print what they printed then
+        verdicts = VerdictCache('find_sle_slefork' if self.check_slefork else 'find_sle',
+                                self.differ, self.incremental)
+        pairs = verdicts.unknown(bp_pairs + os_pairs)
+
+        # decide all overlapping packages in one go
+        self.differ.prefetch(pairs)
+        changed_pairs = set(pair for pair in pairs if self.has_diff(*pair))
+
+        # resolve where the changed packages come from, in bulk
+        changed = sorted(set(pair[1] for pair in changed_pairs))
+        self.links.prefetch(SLE, changed)
+        origins = dict((pkg, self.resolve_origin(pkg)) for pkg in changed)
+
+        for pair in pairs:
+            lines = []
+            if pair in changed_pairs:
+                if pair[2] == BACKPORTS:
+                    lines = self.backports_lines(pair[1], origins[pair[1]])
+                else:
+                    lines = self.leap_lines(pair[1], origins[pair[1]])
+            verdicts.store(pair, lines)
 
         # special handling for the python stack renaming, incident number 29613
         for pkg in sle_pkglist:
@@ -108,56 +159,19 @@ class SLESync(object):
                     print("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
                           (SLE, pkg, SLE, pkg, OPENSUSE, old_name))
 
-        # Backports
-        for pkg in bp_pkglist:
-            if pkg.startswith('patchinfo'):
-                continue
-            if pkg in sle_pkglist:
-                if self.has_diff(SLE, pkg, BACKPORTS, pkg):
-                    orig_prj, orig_pkg = self.origin_metadata_get(SLE, pkg)
-                    src_pkg = self.parse_package_link(orig_prj, orig_pkg)
-                    # python311 stack update
-                    if src_pkg and (src_pkg.endswith('.30661') or src_pkg.endswith('.30963')):
-                        continue
-                    if self.check_slefork and (src_pkg in slefork_pkglist or orig_pkg in slefork_pkglist):
-                        continue
-                    if orig_prj != SLE:
-                        if src_pkg:
-                            print("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
-                                    (orig_prj, src_pkg, orig_prj, src_pkg, BACKPORTS, pkg))
-                        if orig_prj.endswith(':GA'):
-                            logging.debug("Package %s got overrided in %s %s" % (orig_pkg, BACKPORTS, pkg))
-                    else:
-                        print("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
-                                (SLE, pkg, SLE, pkg, BACKPORTS, pkg))
-
-        # Leap
-        for pkg in os_pkglist:
-            if pkg.startswith('patchinfo'):
-                continue
-            if pkg in sle_pkglist:
-                if self.has_diff(SLE, pkg, OPENSUSE, pkg):
-                    orig_prj, orig_pkg = self.origin_metadata_get(SLE, pkg)
-                    if orig_prj != SLE:
-                        src_pkg = self.parse_package_link(orig_prj, orig_pkg)
-                        # python311 stack update
-                        if src_pkg and (src_pkg.endswith('.30661') or src_pkg.endswith('.30963')):
-                            continue
-                        if src_pkg:
-                            print("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
-                                    (orig_prj, src_pkg, orig_prj, src_pkg, OPENSUSE, pkg))
-                        if orig_prj.endswith(':GA'):
-                            logging.debug("Package %s got overrided in %s %s" % (orig_pkg, OPENSUSE, pkg))
-                    else:
-                        print("eval \"osc copypac -e -m 'Package update from %s/%s' %s %s %s %s\"" %
-                                (SLE, pkg, SLE, pkg, OPENSUSE, pkg))
+        # Backports, then Leap
+        for pair in bp_pairs + os_pairs:
+            for line in verdicts.lines(pair):
+                print(line)
+
+        verdicts.save()
 
 def main(args):
     # Configure OSC
     osc.conf.get_config(override_apiurl=args.apiurl)
     osc.conf.config['debug'] = args.debug
 
-    uc = SLESync(args.project, args.check_slefork)
+    uc = SLESync(args.project, args.check_slefork, args.jobs, args.incremental)
     uc.crawl()
 
 if __name__ == '__main__':
@@ -166,13 +180,19 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
     parser.add_argument('-s', '--check-slefork', action='store_true',
                         help='check SLEFork project')
+    parser.add_argument('-j', '--jobs', type=int, default=pool.default_jobs(),
+                        help='number of OBS queries in flight (default: %(default)s)')
+    parser.add_argument('-I', '--incremental', action='store_true',
+                        help='only check packages changed since the last run')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
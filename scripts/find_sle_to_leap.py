@@ -10,40 +10,42 @@ except ImportError:
     from urllib2 import HTTPError
 
 import re
-from xml.etree import cElementTree as ET
 
 import osc.conf
 import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+from leaplib.diff import DiffEngine
+from leaplib.incremental import VerdictCache
+from leaplib.linkgraph import LinkGraph
+
 OPENSUSE = 'openSUSE:Leap:15.3'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.2:Update'
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP3'
 SLE = 'SUSE:SLE-15-SP3:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindSLE(object):
-    def __init__(self, project, verbose):
+    def __init__(self, project, verbose, incremental=False):
         self.project = project
         self.verbose = verbose
+        self.incremental = incremental
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.links = LinkGraph(self.apiurl)
+        self.differ = DiffEngine(self.apiurl)
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def item_exists(self, project, package=None):
         """
@@ -60,46 +62,27 @@ class FindSLE(object):
         return True
 
     def has_diff(self, project, package, target_prj, target_pkg):
-        changes_file = package + ".changes"
-        query = {'cmd': 'diff',
-                 'view': 'xml',
-                 'file': changes_file,
-                 'oproject': project,
-                 'opackage': package}
-        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
-        root = ET.parse(http_POST(u)).getroot()
-        if root:
-            # check if it has diff element
-            diffs = root.findall('files/file/diff')
-            if diffs:
-                return True
-        return False
-
-    def origin_metadata_get(self, project, package):
-        meta = ET.fromstringlist(osc.core.show_package_meta(self.apiurl, project, package))
-        if meta is not None:
-            return meta.get('project'), meta.get('name')
-
-        return None, None
-
-    def parse_package_link(self, project, package, reverse=False):
-        query = {'withlinked': 1}
-        u = makeurl(self.apiurl, ['source', project, package], query=query)
-        root = ET.parse(http_GET(u)).getroot()
-        links = root.findall('linkinfo/linked')
-        linkinfo = None
-        if reverse and links:
-            return True
-        if not links:
-            return False
+        return self.differ.has_diff(project, package, target_prj, target_pkg)
 
-        for linked in links:
-            linkinfo = linked.get('package')
-            if linked.get('project') == project and linked.get('package').startswith("%s." % package):
-                return linkinfo
-            else:
-                return None
-        return False
+    def parse_package_link(self, project, package):
+        """
+        Return the incident package `package` links to within `project`,
+        None if it links elsewhere and False if it is no link.
+        """
+        target = self.links.link_target(project, package)
+        if target is None:
+            return False
+        if target[0] == project and target[1].startswith("%s." % package):
+            return target[1]
+        return None
+
+    def resolve_origin(self, package):
+        """Return the origin project, origin package and link source of a SLE package."""
+        orig_prj, orig_pkg = self.links.origin(SLE, package)
+        src_pkg = None
+        if orig_prj != SLE:
+            src_pkg = self.parse_package_link(orig_prj, orig_pkg)
+        return orig_prj, orig_pkg, src_pkg
 
     def crawl(self):
         """Main method"""
@@ -110,18 +93,31 @@ class FindSLE(object):
         weird_pkglist = []
         new_pkglist = []
 
-        for pkg in os_pkglist:
-            if pkg.startswith('patchinfo'):
-                continue
-            if pkg in sle_pkglist:
-                if self.has_diff(SLE, pkg, OPENSUSE, pkg):
-                    orig_prj, orig_pkg = self.origin_metadata_get(SLE, pkg)
-                    if orig_prj != SLE:
-                        src_pkg = self.parse_package_link(orig_prj, orig_pkg)
-                        if src_pkg:
-                            print("osc copypac -m 'updated package in SLE' %s %s %s %s" % (orig_prj, src_pkg, OPENSUSE, pkg))
-                    else:
-                        print("osc copypac -m 'updated package in SLE' %s %s %s %s" % (SLE, pkg, OPENSUSE, pkg))
+        all_pairs = [(SLE, pkg, OPENSUSE, pkg) for pkg in os_pkglist
+                     if not pkg.startswith('patchinfo') and pkg in sle_pkglist]
+        # pairs unchanged since the last run print what they printed then
+        verdicts = VerdictCache('find_sle_to_leap', self.differ, self.incremental)
+        pairs = verdicts.unknown(all_pairs)
+
+        self.differ.prefetch(pairs)
+
+        changed = [pair[1] for pair in pairs if self.has_diff(*pair)]
+        self.links.prefetch(SLE, changed)
+        lines = {}
+        for pkg in changed:
+            orig_prj, orig_pkg, src_pkg = self.resolve_origin(pkg)
+            if orig_prj != SLE:
+                if src_pkg:
+                    lines[pkg] = ["osc copypac -m 'updated package in SLE' %s %s %s %s" % (orig_prj, src_pkg, OPENSUSE, pkg)]
+            else:
+                lines[pkg] = ["osc copypac -m 'updated package in SLE' %s %s %s %s" % (SLE, pkg, OPENSUSE, pkg)]
+        for pair in pairs:
+            verdicts.store(pair, lines.get(pair[1], []))
+
+        for pair in all_pairs:
+            for line in verdicts.lines(pair):
+                print(line)
+        verdicts.save()
 
 
 def main(args):
@@ -129,7 +125,7 @@ def main(args):
     osc.conf.get_config(override_apiurl=args.apiurl)
     osc.conf.config['debug'] = args.debug
 
-    uc = FindSLE(args.project, args.verbose)
+    uc = FindSLE(args.project, args.verbose, args.incremental)
     uc.crawl()
 
 if __name__ == '__main__':
@@ -138,13 +134,17 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='show the diff')
+    parser.add_argument('-I', '--incremental', action='store_true',
+                        help='only check packages changed since the last run')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
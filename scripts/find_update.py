@@ -3,12 +3,6 @@
 import argparse
 import logging
 import sys
-import subprocess
-try:
-    from urllib.error import HTTPError
-except ImportError:
-    # python 2.x
-    from urllib2 import HTTPError
 
 import re
 from xml.etree import cElementTree as ET
@@ -18,6 +12,16 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import pool
+from leaplib import rpmvercmp
+from leaplib import stats
+from leaplib import throttle
+from leaplib import transport
+from leaplib.diff import DiffEngine
+from leaplib.reqindex import RequestIndex
+from leaplib.versions import VersionResolver
+
 OPENSUSE = 'openSUSE:Leap:15.6'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.6:Update'
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP7'
@@ -25,77 +29,49 @@ BACKPORTS_UPDATE = 'openSUSE:Backports:SLE-15-SP6:Update'
 SLE = 'SUSE:SLE-15-SP7:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class UpdateFinder(object):
-    def __init__(self, project, bp_only, submit):
+    def __init__(self, project, bp_only, submit, jobs=None):
         self.project = project
         self.bp_only = bp_only
         self.submit = submit
+        self.jobs = jobs
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.differ = DiffEngine(self.apiurl, jobs)
+        self.versions = VersionResolver(self.apiurl)
+        self.request_indexes = {}
 
     def get_source_packages(self, project, expand=False, deleted=False, with_project_name=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        if deleted:
-            query['deleted'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
+        packages = listing.get_source_packages(self.apiurl, project, expand=expand, deleted=deleted)
         if with_project_name:
-            packages = [[project, i.get('name')] for i in root.findall('entry')]
-        else:
-            packages = [i.get('name') for i in root.findall('entry')]
+            packages = [[project, name] for name in packages]
 
         return packages
 
+    def request_index(self, project):
+        if project not in self.request_indexes:
+            self.request_indexes.setdefault(project, RequestIndex(self.apiurl, project, ('new', 'review', 'accepted')))
+        return self.request_indexes[project]
+
     def get_request_list(self, project, package):
-        return osc.core.get_request_list(self.apiurl, project, package, req_state=('new', 'review'))
+        return self.request_index(project).find(package, ('new', 'review'))
 
     def has_package_modified(self, project, package):
-        return osc.core.get_request_list(self.apiurl, project, package, req_state=('accepted', ))
+        return self.request_index(project).find(package, ('accepted', ))
 
     def package_version(self, project, package):
-        try:
-            url = makeurl(self.apiurl, ['source', project, package, '_history'], {'limit': 1})
-            root = ET.parse(http_GET(url)).getroot()
-        except HTTPError as e:
-            if e.code == 404:
-                return False
-
-            raise e
-
-        return str(root.find('./revision/version').text)
+        return self.versions.version(project, package)
 
     def package_vercmp(self, ver1, ver2):
-        cmd = "rpmdev-vercmp %s %s" % (ver1, ver2)
-        prun = subprocess.run(cmd, shell=True, capture_output=True, encoding='utf-8')
-        vcmp = prun.stdout.strip()
-        if '>' in vcmp:
-            return 1
-        elif '<' in vcmp:
-            return -1
-        return 0
+        return rpmvercmp.evrcmp(str(ver1), str(ver2))
 
     def has_diff(self, project, package, target_prj, target_pkg):
-        changes_file = package + ".changes"
-        query = {'cmd': 'diff',
-                 'view': 'xml',
-                 'file': changes_file,
-                 'oproject': project,
-                 'opackage': package}
-        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
-        root = ET.parse(http_POST(u)).getroot()
-        if root is not None:
-            # check if it has diff element
-            diffs = root.findall('files/file/diff')
-            if diffs:
-                return True
-        return False
+        return self.differ.has_diff(project, package, target_prj, target_pkg)
 
     def parse_package_link(self, project, package, reverse=False):
         query = {'withlinked': 1}
@@ -115,14 +91,21 @@ class UpdateFinder(object):
         return False
 
     def do_check(self, project, update_project, package, sle_pkglist, deleted_pkglist, cmp_pkglist):
+        """
+        Check one package of an update project against project.
+
+        Return (update_project, target_pkg, project, package, is_new) when
+        the package is an update candidate, None otherwise. Runs in a worker
+        thread, the candidate is reported by report_candidate().
+        """
         if package.startswith('patchinfo') or package.count('.') > 1:
-            return
+            return None
         if package in sle_pkglist:
             logging.info("%s exist in SLE" % package)
 #            return
         #if package.startswith('rubygem') or package.startswith('Leap-release'):
         if package.startswith('Leap-release'):
-            return
+            return None
         target_pkg = self.parse_package_link(update_project, package)
         if package in cmp_pkglist:
             req_record = self.has_package_modified(project, package)
@@ -138,25 +121,27 @@ class UpdateFinder(object):
                     new_ver = self.package_version(update_project, target_pkg)
                     old_ver = self.package_version(project, package)
                     if self.package_vercmp(new_ver, old_ver) >= 0:
-                        if self.submit:
-                            print("Submitting %s/%s to %s/%s" %
-                                    (update_project, target_pkg, project, package))
-                            self.do_submit(update_project, target_pkg, project, package)
-                        else:
-                            #print("eval \"osc rdiff %s %s %s %s\"" %
-                            #        (update_project, target_pkg, project, package))
-                            if int(target_pkg.split('.')[1]) > 18750:
-                                print("eval \"osc sr -m '%s has different source in %s/%s' %s %s %s %s\"" %
-                                      (package, update_project, target_pkg, update_project, target_pkg, project, package))
+                        return update_project, target_pkg, project, package, False
         else:
             if target_pkg and package not in deleted_pkglist:
-                if self.submit:
-                    print("Submitting %s/%s to %s/%s" %
-                            (update_project, update_project, target_pkg, project, package))
-                    self.do_submit(update_project, target_pkg, project, package)
-                else:
-                    print("eval \"osc sr -m 'New package in %s' %s %s %s %s\"" %
-                            (update_project, update_project, target_pkg, project, package))
+                return update_project, target_pkg, project, package, True
+        return None
+
+    def report_candidate(self, update_project, target_pkg, project, package, is_new):
+        """Print or submit an update candidate found by do_check()."""
+        if self.submit:
+            print("Submitting %s/%s to %s/%s" %
+                    (update_project, target_pkg, project, package))
+            self.do_submit(update_project, target_pkg, project, package)
+        elif is_new:
+            print("eval \"osc sr -m 'New package in %s' %s %s %s %s\"" %
+                    (update_project, update_project, target_pkg, project, package))
+        else:
+            #print("eval \"osc rdiff %s %s %s %s\"" %
+            #        (update_project, target_pkg, project, package))
+            if int(target_pkg.split('.')[1]) > 18750:
+                print("eval \"osc sr -m '%s has different source in %s/%s' %s %s %s %s\"" %
+                      (package, update_project, target_pkg, update_project, target_pkg, project, package))
 
     def do_submit(self, src_project, src_package, dst_project, dst_package):
         """Create a submit request."""
@@ -164,12 +149,13 @@ class UpdateFinder(object):
         msg = "Automatically create request by update submitter. \
                This is going to update package to %s from %s. \
                Please review this change and decline it if Leap do not need it." % (dst_project, src_project)
-        res = osc.core.create_submit_request(self.apiurl,
-                                             src_project,
-                                             src_package,
-                                             dst_project,
-                                             dst_package,
-                                             message=msg)
+        res = throttle.default_limiter().call_once(osc.core.create_submit_request,
+                                                   self.apiurl,
+                                                   src_project,
+                                                   src_package,
+                                                   dst_project,
+                                                   dst_package,
+                                                   message=msg)
         return res
 
     def crawl(self):
@@ -186,22 +172,29 @@ class UpdateFinder(object):
         bp_pkglist = self.get_source_packages(BACKPORTS)
         bp_deleted_pkglist = self.get_source_packages(BACKPORTS, deleted=True)
 
+        checks = []
         if not self.bp_only:
             for pkg in os_update_pkglist:
                 if pkg[1] in bp_pkglist:
                     bp_update_pkglist.append([OPENSUSE_UPDATE, pkg[1]])
                     continue
-                self.do_check(OPENSUSE, pkg[0], pkg[1], sle_pkglist, os_deleted_pkglist, os_pkglist)
+                checks.append((OPENSUSE, pkg[0], pkg[1], sle_pkglist, os_deleted_pkglist, os_pkglist))
 
         for pkg in bp_update_pkglist:
-            self.do_check(BACKPORTS, pkg[0], pkg[1], sle_pkglist, bp_deleted_pkglist, bp_pkglist)
+            checks.append((BACKPORTS, pkg[0], pkg[1], sle_pkglist, bp_deleted_pkglist, bp_pkglist))
+
+        # the checks only query OBS, run them concurrently and report the
+        # candidates in package order
+        for candidate in pool.ordered_map(lambda check: self.do_check(*check), checks, self.jobs):
+            if candidate:
+                self.report_candidate(*candidate)
 
 def main(args):
     # Configure OSC
     osc.conf.get_config(override_apiurl=args.apiurl)
     osc.conf.config['debug'] = args.debug
 
-    uc = UpdateFinder(args.project, args.bp_only, args.submit)
+    uc = UpdateFinder(args.project, args.bp_only, args.submit, args.jobs)
     uc.crawl()
 
 if __name__ == '__main__':
@@ -210,6 +203,7 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
@@ -217,8 +211,11 @@ if __name__ == '__main__':
                         help='Check Backports project only')
     parser.add_argument('-s', '--submit', dest='submit', action='store_true',
                         help='Submit updates to Backports project')
+    parser.add_argument('-j', '--jobs', type=int, default=pool.default_jobs(),
+                        help='number of OBS queries in flight (default: %(default)s)')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
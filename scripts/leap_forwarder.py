@@ -10,7 +10,6 @@ import re
 
 import osc.conf
 import osc.core
-from osc.core import http_GET
 from osc.core import makeurl
 from osc.core import get_review_list
 from osc.core import print_comments
@@ -18,6 +17,10 @@ from osc.core import change_review_state
 from osc.core import create_submit_request
 from osc import oscerr
 
+from leaplib import stats
+from leaplib import throttle
+from leaplib.transport import http_GET
+
 REVIEW_GROUP = 'factory-staging'
 
 class RequestForwarder(object):
@@ -26,6 +29,7 @@ class RequestForwarder(object):
         self.target_project = target_project
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.limiter = throttle.default_limiter()
 
     def crawl(self):
         results = get_review_list(self.apiurl, project=self.source_project,  bygroup=REVIEW_GROUP, req_type='submit')
@@ -38,7 +42,7 @@ class RequestForwarder(object):
                 review = group_reviews[0]
                 message = 'Forward to %s - new package should\'ve submit to Backports project' % self.target_project
                 state = 'declined'
-                change_review_state(self.apiurl, result.reqid, state, by_group=review.by_group, message=message)
+                self.limiter.call(change_review_state, self.apiurl, result.reqid, state, by_group=review.by_group, message=message)
                 src_actions = result.get_actions('submit')
                 for action in src_actions:
                     src_prj = action.src_project
@@ -46,7 +50,7 @@ class RequestForwarder(object):
                     spac = action.src_package
                     tpac = action.tgt_package
                 message = ('Mirrored from OBS SR#%s\n' % result.reqid) + result.description
-                result = create_submit_request(self.apiurl, src_prj, spac, tgt_prj, tpac, message=message)
+                result = self.limiter.call_once(create_submit_request, self.apiurl, src_prj, spac, tgt_prj, tpac, message=message)
                 print('Mirrored SR to ' + result)
 
 def main(args):
@@ -68,12 +72,14 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-s', '--source-project', dest='source_project', metavar='SOURCE_PROJECT',
                         help='openSUSE project on buildservice')
     parser.add_argument('-t', '--target-project', dest='target_project', metavar='TARGET_PROJECT',
                         help='SLE project on buildservice')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     logging.basicConfig(level=logging.DEBUG if args.debug
                         else logging.INFO)
@@ -0,0 +1 @@
+"""Shared helpers for the Leap development scripts."""
@@ -0,0 +1,407 @@
+"""
+Asyncio client for the OBS API calls the scripts make.
+
+osc and urllib3 block, so with them the only way to have several
+requests in flight is one thread per request. AsyncOBS talks HTTP/1.1
+itself over asyncio streams instead: a single thread runs hundreds of
+lookups at once, a semaphore bounds how many are actually on the wire
+(the same LEAP_DEV_JOBS limit as the worker pool) and the connections
+are kept alive and reused between them.
+
+Authentication and TLS settings come from osc. osc logs in once
+(signature or basic auth, whatever the oscrc asks for) and the session
+cookie it stores is sent along; a server without sessions gets basic
+auth with the oscrc credentials. A 401 logs in again once.
+
+Reads that fail on the way, or that the server answers with 429/503,
+are retried with the Retry-After it asked for or an exponential backoff.
+Request creation is sent once, like throttle.RateLimiter.call_once does
+for the synchronous submits: a 503 from a proxy does not tell whether the
+request was created. It is paced by the limiter, which a 429/503 slows
+down before the error is raised. Every request is counted in
+leaplib.stats.
+
+    async def check(apiurl, project, packages):
+        async with AsyncOBS(apiurl) as obs:
+            return await obs.crawl(lambda package: obs.meta(project, package), packages)
+
+    metas = asyncio.run(check(apiurl, 'openSUSE:Backports:SLE-15-SP6', packages))
+"""
+
+import asyncio
+import base64
+import gzip
+import http.client
+import http.cookiejar
+import io
+import logging
+import os
+import ssl
+import time
+import urllib.request
+import zlib
+
+from urllib.error import HTTPError
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
+from xml.etree import ElementTree as ET
+
+import osc.conf
+import osc.core
+
+from leaplib import buildresult
+from leaplib import endpoints
+from leaplib import listing
+from leaplib import pool
+from leaplib import stats
+from leaplib import throttle
+from leaplib import transport
+from leaplib import xmlstream
+
+makeurl = osc.core.makeurl
+
+USER_AGENT = 'leap_development'
+# errors of a connection, as opposed to answers of the server
+CONNECTION_ERRORS = (OSError, asyncio.IncompleteReadError, http.client.HTTPException, ValueError)
+
+
+def _decode(body, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # raw deflate without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+def _backoff(attempt):
+    return min(throttle.BACKOFF_MAX, throttle.BACKOFF_BASE ** attempt)
+
+
+class AsyncOBS(object):
+    """OBS API client for one apiurl, to be used from a single event loop."""
+
+    def __init__(self, apiurl, jobs=None, retries=throttle.MAX_RETRIES, limiter=None):
+        self.apiurl = apiurl
+        parts = urlsplit(apiurl)
+        self.netloc = parts.netloc
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.options = osc.conf.config['api_host_options'].get(apiurl) or {}
+        self.ssl = self._ssl_context() if parts.scheme == 'https' else None
+        self.semaphore = asyncio.Semaphore(jobs or pool.default_jobs())
+        self.retries = retries
+        self.limiter = limiter or throttle.default_limiter()
+        # idle keep-alive connections, (reader, writer)
+        self.idle = []
+        # authentication headers, None until logged in
+        self.auth = None
+        self.login_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        idle, self.idle = self.idle, []
+        for reader, writer in idle:
+            writer.close()
+        for reader, writer in idle:
+            try:
+                await writer.wait_closed()
+            except CONNECTION_ERRORS:
+                pass
+
+    def _ssl_context(self):
+        context = ssl.create_default_context(cafile=self.options.get('cafile'),
+                                             capath=self.options.get('capath'))
+        if not self.options.get('sslcertck', True):
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    def _session_cookie(self):
+        """Return the Cookie header osc would send to the apiurl, None if it has no session."""
+        jar = http.cookiejar.LWPCookieJar(os.path.expanduser(osc.conf.config['cookiejar']))
+        try:
+            jar.load()
+        except (OSError, http.cookiejar.LoadError):
+            return None
+        request = urllib.request.Request(self.apiurl + '/')
+        jar.add_cookie_header(request)
+        return request.get_header('Cookie')
+
+    def _login(self, again=False):
+        """
+        Set the authentication headers, having osc log in if it has no
+        session yet or `again` is set because the last one expired.
+
+        This is one blocking request, _authenticate runs it in a thread.
+        """
+        cookie = None if again else self._session_cookie()
+        if cookie is None:
+            logging.debug("Logging in to %s" % self.apiurl)
+            transport.http_GET(makeurl(self.apiurl, ['about'])).close()
+            cookie = self._session_cookie()
+        if cookie is not None:
+            self.auth = {'Cookie': cookie}
+            return
+        # no sessions on this server, authenticate every request
+        user, password = self.options.get('user'), self.options.get('pass')
+        if user and password:
+            credentials = base64.b64encode(('%s:%s' % (user, password)).encode('utf-8'))
+            self.auth = {'Authorization': 'Basic %s' % credentials.decode('ascii')}
+        else:
+            self.auth = {}
+
+    async def _authenticate(self, again=False):
+        async with self.login_lock:
+            if self.auth is None or again:
+                await asyncio.get_running_loop().run_in_executor(None, self._login, again)
+
+    async def _connection(self):
+        """Return (reused, reader, writer), an idle connection if there is one."""
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof():
+                return True, reader, writer
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        stats.recorder().count('aio_connections')
+        return False, reader, writer
+
+    def _head(self, method, target, data):
+        lines = ['%s %s HTTP/1.1' % (method, target),
+                 'Host: %s' % self.netloc,
+                 'User-Agent: %s' % USER_AGENT,
+                 'Accept: application/xml',
+                 'Accept-Encoding: %s' % transport.ACCEPT_ENCODING]
+        if method in ('POST', 'PUT'):
+            if data:
+                lines.append('Content-Type: application/xml; charset=utf-8')
+            else:
+                lines.append('Content-Type: application/x-www-form-urlencoded')
+            lines.append('Content-Length: %d' % len(data or b''))
+        for name, value in sorted((self.auth or {}).items()):
+            lines.append('%s: %s' % (name, value))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _read_body(self, reader, method, status, headers):
+        """Return (body, whether the connection has to be closed)."""
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            return b'', False
+        if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            # trailers, up to the empty line
+            while (await reader.readline()).strip():
+                pass
+            return b''.join(chunks), False
+        if headers.get('Content-Length') is not None:
+            return await reader.readexactly(int(headers['Content-Length'])), False
+        return await reader.read(), True
+
+    async def _exchange(self, method, url, data):
+        """Send one request, return (status, reason, headers, body, bytes on the wire)."""
+        parts = urlsplit(url)
+        target = urlunsplit(('', '', parts.path, parts.query, ''))
+        while True:
+            reused, reader, writer = await self._connection()
+            try:
+                writer.write(self._head(method, target, data) + (data or b''))
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    # the server dropped an idle connection, take another one
+                    writer.close()
+                    if reused:
+                        continue
+                    raise http.client.RemoteDisconnected('%s closed the connection' % self.netloc)
+                version, status, reason = (line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+                block = []
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    block.append(line)
+                headers = http.client.parse_headers(io.BytesIO(b''.join(block) + b'\r\n'))
+                status = int(status)
+                body, close = await self._read_body(reader, method, status, headers)
+            except CONNECTION_ERRORS:
+                writer.close()
+                raise
+            if close or version == 'HTTP/1.0' or headers.get('Connection', '').lower() == 'close':
+                writer.close()
+            else:
+                self.idle.append((reader, writer))
+            return status, reason, headers, _decode(body, headers.get('Content-Encoding')), len(body)
+
+    async def _request(self, method, url, data=None, retry=True, limiter=None):
+        """
+        Send a request and return the body of a 2xx answer, raise
+        HTTPError for any other. `retry` false sends it only once, neither
+        connection errors nor 429/503 answers are retried.
+        """
+        endpoint = endpoints.classify(method, url)
+        attempt = 0
+        logged_in_again = False
+        while True:
+            await self._authenticate()
+            if limiter is not None:
+                while True:
+                    wait = limiter.reserve()
+                    if not wait:
+                        break
+                    await asyncio.sleep(wait)
+            try:
+                async with self.semaphore:
+                    start = time.monotonic()
+                    status, reason, headers, body, wire_size = await self._exchange(method, url, data)
+            except CONNECTION_ERRORS as e:
+                if not retry or attempt >= self.retries:
+                    raise URLError(e)
+                delay = _backoff(attempt)
+                logging.debug("%s %s failed, retrying in %.1fs: %s" % (method, url, delay, e))
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            stats.recorder().request(endpoint, time.monotonic() - start, status)
+            stats.recorder().transferred(endpoint, len(body), wire_size)
+
+            if 200 <= status < 300:
+                if limiter is not None:
+                    limiter.speed_up()
+                return body
+            error = HTTPError(url, status, reason, headers, io.BytesIO(body))
+            if status == 401 and not logged_in_again:
+                logged_in_again = True
+                await self._authenticate(again=True)
+                continue
+            if status not in throttle.RETRY_CODES:
+                raise error
+            delay = throttle.retry_after(error)
+            if delay is None:
+                delay = _backoff(attempt)
+            if not retry or attempt >= self.retries:
+                if limiter is not None:
+                    limiter.slow_down(delay)
+                raise error
+            logging.debug("%s %s got %d, retrying in %.1fs" % (method, url, status, delay))
+            attempt += 1
+            if limiter is not None:
+                # the limiter holds back every caller for the delay
+                limiter.slow_down(delay)
+            else:
+                await asyncio.sleep(delay)
+
+    async def request(self, method, path, query=None, data=None):
+        """Send a request to the API, return the body of the answer."""
+        return await self._request(method, makeurl(self.apiurl, path, query), data)
+
+    async def get_xml(self, path, query=None, method='GET'):
+        """Send a request and return the root element of the XML answer."""
+        body = await self.request(method, path, query)
+        return xmlstream.parse(io.BytesIO(body)).getroot()
+
+    async def crawl(self, func, items, return_exceptions=False):
+        """
+        Await func(item) for every item at the same time and return the
+        results in the order of `items`. The semaphore keeps the requests
+        on the wire to the jobs limit.
+        """
+        return await asyncio.gather(*[func(item) for item in items], return_exceptions=return_exceptions)
+
+    async def exists(self, project, package=None):
+        """Return whether a project or package exists."""
+        try:
+            await self.meta(project, package)
+        except HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+        return True
+
+    async def source_packages(self, project, expand=False, deleted=False):
+        """Return the package names of a project."""
+        query = {}
+        if expand:
+            query['expand'] = 1
+        if deleted:
+            query['deleted'] = 1
+        root = await self.get_xml(['source', project], query)
+        return [entry.get('name') for entry in root.findall('entry')]
+
+    async def sourceinfo(self, project, packages, query=None):
+        """Return the view=info sourceinfo elements of some packages, batches fetched at once."""
+        packages = sorted(packages)
+        batches = [dict(query or {}, view='info', nofilename='1', package=packages[i:i + listing.INFO_BATCH])
+                   for i in range(0, len(packages), listing.INFO_BATCH)]
+        roots = await self.crawl(lambda batch: self.get_xml(['source', project], batch), batches)
+        return [si for root in roots for si in root.findall('sourceinfo')]
+
+    async def meta(self, project, package=None):
+        if package:
+            return await self.get_xml(['source', project, package, '_meta'])
+        return await self.get_xml(['source', project, '_meta'])
+
+    async def linkinfo(self, project, package):
+        """Return the withlinked=1 listing of a package."""
+        return await self.get_xml(['source', project, package], {'withlinked': 1})
+
+    async def diff(self, project, package, target_prj, target_pkg, file=None):
+        """Return the cmd=diff view=xml of a package against another, of one file if given."""
+        query = {'cmd': 'diff', 'view': 'xml', 'oproject': project, 'opackage': package}
+        if file:
+            query['file'] = file
+        return await self.get_xml(['source', target_prj, target_pkg], query, method='POST')
+
+    async def history(self, project, package):
+        return await self.get_xml(['source', project, package, '_history'])
+
+    async def build_results(self, project, repository=None, arch=None):
+        """Return the rolled up buildresult.BuildResults of a project."""
+        query = {}
+        if repository:
+            query['repository'] = repository
+        if arch:
+            query['arch'] = arch
+        body = await self.request('GET', ['build', project, '_result'], query)
+        return buildresult.BuildResults.parse(io.BytesIO(body))
+
+    async def binaryversions(self, project, repository, arch):
+        return await self.get_xml(['build', project, repository, arch], {'view': 'binaryversions'})
+
+    async def search_requests(self, xpath):
+        """Return the request elements matching an xpath."""
+        root = await self.get_xml(['search', 'request'], {'match': xpath})
+        return root.findall('request')
+
+    async def create_submit(self, src_project, src_package, dst_project, dst_package, message='', rev=None):
+        """
+        Create a submit request like osc.core.create_submit_request and
+        return its id. The source revision defaults to the current one.
+        """
+        if rev is None:
+            rev = (await self.get_xml(['source', src_project, src_package])).get('rev')
+        request = ET.Element('request')
+        action = ET.SubElement(request, 'action', type='submit')
+        source = ET.SubElement(action, 'source', project=src_project, package=src_package)
+        if rev:
+            source.set('rev', rev)
+        ET.SubElement(action, 'target', project=dst_project, package=dst_package)
+        ET.SubElement(request, 'description').text = message
+        url = makeurl(self.apiurl, ['request'], {'cmd': 'create'})
+        # a request that went out may have been created, never send it twice
+        body = await self._request('POST', url, ET.tostring(request), retry=False, limiter=self.limiter)
+        return xmlstream.parse(io.BytesIO(body)).getroot().get('id')
@@ -0,0 +1,144 @@
+"""
+Benchmark the scripts against recorded OBS fixtures.
+
+Starts a replaying leaplib.mockobs server, runs each scenario as a
+subprocess pointed at it and reports wall time and the requests the run
+sent, per endpoint class. Every scenario gets its own empty cache for the
+first run; with --runs N the later runs reuse it, showing warm numbers.
+
+    python3 -m leaplib.bench -F fixtures/ --latency 0.05 find_sle freeze
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from leaplib import cache
+from leaplib import endpoints
+from leaplib import mockobs
+from leaplib import pool
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'find_sle': ['find_sle.py'],
+    'find_sle_to_leap': ['find_sle_to_leap.py'],
+    'find_bp_to_leap': ['find_bp_to_leap.py'],
+    'find_nonfree_to_nonfree': ['find_nonfree_to_nonfree.py'],
+    'find_update': ['find_update.py'],
+    'compare_old_new_backports': ['compare_old_new_backports.py'],
+    'print_copypac_fails': ['print_copypac_fails.py'],
+    'freeze': ['print_factory_updates.py', '--freeze'],
+    'list_pkgs': ['print_factory_updates.py', '--list'],
+    'send_updates': ['print_factory_updates.py', '--submit'],
+}
+
+OSCRC = """[general]
+apiurl = %(apiurl)s
+
+[%(apiurl)s]
+user = bench
+pass = bench
+allow_http = 1
+"""
+
+
+def run_scenario(server, argv, env):
+    """Run one script against `server`, return its result and request counts."""
+    server.stats.reset()
+    command = [sys.executable, os.path.join(SCRIPTS_DIR, argv[0])] + argv[1:] + ['-A', server.apiurl]
+    start = time.monotonic()
+    proc = subprocess.run(command, env=env, cwd=SCRIPTS_DIR,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    wall = time.monotonic() - start
+    if proc.returncode:
+        logging.warning("%s exited with %d:\n%s" % (' '.join(argv), proc.returncode,
+                                                     proc.stderr.decode('utf-8', 'replace')[-2000:]))
+    result = server.stats.as_dict()
+    result.update({'returncode': proc.returncode, 'wall': wall})
+    return result
+
+
+def print_results(results):
+    print('%-28s %4s %9s %8s %7s %10s  %s' % ('scenario', 'run', 'wall (s)', 'requests', 'misses', 'bytes', 'endpoints'))
+    for result in results:
+        counts = ' '.join('%s=%d' % (name, result['endpoints'][name])
+                          for name in endpoints.CLASSES if result['endpoints'][name])
+        print('%-28s %4d %9.2f %8d %7d %10d  %s' % (result['scenario'], result['run'], result['wall'],
+                                                 result['requests'], result['misses'], result['bytes'], counts))
+
+
+def main(args):
+    names = args.scenarios or sorted(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print("Unknown scenarios: %s, pick from %s" % (', '.join(unknown), ', '.join(sorted(SCENARIOS))))
+        return 1
+
+    server = mockobs.MockOBSServer(('127.0.0.1', 0), args.fixtures,
+                                   latency=args.latency, jitter=args.jitter)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    workdir = tempfile.mkdtemp(prefix='leap-bench-')
+    oscrc = os.path.join(workdir, 'oscrc')
+    with open(oscrc, 'w') as f:
+        f.write(OSCRC % {'apiurl': server.apiurl})
+
+    results = []
+    try:
+        for name in names:
+            env = dict(os.environ)
+            env['OSC_CONFIG'] = oscrc
+            env[cache.CACHE_ENV] = os.path.join(workdir, name)
+            env.pop(cache.NOCACHE_ENV, None)
+            if args.jobs:
+                env[pool.JOBS_ENV] = str(args.jobs)
+            for run in range(1, args.runs + 1):
+                result = run_scenario(server, SCENARIOS[name], env)
+                result.update({'scenario': name, 'run': run})
+                results.append(result)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0 if all(result['returncode'] == 0 for result in results) else 1
+
+
+if __name__ == '__main__':
+    description = 'Run the scripts against replayed OBS fixtures and report requests and wall time.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                        help='scenarios to run (default: all of %s)' % ', '.join(sorted(SCENARIOS)))
+    parser.add_argument('-F', '--fixtures', required=True, metavar='DIR',
+                        help='directory of fixtures recorded with leaplib.mockobs --record')
+    parser.add_argument('-l', '--latency', type=float, default=0.0,
+                        help='seconds added to every reply (default: %(default)s)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='up to this many random seconds added on top of --latency')
+    parser.add_argument('-n', '--runs', type=int, default=1,
+                        help='runs per scenario, the first one with a cold cache (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='worker pool size passed to the scripts through %s' % pool.JOBS_ENV)
+    parser.add_argument('--json', metavar='FILE', help='also write the results as JSON')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='print info useful for debuging')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug
+                        else logging.INFO)
+
+    sys.exit(main(args))
@@ -0,0 +1,133 @@
+"""
+Build results of a project with multibuild flavors rolled up.
+
+One _result document is streamed once. Every status is filed under its
+(repository, arch) and under the main package of its flavor, then each
+repository is rolled up in a single pass, so the succeeded, failed and
+partially failed packages of all arches come out of one download.
+"""
+
+import osc.core
+
+from leaplib import transport
+from leaplib import xmlstream
+
+makeurl = osc.core.makeurl
+http_GET = transport.http_GET
+
+# codes of a flavor that do not stop the main package from counting as built
+FLAVOR_OK_CODES = ('succeeded', 'excluded')
+FAILED_CODES = ('failed', 'unresolvable', 'broken')
+
+
+def main_package(package):
+    """Return the main package of a multibuild flavor such as pkg:flavor."""
+    return package.split(':', 1)[0]
+
+
+class RepositoryResult(object):
+    """Rolled up build status of one repository/arch."""
+
+    def __init__(self, repository, arch):
+        self.repository = repository
+        self.arch = arch
+        # code of every status, flavors included
+        self.codes = {}
+        # main package -> its flavors
+        self.flavors = {}
+        self.succeeded = set()
+        self.failed = set()
+        self.partially_failed = set()
+
+    def add(self, package, code):
+        self.codes[package] = code
+        main = main_package(package)
+        flavors = self.flavors.setdefault(main, [])
+        if package != main:
+            flavors.append(package)
+
+    def rollup(self):
+        """
+        Sort every main package into succeeded, failed or partially failed.
+
+        A main package succeeded when it built itself (or only exists
+        as flavors) and none of its flavors failed or is still pending;
+        as before, one that only exists as excluded flavors counts as
+        succeeded too.
+        It failed when one of its builds failed and nothing of it built,
+        and partially failed when some of it built and some failed.
+        Packages still building, disabled or excluded end up in neither.
+        """
+        self.succeeded = set()
+        self.failed = set()
+        self.partially_failed = set()
+        for main, flavors in self.flavors.items():
+            code = self.codes.get(main)
+            flavor_codes = [self.codes[flavor] for flavor in flavors]
+            if code in (None, 'succeeded') and all(c in FLAVOR_OK_CODES for c in flavor_codes):
+                self.succeeded.add(main)
+                continue
+            codes = flavor_codes + ([code] if code is not None else [])
+            if any(c in FAILED_CODES for c in codes):
+                if 'succeeded' in codes:
+                    self.partially_failed.add(main)
+                else:
+                    self.failed.add(main)
+
+
+class BuildResults(object):
+    """The RepositoryResult of every (repository, arch) of a _result."""
+
+    def __init__(self):
+        self.results = {}
+        # state of the whole resultlist, what _result?oldstate= compares to
+        self.state = None
+
+    @classmethod
+    def parse(cls, source):
+        """Build from a _result document, a file name or file object."""
+        results = cls()
+        for ancestors, status in xmlstream.iter_with_ancestors(source, 'status'):
+            results.state = ancestors[0].get('state')
+            node = ancestors[-1]
+            key = (node.get('repository'), node.get('arch'))
+            if key not in results.results:
+                results.results[key] = RepositoryResult(*key)
+            results.results[key].add(status.get('package'), status.get('code'))
+        for result in results.results.values():
+            result.rollup()
+        return results
+
+    def get(self, repository, arch):
+        """Return the RepositoryResult of repository/arch, an empty one if unknown."""
+        return self.results.get((repository, arch)) or RepositoryResult(repository, arch)
+
+    def arches(self, repository):
+        return sorted(arch for repo, arch in self.results if repo == repository)
+
+    def succeeded(self, repository, arch):
+        return self.get(repository, arch).succeeded
+
+    def failed(self, repository, arch):
+        return self.get(repository, arch).failed
+
+    def partially_failed(self, repository, arch):
+        return self.get(repository, arch).partially_failed
+
+
+def get_build_results(apiurl, project, repository=None, arch=None, oldstate=None):
+    """
+    Fetch and roll up the _result of a project, optionally narrowed down.
+
+    With `oldstate` the server holds the reply back until the results no
+    longer match that state, or its own timeout passed.
+    """
+    query = {}
+    if repository:
+        query['repository'] = repository
+    if arch:
+        query['arch'] = arch
+    if oldstate:
+        query['oldstate'] = oldstate
+    url = makeurl(apiurl, ['build', project, '_result'], query)
+    return BuildResults.parse(http_GET(url))
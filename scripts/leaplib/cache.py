@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from urllib.error import HTTPError
+
+from leaplib import stats
+from leaplib import transport
+
+# seconds a cached response is served without asking the server again
+DEFAULT_TTL = 3600
+
+# per project overrides of DEFAULT_TTL, fast moving projects get a
+# shorter lifetime
+PROJECT_TTL = {
+    'openSUSE:Factory': 1800,
+}
+
+CACHE_ENV = 'LEAP_DEV_CACHE_DIR'
+NOCACHE_ENV = 'LEAP_DEV_NOCACHE'
+
+
+def cache_dir():
+    """Return the directory the on-disk caches live in."""
+    if os.environ.get(CACHE_ENV):
+        return os.environ[CACHE_ENV]
+    base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'leap_development')
+
+
+def ttl_for(project):
+    """Return the cache lifetime of responses about `project`."""
+    return PROJECT_TTL.get(project, DEFAULT_TTL)
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of OBS GET responses.
+
+    An entry younger than its TTL is served straight from disk. An older
+    entry is revalidated with If-None-Match/If-Modified-Since, so an
+    unchanged listing costs a 304 instead of a full download.
+    """
+
+    def __init__(self, cachedir=None, enabled=None):
+        self.cachedir = os.path.join(cachedir or cache_dir(), 'http')
+        if enabled is None:
+            enabled = not os.environ.get(NOCACHE_ENV)
+        self.enabled = enabled
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cachedir, key[:2], key)
+        return base + '.data', base + '.json'
+
+    def _load_meta(self, url):
+        data_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or not os.path.exists(data_path):
+            return None
+        return meta
+
+    def _tmp(self, path):
+        # unique per writer, worker threads may fetch the same url
+        return '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+
+    def _store_meta(self, url, meta):
+        data_path, meta_path = self._paths(url)
+        tmp = self._tmp(meta_path)
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def open(self, url, ttl=DEFAULT_TTL):
+        """
+        Return a binary file object with the body of `url`.
+
+        A fresh download is streamed to disk rather than held in memory,
+        so large listings can be fed straight into iterparse.
+        """
+        if not self.enabled:
+            return transport.http_GET(url)
+
+        data_path, meta_path = self._paths(url)
+        meta = self._load_meta(url)
+        now = time.time()
+        if meta is not None and now - meta['fetched'] < ttl:
+            logging.debug("Cache hit for %s" % url)
+            stats.recorder().count('cache_hits')
+            return open(data_path, 'rb')
+
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            f = transport.http_GET(url, headers=headers)
+        except HTTPError as e:
+            if e.code == 304 and meta is not None:
+                logging.debug("Cache revalidated %s" % url)
+                stats.recorder().count('cache_revalidated')
+                meta['fetched'] = now
+                self._store_meta(url, meta)
+                return open(data_path, 'rb')
+            raise e
+
+        stats.recorder().count('cache_misses')
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        tmp = self._tmp(data_path)
+        with open(tmp, 'wb') as out:
+            shutil.copyfileobj(f, out)
+        os.replace(tmp, data_path)
+        self._store_meta(url, {
+            'url': url,
+            'fetched': now,
+            'etag': f.headers.get('ETag'),
+            'last_modified': f.headers.get('Last-Modified'),
+        })
+        return open(data_path, 'rb')
+
+    def get(self, url, ttl=DEFAULT_TTL):
+        """Return the body of `url` as bytes, from the cache when possible."""
+        with self.open(url, ttl) as f:
+            return f.read()
+
+
+_default_cache = None
+
+
+def default_cache():
+    """Return the process wide ResponseCache."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
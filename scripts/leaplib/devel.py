@@ -0,0 +1,35 @@
+import osc.core
+
+from leaplib import cache
+from leaplib import xmlstream
+
+makeurl = osc.core.makeurl
+
+# devel projects rarely move, the map may be older than other listings
+DEVEL_TTL = 6 * 3600
+
+
+def get_devel_projects(apiurl, project, ttl=DEVEL_TTL):
+    """
+    Return {package: devel project} for every package of `project`.
+
+    One package search returns the meta of the whole project, so the
+    devel project of each package is known without a request per package
+    or per devel project. Packages without a devel project are left out.
+    """
+    xpath = "@project='%s'" % project
+    url = makeurl(apiurl, ['search', 'package'], {'match': xpath})
+    devel_projects = {}
+    with cache.default_cache().open(url, ttl) as f:
+        for package in xmlstream.iter_elements(f, 'package'):
+            devel = package.find('devel')
+            if devel is not None and devel.get('project'):
+                devel_projects[package.get('name')] = devel.get('project')
+    return devel_projects
+
+
+def packages_developed_in(apiurl, project, devel_projects, ttl=DEVEL_TTL):
+    """Return the packages of `project` whose devel project is in `devel_projects`."""
+    devel_projects = set(devel_projects)
+    return set(package for package, devel_project in get_devel_projects(apiurl, project, ttl).items()
+               if devel_project in devel_projects)
@@ -0,0 +1,164 @@
+import logging
+import threading
+
+from urllib.error import HTTPError
+
+import osc.core
+
+from leaplib import cache
+from leaplib import listing
+from leaplib import pool
+from leaplib import transport
+from leaplib import xmlstream
+
+makeurl = osc.core.makeurl
+http_POST = transport.http_POST
+
+
+class DiffEngine(object):
+    """
+    Answer "does src differ from tgt" for many package pairs at once.
+
+    A pair is (project, package, target_prj, target_pkg), the same
+    arguments the scripts pass to has_diff(). Pairs are decided from the
+    checksums of one view=info listing per project; only pairs the
+    checksums can not settle are sent to the server as cmd=diff, and
+    those run concurrently.
+    """
+
+    def __init__(self, apiurl, jobs=None):
+        self.apiurl = apiurl
+        self.jobs = jobs
+        self.sourceinfo = {}
+        # project -> every package of its listing, broken ones included
+        self.packages = {}
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def get_sourceinfo(self, project):
+        """Return {package: sourceinfo attributes} of a project."""
+        # has_diff() is called from worker threads, download each listing once
+        with self.lock:
+            if project not in self.sourceinfo:
+                self.load_sourceinfo(project)
+        return self.sourceinfo[project]
+
+    def load_sourceinfo(self, project):
+        query = {'view': 'info', 'nofilename': '1', 'withchangesmd5': '1'}
+        url = makeurl(self.apiurl, ['source', project], query)
+        info = {}
+        packages = set()
+        # revalidated every time, verdicts must follow the live state
+        with cache.default_cache().open(url, 0) as f:
+            for si in xmlstream.iter_elements(f, 'sourceinfo'):
+                packages.add(si.get('package'))
+                # broken links and similar carry an error, their md5s
+                # are meaningless
+                if si.find('error') is not None:
+                    continue
+                info[si.get('package')] = dict(si.attrib)
+        self.packages[project] = packages
+        self.sourceinfo[project] = info
+
+    def exists(self, project, package):
+        """Return true if `package` is in the listing of `project`."""
+        self.get_sourceinfo(project)
+        return package in self.packages[project]
+
+    def refresh(self, project, packages):
+        """
+        Re-read the sourceinfo of some packages of a project from the
+        server, bypassing the cache, and forget the verdicts involving them.
+        The rest of the project comes from the listing already loaded.
+        """
+        packages = set(packages)
+        info = self.get_sourceinfo(project)
+        for package in packages:
+            info.pop(package, None)
+        self.packages[project] -= packages
+        for si in listing.iter_package_sourceinfo(self.apiurl, project, packages, {'withchangesmd5': '1'}):
+            self.packages[project].add(si.get('package'))
+            if si.find('error') is None:
+                info[si.get('package')] = dict(si.attrib)
+        for pair in list(self.results):
+            if (pair[0] == project and pair[1] in packages) or (pair[2] == project and pair[3] in packages):
+                del self.results[pair]
+
+    def compare_checksums(self, project, package, target_prj, target_pkg):
+        """
+        Return True or False when the checksums decide the pair, None if
+        they are ambiguous and a real diff is needed.
+        """
+        src = self.get_sourceinfo(project).get(package)
+        tgt = self.get_sourceinfo(target_prj).get(target_pkg)
+        if src is None or tgt is None:
+            return None
+        src_md5 = src.get('verifymd5') or src.get('srcmd5')
+        tgt_md5 = tgt.get('verifymd5') or tgt.get('srcmd5')
+        if src_md5 and src_md5 == tgt_md5:
+            return False
+        # has_diff() only looks at the .changes file, the sources can
+        # differ while the changelog is the same
+        if src.get('changesmd5') and tgt.get('changesmd5'):
+            return src.get('changesmd5') != tgt.get('changesmd5')
+        return None
+
+    def diff_request(self, project, package, target_prj, target_pkg):
+        """Ask the server whether the .changes of the two packages differ."""
+        changes_file = package + ".changes"
+        query = {'cmd': 'diff',
+                 'view': 'xml',
+                 'file': changes_file,
+                 'oproject': project,
+                 'opackage': package}
+        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
+        root = xmlstream.parse(http_POST(u)).getroot()
+        if root is not None:
+            # check if it has diff element
+            diffs = root.findall('files/file/diff')
+            if diffs:
+                return True
+        return False
+
+    def _try_diff_request(self, pair):
+        try:
+            return self.diff_request(*pair)
+        except HTTPError as e:
+            # leave the error to whoever asks has_diff() for this pair
+            logging.debug("Diff of %s failed: %s" % ('/'.join(pair), e))
+            return None
+
+    def prefetch(self, pairs):
+        """Decide all `pairs` and remember the verdicts."""
+        pending = {}
+        for pair in pairs:
+            pair = tuple(pair)
+            if pair in self.results or pair in pending:
+                continue
+            verdict = self.compare_checksums(*pair)
+            if verdict is None:
+                pending[pair] = None
+            else:
+                self.results[pair] = verdict
+
+        logging.debug("%d pairs need a server side diff" % len(pending))
+        if not pending:
+            return
+        for pair, verdict in zip(pending, pool.ordered_map(self._try_diff_request, pending, self.jobs)):
+            if verdict is not None:
+                self.results[pair] = verdict
+
+    def has_diff(self, project, package, target_prj, target_pkg):
+        pair = (project, package, target_prj, target_pkg)
+        if pair not in self.results:
+            verdict = self.compare_checksums(*pair)
+            if verdict is None:
+                verdict = self.diff_request(*pair)
+            self.results[pair] = verdict
+        return self.results[pair]
+
+    def differing(self, pairs):
+        """Return the pairs out of `pairs` whose sources differ."""
+        pairs = [tuple(pair) for pair in pairs]
+        self.prefetch(pairs)
+        return [pair for pair in pairs if self.has_diff(*pair)]
@@ -0,0 +1,38 @@
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+# endpoint classes requests are counted under, in reporting order
+CLASSES = ('source', 'view_info', 'diff', 'meta', 'history', 'result',
+           'binaryversions', 'build', 'request', 'search', 'other')
+
+
+def classify(method, url):
+    """Return the endpoint class of an OBS API request."""
+    parts = urlsplit(url)
+    path = [p for p in parts.path.split('/') if p]
+    query = parse_qs(parts.query)
+    view = query.get('view', [None])[0]
+    if not path:
+        return 'other'
+
+    if path[0] == 'source':
+        if query.get('cmd', [None])[0] == 'diff':
+            return 'diff'
+        if view == 'info':
+            return 'view_info'
+        if path[-1] == '_meta':
+            return 'meta'
+        if path[-1] == '_history':
+            return 'history'
+        return 'source'
+    if path[0] == 'build':
+        if path[-1] == '_result':
+            return 'result'
+        if view == 'binaryversions':
+            return 'binaryversions'
+        return 'build'
+    if path[0] == 'request' or path[:2] == ['search', 'request']:
+        return 'request'
+    if path[0] == 'search':
+        return 'search'
+    return 'other'
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+
+from leaplib import cache
+
+
+class VerdictCache(object):
+    """
+    What a finder printed for each package pair on its previous run.
+
+    A pair is (project, package, target_prj, target_pkg). Its verdict,
+    the lines the finder emitted for it (none when the pair was in sync),
+    is kept together with the srcmd5 of both sides, taken from the
+    DiffEngine's view=info listings. With `reuse` set, a pair whose sides
+    are both unchanged is not evaluated again and its old lines are
+    printed as they were. Verdicts are recorded on every run so the next
+    incremental run has something to start from.
+    """
+
+    def __init__(self, name, differ, reuse=False, cachedir=None):
+        self.differ = differ
+        self.reuse = reuse
+        self.path = os.path.join(cachedir or cache.cache_dir(), 'incremental', name + '.json')
+        self.current = {}
+        try:
+            with open(self.path, 'r') as f:
+                self.previous = json.load(f)
+        except (OSError, ValueError):
+            self.previous = {}
+
+    def key(self, pair):
+        return '/'.join(pair)
+
+    def state(self, pair):
+        """Return the srcmd5 of both sides of a pair, None if one is unknown."""
+        project, package, target_prj, target_pkg = pair
+        src = self.differ.get_sourceinfo(project).get(package)
+        tgt = self.differ.get_sourceinfo(target_prj).get(target_pkg)
+        if src is None or tgt is None:
+            return None
+        return [src.get('srcmd5'), tgt.get('srcmd5')]
+
+    def known(self, pair):
+        """Return True if the verdict of the previous run still holds for `pair`."""
+        if not self.reuse:
+            return False
+        previous = self.previous.get(self.key(pair))
+        if previous is None:
+            return False
+        state = self.state(pair)
+        if state is None or previous['state'] != state:
+            return False
+        self.current[self.key(pair)] = previous
+        return True
+
+    def unknown(self, pairs):
+        """Return the pairs that need to be evaluated on this run."""
+        pairs = [pair for pair in pairs if not self.known(pair)]
+        logging.debug("%d package pairs changed since the last run" % len(pairs))
+        return pairs
+
+    def store(self, pair, lines):
+        # a pair without a known state is kept for this run but never reused
+        self.current[self.key(pair)] = {'state': self.state(pair), 'lines': list(lines)}
+
+    def lines(self, pair):
+        verdict = self.current.get(self.key(pair))
+        return verdict['lines'] if verdict else []
+
+    def save(self):
+        """Keep the verdicts of this run, pairs that disappeared are dropped."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.current, f)
+        os.replace(self.path + '.tmp', self.path)
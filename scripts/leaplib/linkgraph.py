@@ -0,0 +1,109 @@
+import logging
+import threading
+
+import osc.core
+
+from leaplib import cache
+from leaplib import listing
+from leaplib import xmlstream
+
+makeurl = osc.core.makeurl
+
+
+class LinkGraph(object):
+    """
+    Where packages come from, answered from memory.
+
+    The origin of a package in a project with project links (e.g. which
+    :Update or :GA project a SUSE:SLE-15-SP6:GA package really lives in)
+    comes from one expanded listing of the project, the originproject of
+    its entries. Package links come from batched view=info listings of
+    the packages asked for, one request per hundred packages instead of
+    a _meta and a withlinked=1 GET for each. Link chains are followed hop
+    by hop and remembered, so the chains of thousands of packages cost a
+    handful of requests per project they pass through.
+    """
+
+    def __init__(self, apiurl):
+        self.apiurl = apiurl
+        # project -> {package: origin project}
+        self.origins = {}
+        # (project, package) -> (project, package) it links to, or None
+        self.targets = {}
+        self.chains = {}
+        self.lock = threading.RLock()
+
+    def get_origins(self, project):
+        """Return {package: origin project} of the expanded project."""
+        with self.lock:
+            if project not in self.origins:
+                origins = {}
+                url = makeurl(self.apiurl, ['source', project], {'expand': 1})
+                with cache.default_cache().open(url, cache.ttl_for(project)) as f:
+                    for entry in xmlstream.iter_elements(f, 'entry'):
+                        origins[entry.get('name')] = entry.get('originproject') or project
+                self.origins[project] = origins
+            return self.origins[project]
+
+    def origin(self, project, package):
+        """Return (project, package) the package of `project` really lives in, (None, None) if unknown."""
+        origin = self.get_origins(project).get(package)
+        if origin is None:
+            return None, None
+        return origin, package
+
+    def load(self, project, packages):
+        """Read the link targets of `packages` in `project` that are not known yet."""
+        with self.lock:
+            missing = set(package for package in packages if (project, package) not in self.targets)
+        if not missing:
+            return
+        logging.debug("%s: reading the links of %d packages" % (project, len(missing)))
+        targets = dict(((project, package), None) for package in missing)
+        for si in listing.iter_package_sourceinfo(self.apiurl, project, missing):
+            linked = si.find('linked')
+            if linked is not None:
+                targets[(project, si.get('package'))] = (linked.get('project'), linked.get('package'))
+        with self.lock:
+            self.targets.update(targets)
+
+    def prefetch(self, project, packages):
+        """Load the origins of `packages` in `project` and their whole link chains."""
+        pending = set(self.origin(project, package) for package in packages)
+        pending.discard((None, None))
+        while pending:
+            by_project = {}
+            for prj, pkg in pending:
+                by_project.setdefault(prj, []).append(pkg)
+            for prj, pkgs in sorted(by_project.items()):
+                self.load(prj, pkgs)
+            # the next hop of every chain, until all of them ended
+            pending = set(self.targets[node] for node in pending if self.targets[node] is not None)
+            pending = set(node for node in pending if node not in self.targets)
+
+    def link_target(self, project, package):
+        """Return (project, package) that a package links to, None if it is no link."""
+        node = (project, package)
+        if node not in self.targets:
+            self.load(project, [package])
+        return self.targets[node]
+
+    def chain(self, project, package):
+        """Return the link chain of a package, starting with itself."""
+        node = (project, package)
+        with self.lock:
+            if node in self.chains:
+                return self.chains[node]
+        chain = [node]
+        target = self.link_target(project, package)
+        while target is not None and target not in chain:
+            with self.lock:
+                known = self.chains.get(target)
+            if known is not None:
+                chain.extend(n for n in known if n not in chain)
+                break
+            chain.append(target)
+            target = self.link_target(*target)
+        with self.lock:
+            self.chains[node] = chain
+        return chain
@@ -0,0 +1,51 @@
+import osc.core
+
+from leaplib import cache
+from leaplib import transport
+from leaplib import xmlstream
+from leaplib.pkgindex import PackageIndex
+
+makeurl = osc.core.makeurl
+http_GET = transport.http_GET
+
+# packages asked for in one view=info request
+INFO_BATCH = 100
+
+
+def get_source_packages(apiurl, project, expand=False, deleted=False):
+    """Return the packages of a project as a PackageIndex."""
+    query = {}
+    if expand:
+        query['expand'] = 1
+    if deleted:
+        query['deleted'] = 1
+    url = makeurl(apiurl, ['source', project], query=query)
+    with cache.default_cache().open(url, cache.ttl_for(project)) as f:
+        packages = PackageIndex(xmlstream.iter_entry_names(f))
+
+    return packages
+
+
+def iter_package_sourceinfo(apiurl, project, packages, query=None):
+    """
+    Yield the view=info sourceinfo element of some packages of a project.
+
+    The packages are asked for in batches of a project wide view=info
+    rather than one request each, `query` adds parameters such as
+    withchangesmd5. Not cached, callers want the current state.
+    """
+    packages = sorted(packages)
+    for i in range(0, len(packages), INFO_BATCH):
+        batch = dict(query or {}, view='info', nofilename='1', package=packages[i:i + INFO_BATCH])
+        url = makeurl(apiurl, ['source', project], batch)
+        for si in xmlstream.iter_elements(http_GET(url), 'sourceinfo'):
+            yield si
+
+
+def get_link_srcmd5s(apiurl, project, packages):
+    """Return {package: lsrcmd5} for linked packages of a project."""
+    lsrcmd5s = {}
+    for si in iter_package_sourceinfo(apiurl, project, packages):
+        if si.get('lsrcmd5') is not None:
+            lsrcmd5s[si.get('package')] = si.get('lsrcmd5')
+    return lsrcmd5s
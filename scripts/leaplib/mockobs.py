@@ -0,0 +1,280 @@
+"""
+Local stand-in for the OBS API, for measuring the scripts offline.
+
+In record mode the server forwards every read (and cmd=diff) to a real
+OBS through osc, answers the scripts and stores each response as a
+fixture. In replay mode it serves the fixtures back, optionally with a
+per request latency, so a run can be repeated against Factory sized data
+without touching build.opensuse.org. Writes (request creation, review
+changes, _frozenlinks updates) are never forwarded; they get a canned
+success answer in both modes.
+
+    python3 -m leaplib.mockobs --record --upstream https://api.opensuse.org -F fixtures/
+    python3 -m leaplib.mockobs -F fixtures/ --latency 0.05
+
+GET /_mock/stats returns the request counts per endpoint class as JSON,
+POST /_mock/reset clears them.
+"""
+
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+
+from leaplib import endpoints
+
+DEFAULT_PORT = 8321
+
+# first id handed out for requests created against the stand-in
+FIRST_REQUEST_ID = 900000
+
+
+def fixture_key(method, path, body=b''):
+    """Key of a request: method, path, sorted query and the body digest."""
+    parts = urlsplit(path)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    key = '%s %s?%s %s' % (method, parts.path, query, hashlib.sha256(body or b'').hexdigest())
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def is_forwarded(method, path):
+    """Whether a request may be sent to the real OBS while recording."""
+    if method == 'GET':
+        return True
+    query = dict(parse_qsl(urlsplit(path).query))
+    return method == 'POST' and query.get('cmd') == 'diff'
+
+
+class FixtureStore(object):
+    """Recorded responses, one .json (status, headers) and .body per request."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key[:2], key)
+        return base + '.json', base + '.body'
+
+    def load(self, key):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        return meta, body
+
+    def store(self, key, method, path, status, headers, body):
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with open(body_path, 'wb') as f:
+            f.write(body)
+        with open(meta_path, 'w') as f:
+            json.dump({'method': method, 'path': path, 'status': status, 'headers': headers}, f)
+
+
+class Stats(object):
+    """Requests served, per endpoint class."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = dict((name, 0) for name in endpoints.CLASSES)
+            self.requests = 0
+            self.misses = 0
+            self.bytes = 0
+
+    def add(self, method, path, size, miss):
+        with self.lock:
+            self.counts[endpoints.classify(method, path)] += 1
+            self.requests += 1
+            self.bytes += size
+            if miss:
+                self.misses += 1
+
+    def as_dict(self):
+        with self.lock:
+            return {'requests': self.requests, 'misses': self.misses,
+                    'bytes': self.bytes, 'endpoints': dict(self.counts)}
+
+
+class MockOBSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug("mockobs: " + format % args)
+
+    def do_GET(self):
+        self.handle_any('GET')
+
+    def do_POST(self):
+        self.handle_any('POST')
+
+    def do_PUT(self):
+        self.handle_any('PUT')
+
+    def do_DELETE(self):
+        self.handle_any('DELETE')
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        headers = dict(headers or {})
+        headers.setdefault('Content-Type', 'application/xml; charset=utf-8')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def handle_any(self, method):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        if self.path.startswith('/_mock/'):
+            if self.path == '/_mock/reset' and method == 'POST':
+                server.stats.reset()
+            self.reply(200, json.dumps(server.stats.as_dict()).encode('utf-8'),
+                       {'Content-Type': 'application/json'})
+            return
+
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        if not is_forwarded(method, self.path):
+            status, headers, data = 200, {}, server.canned_write(method, self.path)
+            miss = False
+        else:
+            status, headers, data, miss = server.lookup(method, self.path, body)
+
+        etag = headers.get('ETag')
+        if status == 200 and etag and self.headers.get('If-None-Match') == etag:
+            status, data = 304, b''
+        if data and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            headers = dict(headers, **{'Content-Encoding': 'gzip'})
+            data = gzip.compress(data)
+        server.stats.add(method, self.path, len(data), miss)
+        self.reply(status, data, headers)
+
+
+class MockOBSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fixtures, upstream=None, latency=0.0, jitter=0.0):
+        ThreadingHTTPServer.__init__(self, address, MockOBSHandler)
+        self.store = FixtureStore(fixtures)
+        self.upstream = upstream
+        self.latency = latency
+        self.jitter = jitter
+        self.stats = Stats()
+        self.request_ids = itertools.count(FIRST_REQUEST_ID)
+
+    @property
+    def apiurl(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def canned_write(self, method, path):
+        parts = urlsplit(path)
+        query = dict(parse_qsl(parts.query))
+        if parts.path.rstrip('/') == '/request' and query.get('cmd') == 'create':
+            return ('<request id="%d"><state name="new"/></request>' % next(self.request_ids)).encode('utf-8')
+        return b'<status code="ok"><summary>Ok</summary></status>'
+
+    def lookup(self, method, path, body):
+        """Return (status, headers, body, miss) for a read."""
+        key = fixture_key(method, path, body)
+        if self.upstream:
+            status, headers, data = self.forward(method, path, body)
+            self.store.store(key, method, path, status, headers, data)
+            return status, headers, data, False
+
+        fixture = self.store.load(key)
+        if fixture is None:
+            logging.warning("No fixture for %s %s" % (method, path))
+            data = b'<status code="not_found"><summary>no fixture</summary></status>'
+            return 404, {}, data, True
+        meta, data = fixture
+        return meta['status'], meta['headers'], data, False
+
+    def forward(self, method, path, body):
+        import osc.core
+
+        url = self.upstream.rstrip('/') + path
+        try:
+            f = osc.core.http_request(method, url, data=body or None)
+            status = f.status
+        except HTTPError as e:
+            f = e
+            status = e.code
+        headers = {}
+        for name in ('Content-Type', 'ETag', 'Last-Modified'):
+            if f.headers.get(name):
+                headers[name] = f.headers.get(name)
+        return status, headers, f.read()
+
+
+def serve(args):
+    if args.record:
+        import osc.conf
+
+        osc.conf.get_config(override_apiurl=args.upstream)
+    server = MockOBSServer((args.host, args.port), args.fixtures,
+                           upstream=args.upstream if args.record else None,
+                           latency=args.latency, jitter=args.jitter)
+    logging.info("%s OBS stand-in on %s, fixtures in %s" %
+                 ('Recording' if args.record else 'Replaying', server.apiurl, args.fixtures))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats.as_dict(), indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    description = 'Local OBS API stand-in that records and replays responses.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-F', '--fixtures', required=True, metavar='DIR',
+                        help='directory the fixtures are read from or recorded to')
+    parser.add_argument('-r', '--record', action='store_true',
+                        help='forward reads to --upstream and record them')
+    parser.add_argument('-u', '--upstream', metavar='URL', default='https://api.opensuse.org',
+                        help='OBS to record from (default: %(default)s)')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: %(default)s)')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT,
+                        help='port to listen on (default: %(default)s)')
+    parser.add_argument('-l', '--latency', type=float, default=0.0,
+                        help='seconds added to every reply (default: %(default)s)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='up to this many random seconds added on top of --latency')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='print info useful for debuging')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug
+                        else logging.INFO)
+
+    sys.exit(serve(args))
@@ -0,0 +1,156 @@
+import re
+
+INCIDENT_SUFFIX = re.compile(r'\.\d+$')
+
+
+def normalize(name):
+    """
+    Return the comparable form of a package name.
+
+    Drops a maintenance incident suffix (python3-foo.29613) and folds the
+    python3- prefix of the SLE python stack into python-, so the SLE,
+    Update and Backports spellings of a package compare equal.
+    """
+    name = INCIDENT_SUFFIX.sub('', name)
+    if name.startswith('python3-'):
+        name = 'python-' + name[len('python3-'):]
+    return name
+
+
+class PackageIndex(object):
+    """
+    Package names of a project with O(1) membership.
+
+    Iterates in the order the names were added, so loops over an index
+    print in the same order loops over the old listing lists did. The set
+    operators return new indexes and keep the order of the left operand.
+    """
+
+    def __init__(self, names=()):
+        self._names = dict.fromkeys(names)
+        self._normalized = None
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __bool__(self):
+        return bool(self._names)
+
+    def __eq__(self, other):
+        if isinstance(other, PackageIndex):
+            return self._names.keys() == other._names.keys()
+        return NotImplemented
+
+    def __repr__(self):
+        return '<PackageIndex of %d packages>' % len(self._names)
+
+    def add(self, name):
+        self._names[name] = None
+        self._normalized = None
+
+    def update(self, names):
+        self._names.update(dict.fromkeys(names))
+        self._normalized = None
+
+    def discard(self, name):
+        self._names.pop(name, None)
+        self._normalized = None
+
+    def __ior__(self, names):
+        self.update(names)
+        return self
+
+    def __or__(self, other):
+        index = PackageIndex(self._names)
+        index.update(other)
+        return index
+
+    def __and__(self, other):
+        if not isinstance(other, (PackageIndex, set, frozenset, dict)):
+            other = set(other)
+        return PackageIndex(name for name in self._names if name in other)
+
+    def __sub__(self, other):
+        if not isinstance(other, (PackageIndex, set, frozenset, dict)):
+            other = set(other)
+        return PackageIndex(name for name in self._names if name not in other)
+
+    def _build_normalized(self):
+        self._normalized = {}
+        for name in self._names:
+            self._normalized.setdefault(normalize(name), []).append(name)
+
+    def lookup(self, name):
+        """Return the names in the index whose normalized form matches `name`."""
+        if self._normalized is None:
+            self._build_normalized()
+        return list(self._normalized.get(normalize(name), []))
+
+    def contains_normalized(self, name):
+        """Return true if any spelling of `name` is in the index."""
+        return bool(self.lookup(name))
+
+
+def split_incident(name):
+    """Return (base, incident) of a name.incident package, (name, None) for other names."""
+    match = INCIDENT_SUFFIX.search(name)
+    if match is None:
+        return name, None
+    return name[:match.start()], match.group()[1:]
+
+
+class IncidentIndex(object):
+    """
+    The maintenance incident packages of an :Update style project.
+
+    Parses the name.<incident> packages of a listing once and maps base
+    package -> incidents and incident -> base packages. patchinfo
+    packages are left out. Incidents are strings, as they appear in the
+    package names.
+    """
+
+    def __init__(self, names=()):
+        # (base, incident) in listing order
+        self.entries = []
+        self.by_base = {}
+        self.by_incident = {}
+        for name in names:
+            if name.startswith('patchinfo'):
+                continue
+            base, incident = split_incident(name)
+            if incident is None:
+                continue
+            self.entries.append((base, incident))
+            self.by_base.setdefault(base, []).append(incident)
+            self.by_incident.setdefault(incident, []).append(base)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def incidents(self, base):
+        """Return the incidents that released `base`."""
+        return list(self.by_base.get(base, []))
+
+    def packages(self, incidents):
+        """
+        Return the base packages released by any of `incidents`, without
+        duplicates, in the order of the listing.
+        """
+        incidents = set(incidents)
+        seen = {}
+        for base, incident in self.entries:
+            if incident in incidents:
+                seen.setdefault(base, None)
+        return list(seen)
+
+    def matching(self, candidates, incidents):
+        """Return the `candidates` released by any of `incidents`, in candidate order."""
+        incidents = set(incidents)
+        return [name for name in candidates
+                if any(incident in incidents for incident in self.by_base.get(name, ()))]
@@ -0,0 +1,403 @@
+"""
+Compact on-disk package name lists.
+
+The package lists under data/ are plain text, one name per line,
+optionally split into per-arch sections by "=== arch ===" lines as
+print_subpackage_candidate.py writes them. This module reads those and
+packs them into an indexed binary form:
+
+    magic 'PKGL', version, section count, name count, block count  (<4sHHII)
+    block offsets, one per block                                     (<I each)
+    blocks of BLOCK_SIZE names, every distinct name once, sorted:
+        first name: length, UTF-8                                    (B, bytes)
+        others: bytes shared with the previous name, suffix length,
+                suffix                                               (BB, bytes)
+    per section: name length, name, name count                       (<H, bytes, <I)
+                 bitmap over the name ids, bit set if in the section
+                 (left out when the section has every name)
+
+Names are interned, one that appears in several sections is stored once,
+and front coded: sorted package names share long prefixes, so most of a
+name is a byte saying how much of the previous one it repeats. A packed
+list is memory mapped; membership is a binary search over the first
+names of the blocks plus decoding one block, so asking whether a name is
+in a 40k list reads a few hundred bytes. Two snapshots of a list, packed
+or text, are compared by walking their sorted sections side by side, and
+the result is printed as the unified diff `diff -u` gives for the text
+form.
+
+    python3 -m leaplib.pkglist pack data/leap_ships_sle_packages leap_ships_sle_packages.pkgl
+    python3 -m leaplib.pkglist contains leap_ships_sle_packages.pkgl 0ad
+    python3 -m leaplib.pkglist diff data/subpackage_candidate_sle15_sp6 data/subpackage_candidate_sle15_sp6_20240507
+"""
+
+import argparse
+import datetime
+import difflib
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b'PKGL'
+VERSION = 2
+HEADER = struct.Struct('<4sHHII')
+UINT = struct.Struct('<I')
+USHORT = struct.Struct('<H')
+# names per front coded block, the sparse index has one entry per block
+BLOCK_SIZE = 16
+# longest name the one byte lengths can hold
+MAX_NAME = 255
+
+# section name of lists without "=== arch ===" headers
+DEFAULT_SECTION = ''
+CONTEXT = 3
+
+
+def is_packed(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_text(path):
+    """Return {section: sorted names} of a text list, sections in file order."""
+    sections = {}
+    current = None
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('=== ') and line.endswith(' ==='):
+                current = sections.setdefault(line[4:-4], set())
+                continue
+            if current is None:
+                current = sections.setdefault(DEFAULT_SECTION, set())
+            current.add(line)
+    return dict((section, sorted(names)) for section, names in sections.items())
+
+
+def text_lines(sections):
+    """Return the lines of the text form of {section: sorted names}."""
+    if list(sections) == [DEFAULT_SECTION]:
+        return list(sections[DEFAULT_SECTION])
+    lines = []
+    for section, names in sections.items():
+        lines.append('=== %s ===' % section)
+        lines.extend(names)
+        lines.extend(['', ''])
+    return lines
+
+
+def _shared(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def write(path, sections):
+    """Pack {section: names} into `path`."""
+    encoded = sorted(set(name.encode('utf-8') for names in sections.values() for name in names))
+    for name in encoded:
+        if len(name) > MAX_NAME:
+            raise ValueError('%s is longer than %d bytes' % (name.decode('utf-8'), MAX_NAME))
+    ids = dict((name, i) for i, name in enumerate(encoded))
+
+    blocks = []
+    offsets = []
+    size = 0
+    for start in range(0, len(encoded), BLOCK_SIZE):
+        block = [bytes([len(encoded[start])]), encoded[start]]
+        for previous, name in zip(encoded[start:start + BLOCK_SIZE], encoded[start + 1:start + BLOCK_SIZE]):
+            shared = _shared(previous, name)
+            block.append(bytes([shared, len(name) - shared]) + name[shared:])
+        block = b''.join(block)
+        offsets.append(size)
+        size += len(block)
+        blocks.append(block)
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sections), len(encoded), len(blocks)))
+        f.write(struct.pack('<%dI' % len(offsets), *offsets))
+        f.write(UINT.pack(size))
+        f.write(b''.join(blocks))
+        for section, names in sections.items():
+            name = section.encode('utf-8')
+            members = set(ids[n.encode('utf-8')] for n in names)
+            f.write(USHORT.pack(len(name)) + name + UINT.pack(len(members)))
+            if len(members) < len(encoded):
+                bitmap = bytearray((len(encoded) + 7) // 8)
+                for i in members:
+                    bitmap[i >> 3] |= 1 << (i & 7)
+                f.write(bytes(bitmap))
+    os.replace(path + '.tmp', path)
+
+
+class PackedList(object):
+    """A packed list, memory mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, section_count, self.count, self.block_count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a packed package list' % path)
+        self.offsets = HEADER.size
+        self.data = self.offsets + (self.block_count + 1) * UINT.size
+        # section -> (position of its bitmap, number of names), no bitmap
+        # when the section has every name
+        self.sections = {}
+        position = self.data + self._offset(self.block_count)
+        for i in range(section_count):
+            length, = USHORT.unpack_from(self.map, position)
+            name = self.map[position + USHORT.size:position + USHORT.size + length].decode('utf-8')
+            position += USHORT.size + length
+            count, = UINT.unpack_from(self.map, position)
+            position += UINT.size
+            if count < self.count:
+                self.sections[name] = (position, count)
+                position += (self.count + 7) // 8
+            else:
+                self.sections[name] = (None, count)
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _offset(self, block):
+        return UINT.unpack_from(self.map, self.offsets + block * UINT.size)[0]
+
+    def _first(self, block):
+        position = self.data + self._offset(block)
+        return self.map[position + 1:position + 1 + self.map[position]]
+
+    def _block(self, block):
+        """Yield the names of a block, encoded."""
+        position = self.data + self._offset(block)
+        end = self.data + self._offset(block + 1)
+        name = self.map[position + 1:position + 1 + self.map[position]]
+        position += 1 + len(name)
+        yield name
+        while position < end:
+            shared, length = self.map[position], self.map[position + 1]
+            name = name[:shared] + self.map[position + 2:position + 2 + length]
+            position += 2 + length
+            yield name
+
+    def _name_id(self, name):
+        """Return the id of `name` among all names, None if it is not there."""
+        encoded = name.encode('utf-8')
+        # last block whose first name is not after `encoded`
+        low, high = 0, self.block_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._first(middle) <= encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if not low:
+            return None
+        block = low - 1
+        for i, candidate in enumerate(self._block(block)):
+            if candidate == encoded:
+                return block * BLOCK_SIZE + i
+            if candidate > encoded:
+                break
+        return None
+
+    def _in_section(self, section, name_id):
+        position, count = self.sections[section]
+        return position is None or bool(self.map[position + (name_id >> 3)] & (1 << (name_id & 7)))
+
+    def contains(self, name, section=None):
+        """Return true if `name` is in `section`, or in any section if none is given."""
+        name_id = self._name_id(name)
+        if name_id is None:
+            return False
+        if section is None:
+            # every name of the list is in some section
+            return True
+        return section in self.sections and self._in_section(section, name_id)
+
+    def __contains__(self, name):
+        return self.contains(name)
+
+    def names(self, section=DEFAULT_SECTION):
+        """Yield the names of a section, sorted."""
+        name_id = 0
+        for block in range(self.block_count):
+            for name in self._block(block):
+                if self._in_section(section, name_id):
+                    yield name.decode('utf-8')
+                name_id += 1
+
+    def as_dict(self):
+        return dict((section, list(self.names(section))) for section in self.sections)
+
+
+def read(path):
+    """Return {section: sorted names} of a packed or text list."""
+    if is_packed(path):
+        with PackedList(path) as packed:
+            return packed.as_dict()
+    return read_text(path)
+
+
+def difference(old, new):
+    """
+    Yield (tag, line) of the text form of two {section: sorted names},
+    tag being ' ', '-' or '+', with the same line pairing diff would pick.
+    """
+    if list(old) != list(new):
+        # sections added, dropped or reordered, let difflib pair them
+        for line in difflib.ndiff(text_lines(old), text_lines(new)):
+            if line[0] in ' -+':
+                yield line[0], line[2:]
+        return
+
+    sectioned = list(old) != [DEFAULT_SECTION]
+    for section in old:
+        if sectioned:
+            yield ' ', '=== %s ===' % section
+        # both sides are sorted, their common names are their longest
+        # common subsequence; a run of changes lists removals first
+        a, b = old[section], new[section]
+        i = j = 0
+        removed, added = [], []
+        while i < len(a) or j < len(b):
+            if j == len(b) or (i < len(a) and a[i] < b[j]):
+                removed.append(a[i])
+                i += 1
+            elif i == len(a) or b[j] < a[i]:
+                added.append(b[j])
+                j += 1
+            else:
+                for name in removed:
+                    yield '-', name
+                for name in added:
+                    yield '+', name
+                removed, added = [], []
+                yield ' ', a[i]
+                i += 1
+                j += 1
+        for name in removed:
+            yield '-', name
+        for name in added:
+            yield '+', name
+        if sectioned:
+            yield ' ', ''
+            yield ' ', ''
+
+
+def _range(start, length):
+    if length == 1:
+        return '%d' % start
+    if not length:
+        start -= 1
+    return '%d,%d' % (start, length)
+
+
+def unified_diff(old, new, old_label='old', new_label='new', context=CONTEXT):
+    """Yield the lines of the unified diff between two {section: sorted names}."""
+    lines = list(difference(old, new))
+    changed = [i for i, (tag, line) in enumerate(lines) if tag != ' ']
+    if not changed:
+        return
+    yield '--- %s' % old_label
+    yield '+++ %s' % new_label
+
+    # hunks: changes at most 2 * context unchanged lines apart share one
+    hunks = []
+    start = changed[0]
+    end = changed[0]
+    for i in changed[1:]:
+        if i - end - 1 > 2 * context:
+            hunks.append((start, end))
+            start = i
+        end = i
+    hunks.append((start, end))
+
+    # line numbers on either side of every position
+    old_line = new_line = 1
+    numbers = []
+    for tag, line in lines:
+        numbers.append((old_line, new_line))
+        if tag != '+':
+            old_line += 1
+        if tag != '-':
+            new_line += 1
+
+    for start, end in hunks:
+        first = max(0, start - context)
+        last = min(len(lines), end + context + 1)
+        hunk = lines[first:last]
+        old_start, new_start = numbers[first]
+        old_length = sum(1 for tag, line in hunk if tag != '+')
+        new_length = sum(1 for tag, line in hunk if tag != '-')
+        yield '@@ -%s +%s @@' % (_range(old_start, old_length), _range(new_start, new_length))
+        for tag, line in hunk:
+            yield tag + line
+
+
+def file_label(path):
+    """Return `path` with its modification time, the way diff -u labels files."""
+    mtime = os.stat(path).st_mtime_ns
+    when = datetime.datetime.fromtimestamp(mtime // 10 ** 9).astimezone()
+    return '%s\t%s.%09d %s' % (path, when.strftime('%Y-%m-%d %H:%M:%S'), mtime % 10 ** 9,
+                               when.strftime('%z'))
+
+
+def main(args):
+    if args.command == 'pack':
+        write(args.output, read(args.input))
+    elif args.command == 'unpack':
+        for line in text_lines(read(args.input)):
+            print(line)
+    elif args.command == 'contains':
+        with PackedList(args.list) as packed:
+            found = [name for name in args.names if packed.contains(name, args.section)]
+        for name in found:
+            print(name)
+        return 0 if len(found) == len(args.names) else 1
+    elif args.command == 'diff':
+        lines = list(unified_diff(read(args.old), read(args.new),
+                                  file_label(args.old), file_label(args.new), args.unified))
+        for line in lines:
+            print(line)
+        return 1 if lines else 0
+
+
+if __name__ == '__main__':
+    description = 'Pack, query and compare package name lists.'
+    parser = argparse.ArgumentParser(description=description)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pack = subparsers.add_parser('pack', help='pack a text or packed list')
+    pack.add_argument('input', metavar='LIST')
+    pack.add_argument('output', metavar='PACKED')
+
+    unpack = subparsers.add_parser('unpack', help='print the text form of a list')
+    unpack.add_argument('input', metavar='LIST')
+
+    contains = subparsers.add_parser('contains', help='print which of the names are in a packed list')
+    contains.add_argument('list', metavar='PACKED')
+    contains.add_argument('names', nargs='+', metavar='NAME')
+    contains.add_argument('-s', '--section', metavar='ARCH', help='only look in this section')
+
+    diff = subparsers.add_parser('diff', help='unified diff of two lists, text or packed')
+    diff.add_argument('old', metavar='OLD')
+    diff.add_argument('new', metavar='NEW')
+    diff.add_argument('-U', '--unified', type=int, default=CONTEXT, metavar='NUM',
+                      help='lines of context (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    sys.exit(main(args))
@@ -0,0 +1,36 @@
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+# number of OBS queries allowed in flight at the same time
+DEFAULT_JOBS = 8
+JOBS_ENV = 'LEAP_DEV_JOBS'
+
+
+def default_jobs():
+    """Return the in-flight limit, LEAP_DEV_JOBS overrides DEFAULT_JOBS."""
+    try:
+        return max(1, int(os.environ.get(JOBS_ENV, DEFAULT_JOBS)))
+    except ValueError:
+        return DEFAULT_JOBS
+
+
+def ordered_map(func, items, jobs=None):
+    """
+    Call `func` on every item with at most `jobs` calls in flight.
+
+    Results are yielded in the order of `items`, no matter in which order
+    the calls finish, so whatever the caller prints stays deterministic.
+    An exception raised by `func` is re-raised when its result is reached.
+    """
+    items = list(items)
+    if jobs is None:
+        jobs = default_jobs()
+    if jobs <= 1 or len(items) <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+        for result in executor.map(func, items):
+            yield result
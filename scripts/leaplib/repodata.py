@@ -0,0 +1,127 @@
+"""
+Streaming reader of rpm-md repository metadata.
+
+The primary.xml of a repository is parsed package by package straight
+out of its .gz, .xz or .zst file, every package is dropped once its name,
+arch and version are taken, so memory stays flat however big the
+repository is. A repository is a base URL, a local directory with a
+repodata/ subdirectory or a primary.xml file. Downloaded primary files
+are kept in the cache directory under their checksummed name, a
+repository that did not change is not downloaded again.
+"""
+
+import gzip
+import logging
+import lzma
+import os
+import shutil
+import subprocess
+import urllib.request
+
+from xml.etree import ElementTree as ET
+
+from leaplib import cache
+from leaplib import xmlstream
+
+REPO_NS = '{http://linux.duke.edu/metadata/repo}'
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+
+
+def _is_url(location):
+    return location.startswith(('http://', 'https://', 'ftp://'))
+
+
+def _join(location, path):
+    if _is_url(location):
+        return location.rstrip('/') + '/' + path
+    return os.path.join(location, path)
+
+
+def _open_location(location):
+    if _is_url(location):
+        return urllib.request.urlopen(location)
+    return open(location, 'rb')
+
+
+def primary_location(repo):
+    """
+    Return where the primary.xml of a repository is and its checksum, as
+    listed in the repomd.xml.
+    """
+    with _open_location(_join(repo, 'repodata/repomd.xml')) as f:
+        root = ET.parse(f).getroot()
+    for data in root.findall(REPO_NS + 'data'):
+        if data.get('type') == 'primary':
+            return _join(repo, data.find(REPO_NS + 'location').get('href')), data.findtext(REPO_NS + 'checksum')
+    raise ValueError('%s has no primary metadata' % repo)
+
+
+def fetch(url, checksum):
+    """Return the local copy of a remote metadata file, downloading it if needed."""
+    name = os.path.basename(url)
+    if checksum and checksum not in name:
+        name = '%s-%s' % (checksum, name)
+    path = os.path.join(cache.cache_dir(), 'repodata', name)
+    if os.path.exists(path):
+        logging.debug("Using cached %s" % path)
+        return path
+    logging.debug("Downloading %s" % url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with urllib.request.urlopen(url) as f, open(path + '.tmp', 'wb') as out:
+        shutil.copyfileobj(f, out)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def _open_zstd(path):
+    try:
+        import zstandard
+    except ImportError:
+        # no python binding, let the zstd tool decompress
+        process = subprocess.Popen(['zstd', '-dc', path], stdout=subprocess.PIPE)
+        return process.stdout
+    return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+
+def open_metadata(path):
+    """Return a binary file object with the decompressed content of a metadata file."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.xz'):
+        return lzma.open(path, 'rb')
+    if path.endswith('.zst'):
+        return _open_zstd(path)
+    return open(path, 'rb')
+
+
+def open_primary(repo):
+    """Return the decompressed primary.xml of a repository, a directory or a file."""
+    if not _is_url(repo) and os.path.isfile(repo):
+        return open_metadata(repo)
+    location, checksum = primary_location(repo)
+    if _is_url(location):
+        location = fetch(location, checksum)
+    return open_metadata(location)
+
+
+def iter_packages(source):
+    """Yield (name, arch, epoch, version, release) of every package of a primary.xml."""
+    for package in xmlstream.iter_elements(source, COMMON_NS + 'package'):
+        version = package.find(COMMON_NS + 'version')
+        yield (package.findtext(COMMON_NS + 'name'), package.findtext(COMMON_NS + 'arch'),
+               version.get('epoch'), version.get('ver'), version.get('rel'))
+
+
+def names_by_arch(repo, skip=None):
+    """
+    Return {arch: set of package names} of a repository, in the order the
+    arches first appear. Packages for which skip(name, arch, epoch,
+    version, release) is true are left out.
+    """
+    names = {}
+    with open_primary(repo) as f:
+        for package in iter_packages(f):
+            if skip is not None and skip(*package):
+                continue
+            names.setdefault(package[1], set()).add(package[0])
+    return names
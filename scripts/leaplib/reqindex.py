@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import threading
+
+import osc.core
+
+from leaplib import cache
+from leaplib import transport
+from leaplib import xmlstream
+from leaplib.pkgindex import PackageIndex
+
+makeurl = osc.core.makeurl
+http_GET = transport.http_GET
+
+OPEN_STATES = ('new', 'review')
+# states a request does not leave any more; all others can still change,
+# e.g. a declined request can be reopened or superseded
+FINAL_STATES = ('accepted', 'superseded', 'deleted')
+NONFINAL_STATES = ('new', 'review', 'declined', 'revoked')
+
+# request ids asked for in one search query when refreshing states
+ID_BATCH = 50
+
+
+class RequestIndex(object):
+    """
+    The requests targeting one project, indexed in memory.
+
+    `states` are the states the caller is going to ask find() about. The
+    first load fetches the requests towards the project in those states,
+    and in every state a request can still leave, and keeps them on disk.
+    Later loads ask for the requests newer than the highest known id and
+    for the current state of every known request that is not final yet,
+    so a declined request that got reopened or superseded is not reported
+    as declined forever. "Is there a pending or declined request for X"
+    never goes to the server per package.
+    """
+
+    def __init__(self, apiurl, project, states=OPEN_STATES, cachedir=None):
+        self.apiurl = apiurl
+        self.project = project
+        self.states = tuple(states)
+        self.loaded_states = tuple(sorted(set(self.states) | set(NONFINAL_STATES)))
+        # final states differ between callers, so do their caches
+        final = sorted(set(self.states) & set(FINAL_STATES))
+        name = '_'.join([project.replace(':', '_')] + final) + '.json'
+        self.path = os.path.join(cachedir or cache.cache_dir(), 'requests', name)
+        self.requests = {}
+        self.last_id = 0
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.by_package = {}
+        self.by_source_project = {}
+        self.by_state = {}
+
+    def _search(self, xpath):
+        url = makeurl(self.apiurl, ['search', 'request'], {'match': xpath})
+        for request in xmlstream.iter_elements(http_GET(url), 'request'):
+            yield self.parse_request(request)
+
+    def parse_request(self, request):
+        state = request.find('state')
+        actions = []
+        for action in request.findall('action'):
+            source = action.find('source')
+            target = action.find('target')
+            actions.append({
+                'type': action.get('type'),
+                'source_project': source.get('project') if source is not None else None,
+                'source_package': source.get('package') if source is not None else None,
+                'target_project': target.get('project') if target is not None else None,
+                'target_package': target.get('package') if target is not None else None,
+            })
+        return {
+            'id': int(request.get('id')),
+            'state': state.get('name') if state is not None else None,
+            'actions': actions,
+        }
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.last_id = data['last_id']
+        self.requests = dict((r['id'], r) for r in data['requests'])
+
+    def _keep(self, request):
+        return request['state'] in self.loaded_states
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'last_id': self.last_id, 'requests': list(self.requests.values())}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def refresh(self):
+        """Bring the index up to date with the server."""
+        self._read()
+        target = "action/target/@project='%s'" % self.project
+        states = ' or '.join("state/@name='%s'" % state for state in self.loaded_states)
+
+        changing = sorted(r['id'] for r in self.requests.values() if r['state'] not in FINAL_STATES)
+        if self.last_id:
+            xpath = "%s and (%s) and @id>%d" % (target, states, self.last_id)
+        else:
+            xpath = "%s and (%s)" % (target, states)
+        fetched = list(self._search(xpath))
+        logging.debug("%d new requests towards %s" % (len(fetched), self.project))
+        for request in fetched:
+            self.last_id = max(self.last_id, request['id'])
+
+        # requests that were not final last time may have moved on since
+        for i in range(0, len(changing), ID_BATCH):
+            ids = ' or '.join('@id=%d' % rid for rid in changing[i:i + ID_BATCH])
+            fetched.extend(self._search('%s and (%s)' % (target, ids)))
+
+        for request in fetched:
+            if self._keep(request):
+                self.requests[request['id']] = request
+            else:
+                self.requests.pop(request['id'], None)
+
+        self._build()
+        self.loaded = True
+        self.save()
+
+    def _build(self):
+        self.by_package = {}
+        self.by_source_project = {}
+        self.by_state = {}
+        for request in self.requests.values():
+            self.by_state.setdefault(request['state'], set()).add(request['id'])
+            for action in request['actions']:
+                if action['target_project'] != self.project:
+                    continue
+                if action['target_package']:
+                    self.by_package.setdefault(action['target_package'], set()).add(request['id'])
+                if action['source_project']:
+                    self.by_source_project.setdefault(action['source_project'], set()).add(request['id'])
+
+    def _ensure_loaded(self):
+        with self.lock:
+            if not self.loaded:
+                self.refresh()
+
+    def find(self, package=None, states=None, source_project=None):
+        """Return the requests matching all given criteria, oldest first."""
+        if states is not None and not set(states) <= set(self.loaded_states):
+            raise ValueError('%s requests are not loaded, only %s' % ('/'.join(states), '/'.join(self.loaded_states)))
+        self._ensure_loaded()
+        ids = None
+        if package is not None:
+            ids = set(self.by_package.get(package, ()))
+        if source_project is not None:
+            matches = self.by_source_project.get(source_project, set())
+            ids = set(matches) if ids is None else ids & matches
+        if states is not None:
+            matches = set()
+            for state in states:
+                matches |= self.by_state.get(state, set())
+            ids = matches if ids is None else ids & matches
+        if ids is None:
+            ids = self.requests.keys()
+        return [self.requests[rid] for rid in sorted(ids)]
+
+    def has_pending(self, package):
+        return bool(self.find(package, OPEN_STATES))
+
+    def has_pending_or_declined(self, package):
+        return bool(self.find(package, OPEN_STATES + ('declined',)))
+
+    def target_packages(self, states):
+        """Return the target packages of requests in `states`."""
+        packages = PackageIndex()
+        for request in self.find(states=states):
+            for action in request['actions']:
+                if action['target_project'] == self.project and action['target_package']:
+                    packages.add(action['target_package'])
+        return packages
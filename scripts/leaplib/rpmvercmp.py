@@ -0,0 +1,267 @@
+"""
+Pure Python RPM version comparison.
+
+Follows rpmvercmp() and the EVR handling of librpm, including the tilde
+(sorts before anything) and caret (sorts after the base version but before
+any further version segment) separators. Run this module to check it
+against the rpmvercmp test vectors shipped with rpm.
+"""
+
+import functools
+import re
+import sys
+
+SEGMENT_REGEX = re.compile(r'[0-9]+|[a-zA-Z]+|~|\^')
+EVR_REGEX = re.compile(r'^(?:(?P<epoch>\d*):)?(?P<version>[^-]*)(?:-(?P<release>.*))?$')
+
+
+@functools.lru_cache(maxsize=None)
+def parse_version(version):
+    """
+    Split a version string into its comparable segments.
+
+    Separators other than ~ and ^ are dropped, numeric segments become
+    (0, stripped digits) and alphabetic ones (1, letters).
+    """
+    segments = []
+    for segment in SEGMENT_REGEX.findall(version):
+        if segment in ('~', '^'):
+            segments.append(segment)
+        elif segment[0].isdigit():
+            segments.append((0, segment.lstrip('0')))
+        else:
+            segments.append((1, segment))
+    return tuple(segments)
+
+
+def compare_segments(one, two):
+    """rpmvercmp() on the output of parse_version()."""
+    if one == two:
+        return 0
+    i = 0
+    j = 0
+    while i < len(one) or j < len(two):
+        a = one[i] if i < len(one) else None
+        b = two[j] if j < len(two) else None
+
+        # tilde sorts before everything, even the end of the string
+        if a == '~' or b == '~':
+            if a != '~':
+                return 1
+            if b != '~':
+                return -1
+            i += 1
+            j += 1
+            continue
+
+        # caret sorts after the end of the string but before anything else
+        if a == '^' or b == '^':
+            if a is None:
+                return -1
+            if b is None:
+                return 1
+            if a != '^':
+                return 1
+            if b != '^':
+                return -1
+            i += 1
+            j += 1
+            continue
+
+        if a is None or b is None:
+            break
+
+        # numeric segments are newer than alphabetic ones
+        if a[0] != b[0]:
+            return 1 if a[0] == 0 else -1
+        if a[0] == 0 and len(a[1]) != len(b[1]):
+            return 1 if len(a[1]) > len(b[1]) else -1
+        if a[1] != b[1]:
+            return 1 if a[1] > b[1] else -1
+        i += 1
+        j += 1
+
+    if i >= len(one) and j >= len(two):
+        return 0
+    return -1 if i >= len(one) else 1
+
+
+def vercmp(one, two):
+    """Compare two version (or release) strings like rpmvercmp()."""
+    if one == two:
+        return 0
+    return compare_segments(parse_version(one), parse_version(two))
+
+
+@functools.lru_cache(maxsize=None)
+def parse_evr(evr):
+    """Return (epoch, version segments, release segments) of an [E:]V[-R] string."""
+    match = EVR_REGEX.match(evr)
+    epoch = match.group('epoch')
+    release = match.group('release')
+    return (int(epoch) if epoch else 0,
+            parse_version(match.group('version')),
+            parse_version(release) if release is not None else None)
+
+
+def compare_parsed_evr(one, two):
+    if one[0] != two[0]:
+        return 1 if one[0] > two[0] else -1
+    rc = compare_segments(one[1], two[1])
+    if rc:
+        return rc
+    # like rpmverCmp(), a missing release matches any release
+    if not one[2] or not two[2]:
+        return 0
+    return compare_segments(one[2], two[2])
+
+
+def evrcmp(one, two):
+    """Compare two [epoch:]version[-release] strings, returns -1, 0 or 1."""
+    if one == two:
+        return 0
+    return compare_parsed_evr(parse_evr(one), parse_evr(two))
+
+
+def evr_key(evr):
+    """Sort key for EVR strings, e.g. sorted(evrs, key=evr_key)."""
+    return _EVRKey(parse_evr(evr))
+
+
+def sort_evrs(evrs, reverse=False):
+    """Return the EVR strings sorted from oldest to newest."""
+    return sorted(evrs, key=evr_key, reverse=reverse)
+
+
+@functools.total_ordering
+class _EVRKey(object):
+    __slots__ = ('evr',)
+
+    def __init__(self, evr):
+        self.evr = evr
+
+    def __eq__(self, other):
+        return compare_parsed_evr(self.evr, other.evr) == 0
+
+    def __lt__(self, other):
+        return compare_parsed_evr(self.evr, other.evr) < 0
+
+
+# (a, b, expected rpmvercmp(a, b)) from rpm's tests/rpmvercmp.at
+RPMVERCMP_VECTORS = [
+    ('1.0', '1.0', 0),
+    ('1.0', '2.0', -1),
+    ('2.0', '1.0', 1),
+    ('2.0.1', '2.0.1', 0),
+    ('2.0', '2.0.1', -1),
+    ('2.0.1', '2.0', 1),
+    ('2.0.1a', '2.0.1a', 0),
+    ('2.0.1a', '2.0.1', 1),
+    ('2.0.1', '2.0.1a', -1),
+    ('5.5p1', '5.5p1', 0),
+    ('5.5p1', '5.5p2', -1),
+    ('5.5p2', '5.5p1', 1),
+    ('5.5p10', '5.5p10', 0),
+    ('5.5p1', '5.5p10', -1),
+    ('5.5p10', '5.5p1', 1),
+    ('10xyz', '10.1xyz', -1),
+    ('10.1xyz', '10xyz', 1),
+    ('xyz10', 'xyz10', 0),
+    ('xyz10', 'xyz10.1', -1),
+    ('xyz10.1', 'xyz10', 1),
+    ('xyz.4', 'xyz.4', 0),
+    ('xyz.4', '8', -1),
+    ('8', 'xyz.4', 1),
+    ('xyz.4', '2', -1),
+    ('2', 'xyz.4', 1),
+    ('5.5p2', '5.6p1', -1),
+    ('5.6p1', '5.5p2', 1),
+    ('5.6p1', '6.5p1', -1),
+    ('6.5p1', '5.6p1', 1),
+    ('6.0.rc1', '6.0', 1),
+    ('6.0', '6.0.rc1', -1),
+    ('10b2', '10a1', 1),
+    ('10a2', '10b2', -1),
+    ('1.0aa', '1.0aa', 0),
+    ('1.0a', '1.0aa', -1),
+    ('1.0aa', '1.0a', 1),
+    ('10.0001', '10.0001', 0),
+    ('10.0001', '10.1', 0),
+    ('10.1', '10.0001', 0),
+    ('10.0001', '10.0039', -1),
+    ('10.0039', '10.0001', 1),
+    ('4.999.9', '5.0', -1),
+    ('5.0', '4.999.9', 1),
+    ('20101121', '20101121', 0),
+    ('20101121', '20101122', -1),
+    ('20101122', '20101121', 1),
+    ('2_0', '2_0', 0),
+    ('2.0', '2_0', 0),
+    ('2_0', '2.0', 0),
+    ('a', 'a', 0),
+    ('a+', 'a+', 0),
+    ('a+', 'a_', 0),
+    ('a_', 'a+', 0),
+    ('+a', '+a', 0),
+    ('+a', '_a', 0),
+    ('_a', '+a', 0),
+    ('+_', '+_', 0),
+    ('_+', '+_', 0),
+    ('_+', '_+', 0),
+    ('+', '_', 0),
+    ('_', '+', 0),
+    ('1.0~rc1', '1.0~rc1', 0),
+    ('1.0~rc1', '1.0', -1),
+    ('1.0', '1.0~rc1', 1),
+    ('1.0~rc1', '1.0~rc2', -1),
+    ('1.0~rc2', '1.0~rc1', 1),
+    ('1.0~rc1~git123', '1.0~rc1~git123', 0),
+    ('1.0~rc1~git123', '1.0~rc1', -1),
+    ('1.0~rc1', '1.0~rc1~git123', 1),
+    ('1.0^', '1.0^', 0),
+    ('1.0^', '1.0', 1),
+    ('1.0', '1.0^', -1),
+    ('1.0^git1', '1.0^git1', 0),
+    ('1.0^git1', '1.0', 1),
+    ('1.0', '1.0^git1', -1),
+    ('1.0^git1', '1.0^git2', -1),
+    ('1.0^git2', '1.0^git1', 1),
+    ('1.0^git1', '1.01', -1),
+    ('1.01', '1.0^git1', 1),
+    ('1.0^20160101', '1.0^20160101', 0),
+    ('1.0^20160101', '1.0.1', -1),
+    ('1.0.1', '1.0^20160101', 1),
+    ('1.0^20160101^git1', '1.0^20160101^git1', 0),
+    ('1.0^20160102', '1.0^20160101^git1', 1),
+    ('1.0^20160101^git1', '1.0^20160102', -1),
+    ('1.0~rc1^git1', '1.0~rc1^git1', 0),
+    ('1.0~rc1^git1', '1.0~rc1', 1),
+    ('1.0~rc1', '1.0~rc1^git1', -1),
+    ('1.0^git1~pre', '1.0^git1~pre', 0),
+    ('1.0^git1', '1.0^git1~pre', 1),
+    ('1.0^git1~pre', '1.0^git1', -1),
+    ('1b.fc17', '1b.fc17', 0),
+    ('1b.fc17', '1.fc17', -1),
+    ('1.fc17', '1b.fc17', 1),
+    ('1g.fc17', '1g.fc17', 0),
+    ('1g.fc17', '1.fc17', 1),
+    ('1.fc17', '1g.fc17', -1),
+]
+
+
+def selftest():
+    """Check vercmp() against RPMVERCMP_VECTORS, return the failures."""
+    failures = []
+    for one, two, expected in RPMVERCMP_VECTORS:
+        result = vercmp(one, two)
+        if result != expected:
+            failures.append((one, two, expected, result))
+    return failures
+
+
+if __name__ == '__main__':
+    failures = selftest()
+    for one, two, expected, result in failures:
+        print("rpmvercmp(%s, %s) = %d, expected %d" % (one, two, result, expected))
+    print("%d of %d vectors passed" % (len(RPMVERCMP_VECTORS) - len(failures), len(RPMVERCMP_VECTORS)))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,293 @@
+"""
+Local snapshots of project state for historical comparisons.
+
+A snapshot records the packages of a project at one point in time: name,
+srcmd5, version, link target and the build code of every repository/arch.
+Snapshots live in an indexed SQLite database, so "old vs new project" and
+"what changed since date X" are local queries instead of downloads.
+
+    python3 -m leaplib.snapshot take openSUSE:Backports:SLE-15-SP4
+    python3 -m leaplib.snapshot diff openSUSE:Backports:SLE-15-SP3 openSUSE:Backports:SLE-15-SP4
+    python3 -m leaplib.snapshot since openSUSE:Backports:SLE-15-SP4 2024-05-01
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import osc.conf
+import osc.core
+
+from leaplib import buildresult
+from leaplib import cache
+from leaplib import listing
+from leaplib import xmlstream
+from leaplib.versions import VersionResolver
+
+makeurl = osc.core.makeurl
+
+DB_ENV = 'LEAP_DEV_SNAPSHOT_DB'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot (
+    id INTEGER PRIMARY KEY,
+    project TEXT NOT NULL,
+    taken REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshot_project ON snapshot (project, taken);
+CREATE TABLE IF NOT EXISTS package (
+    snapshot INTEGER NOT NULL REFERENCES snapshot (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    srcmd5 TEXT,
+    version TEXT,
+    link_project TEXT,
+    link_package TEXT,
+    PRIMARY KEY (snapshot, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS build (
+    snapshot INTEGER NOT NULL REFERENCES snapshot (id) ON DELETE CASCADE,
+    package TEXT NOT NULL,
+    repository TEXT NOT NULL,
+    arch TEXT NOT NULL,
+    code TEXT,
+    PRIMARY KEY (snapshot, package, repository, arch)
+) WITHOUT ROWID;
+"""
+
+
+def db_path():
+    """Return the snapshot database, LEAP_DEV_SNAPSHOT_DB overrides the cache directory."""
+    return os.environ.get(DB_ENV) or os.path.join(cache.cache_dir(), 'snapshots.db')
+
+
+def parse_date(value):
+    """Return the timestamp of a YYYY-MM-DD[THH:MM[:SS]] local date."""
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def format_date(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+
+
+class SnapshotStore(object):
+    """Snapshots of project state in a SQLite database."""
+
+    def __init__(self, path=None):
+        self.path = path or db_path()
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    def record(self, project, packages, builds=(), taken=None):
+        """
+        Store a snapshot and return its id.
+
+        `packages` yields (name, srcmd5, version, link_project, link_package),
+        `builds` yields (package, repository, arch, code).
+        """
+        with self.lock, self.db:
+            cursor = self.db.execute('INSERT INTO snapshot (project, taken) VALUES (?, ?)',
+                                     (project, taken or time.time()))
+            snapshot = cursor.lastrowid
+            self.db.executemany('INSERT OR REPLACE INTO package VALUES (?, ?, ?, ?, ?, ?)',
+                                ((snapshot,) + tuple(package) for package in packages))
+            self.db.executemany('INSERT OR REPLACE INTO build VALUES (?, ?, ?, ?, ?)',
+                                ((snapshot,) + tuple(build) for build in builds))
+        return snapshot
+
+    def take(self, apiurl, project, expand=False, versions=True, builds=True, names_only=False):
+        """
+        Snapshot the current state of `project` on OBS, return the snapshot id.
+
+        `names_only` records just the package names from the plain listing,
+        without the view=info read for sources, versions and links, and
+        without build results.
+        """
+        names = listing.get_source_packages(apiurl, project, expand=expand)
+        info = {}
+        if names_only:
+            versions = builds = False
+        else:
+            url = makeurl(apiurl, ['source', project], {'view': 'info', 'nofilename': '1'})
+            with cache.default_cache().open(url, cache.ttl_for(project)) as f:
+                for si in xmlstream.iter_elements(f, 'sourceinfo'):
+                    linked = si.find('linked')
+                    info[si.get('package')] = (si.get('verifymd5') or si.get('srcmd5'),
+                                               linked.get('project') if linked is not None else None,
+                                               linked.get('package') if linked is not None else None)
+
+        resolver = VersionResolver(apiurl) if versions else None
+        packages = []
+        for name in names:
+            srcmd5, link_project, link_package = info.get(name, (None, None, None))
+            version = resolver.version(project, name) if resolver and name in info else None
+            packages.append((name, srcmd5, version or None, link_project, link_package))
+
+        build_codes = []
+        if builds:
+            results = buildresult.get_build_results(apiurl, project)
+            for (repository, arch), result in results.results.items():
+                for package, code in result.codes.items():
+                    build_codes.append((package, repository, arch, code))
+
+        snapshot = self.record(project, packages, build_codes)
+        logging.debug("Snapshot %d of %s: %d packages, %d build results" %
+                      (snapshot, project, len(packages), len(build_codes)))
+        return snapshot
+
+    def snapshots(self, project=None):
+        """Return (id, project, taken) of the snapshots, oldest first."""
+        if project is None:
+            return self.db.execute('SELECT id, project, taken FROM snapshot ORDER BY taken').fetchall()
+        return self.db.execute('SELECT id, project, taken FROM snapshot WHERE project = ? ORDER BY taken',
+                               (project,)).fetchall()
+
+    def taken(self, snapshot):
+        """Return when a snapshot was taken, seconds since the epoch."""
+        return self.db.execute('SELECT taken FROM snapshot WHERE id = ?', (snapshot,)).fetchone()['taken']
+
+    def latest(self, project, before=None):
+        """Return the id of the newest snapshot of `project` taken at or before `before`."""
+        if before is None:
+            before = float('inf')
+        row = self.db.execute('SELECT id FROM snapshot WHERE project = ? AND taken <= ? '
+                              'ORDER BY taken DESC LIMIT 1', (project, before)).fetchone()
+        return row['id'] if row else None
+
+    def earliest(self, project, after):
+        """Return the id of the oldest snapshot of `project` taken at or after `after`."""
+        row = self.db.execute('SELECT id FROM snapshot WHERE project = ? AND taken >= ? '
+                              'ORDER BY taken LIMIT 1', (project, after)).fetchone()
+        return row['id'] if row else None
+
+    def names(self, snapshot):
+        return set(row[0] for row in self.db.execute('SELECT name FROM package WHERE snapshot = ?', (snapshot,)))
+
+    def packages(self, snapshot):
+        """Return {name: row} of a snapshot."""
+        return dict((row['name'], row) for row in
+                    self.db.execute('SELECT * FROM package WHERE snapshot = ?', (snapshot,)))
+
+    def added(self, old, new):
+        """Names in snapshot `new` but not in `old`, sorted."""
+        return [row[0] for row in self.db.execute(
+            'SELECT n.name FROM package n LEFT JOIN package o ON o.snapshot = ? AND o.name = n.name '
+            'WHERE n.snapshot = ? AND o.name IS NULL ORDER BY n.name', (old, new))]
+
+    def deleted(self, old, new):
+        """Names in snapshot `old` but not in `new`, sorted."""
+        return self.added(new, old)
+
+    def changed(self, old, new):
+        """(name, old version, new version) of packages whose sources differ, sorted."""
+        return [tuple(row) for row in self.db.execute(
+            'SELECT n.name, o.version, n.version FROM package n JOIN package o '
+            'ON o.snapshot = ? AND o.name = n.name '
+            'WHERE n.snapshot = ? AND o.srcmd5 IS NOT n.srcmd5 ORDER BY n.name', (old, new))]
+
+    def build_changes(self, old, new, repository=None, arch=None):
+        """(package, repository, arch, old code, new code) of changed build results, sorted."""
+        query = ('SELECT n.package, n.repository, n.arch, o.code, n.code FROM build n LEFT JOIN build o '
+                 'ON o.snapshot = ? AND o.package = n.package AND o.repository = n.repository AND o.arch = n.arch '
+                 'WHERE n.snapshot = ? AND o.code IS NOT n.code')
+        args = [old, new]
+        if repository:
+            query += ' AND n.repository = ?'
+            args.append(repository)
+        if arch:
+            query += ' AND n.arch = ?'
+            args.append(arch)
+        return [tuple(row) for row in self.db.execute(query + ' ORDER BY n.package, n.repository, n.arch', args)]
+
+
+def print_diff(store, old, new, builds=False):
+    for name in store.deleted(old, new):
+        print("%s got deleted" % name)
+    for name in store.added(old, new):
+        print("%s got added" % name)
+    for name, old_version, new_version in store.changed(old, new):
+        print("%s changed (%s -> %s)" % (name, old_version, new_version))
+    if builds:
+        for package, repository, arch, old_code, new_code in store.build_changes(old, new):
+            print("%s %s/%s: %s -> %s" % (package, repository, arch, old_code, new_code))
+
+
+def main(args):
+    store = SnapshotStore(args.database)
+
+    if args.command == 'take':
+        osc.conf.get_config(override_apiurl=args.apiurl)
+        apiurl = osc.conf.config['apiurl']
+        for project in args.projects:
+            snapshot = store.take(apiurl, project, expand=args.expand,
+                                  versions=not args.no_versions, builds=not args.no_builds,
+                                  names_only=args.names_only)
+            print("%s: snapshot %d" % (project, snapshot))
+    elif args.command == 'list':
+        for snapshot, project, taken in store.snapshots(args.project):
+            print("%5d %s %s" % (snapshot, format_date(taken), project))
+    elif args.command == 'diff':
+        old = store.latest(args.old)
+        new = store.latest(args.new)
+        if old is None or new is None:
+            print("No snapshot of %s" % (args.old if old is None else args.new))
+            return 1
+        print_diff(store, old, new, args.builds)
+    elif args.command == 'since':
+        old = store.latest(args.project, parse_date(args.date)) or store.earliest(args.project, parse_date(args.date))
+        new = store.latest(args.project)
+        if old is None:
+            print("No snapshot of %s" % args.project)
+            return 1
+        print_diff(store, old, new, args.builds)
+
+
+if __name__ == '__main__':
+    description = 'Record project snapshots and compare them locally.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='print info useful for debuging')
+    parser.add_argument('--database', metavar='FILE',
+                        help='snapshot database (default: %s)' % db_path())
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    take = subparsers.add_parser('take', help='snapshot projects on OBS')
+    take.add_argument('projects', nargs='+', metavar='PROJECT')
+    take.add_argument('-e', '--expand', action='store_true', help='include packages of linked projects')
+    take.add_argument('--no-versions', action='store_true', help='do not resolve package versions')
+    take.add_argument('--no-builds', action='store_true', help='do not record build results')
+    take.add_argument('--names-only', action='store_true',
+                      help='record only the package names, one plain listing per project')
+
+    lst = subparsers.add_parser('list', help='list snapshots')
+    lst.add_argument('project', nargs='?', metavar='PROJECT')
+
+    diff = subparsers.add_parser('diff', help='compare the latest snapshots of two projects')
+    diff.add_argument('old', metavar='OLD_PROJECT')
+    diff.add_argument('new', metavar='NEW_PROJECT')
+    diff.add_argument('-b', '--builds', action='store_true', help='also show changed build results')
+
+    since = subparsers.add_parser('since', help='show what changed in a project since a date')
+    since.add_argument('project', metavar='PROJECT')
+    since.add_argument('date', metavar='YYYY-MM-DD')
+    since.add_argument('-b', '--builds', action='store_true', help='also show changed build results')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug
+                        else logging.INFO)
+
+    sys.exit(main(args))
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import threading
+
+from urllib.error import HTTPError
+
+import osc.core
+
+from leaplib import cache
+from leaplib import listing
+from leaplib import pool
+from leaplib import transport
+from leaplib import xmlstream
+
+makeurl = osc.core.makeurl
+http_GET = transport.http_GET
+
+
+class SpecIndex(object):
+    """
+    Spec files and link target of every package of a project.
+
+    The project view=info listing gives the expanded srcmd5 of each
+    package. The spec files and linkinfo of a srcmd5 never change, so they
+    are kept on disk by srcmd5 and only packages whose sources changed
+    since the last run have their expanded file list fetched again.
+    """
+
+    def __init__(self, apiurl, project, cachedir=None, jobs=None):
+        self.apiurl = apiurl
+        self.project = project
+        self.jobs = jobs
+        self.path = os.path.join(cachedir or cache.cache_dir(), 'specs.json')
+        self.srcmd5s = None
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, 'r') as f:
+                self.by_srcmd5 = json.load(f)
+        except (OSError, ValueError):
+            self.by_srcmd5 = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.by_srcmd5, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def load(self):
+        """Read the srcmd5 of every package from the project view=info."""
+        srcmd5s = {}
+        url = makeurl(self.apiurl, ['source', self.project], {'view': 'info', 'nofilename': '1'})
+        with cache.default_cache().open(url, cache.ttl_for(self.project)) as f:
+            for si in xmlstream.iter_elements(f, 'sourceinfo'):
+                # the srcmd5 of a broken link is not the expanded one,
+                # such packages are never cached
+                srcmd5 = si.get('srcmd5') if si.find('error') is None else None
+                srcmd5s[si.get('package')] = srcmd5
+        self.srcmd5s = srcmd5s
+
+    def refresh(self, packages):
+        """Re-read the srcmd5 of some packages from the server, bypassing the cache."""
+        self._ensure_loaded()
+        packages = set(packages)
+        for package in packages:
+            self.srcmd5s.pop(package, None)
+        for si in listing.iter_package_sourceinfo(self.apiurl, self.project, packages):
+            self.srcmd5s[si.get('package')] = si.get('srcmd5') if si.find('error') is None else None
+
+    def fetch(self, package):
+        """Return the spec files and link target of a package from its expanded file list."""
+        url = makeurl(self.apiurl, ['source', self.project, package], {'expand': '1'})
+        try:
+            root = xmlstream.parse(http_GET(url)).getroot()
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise e
+        linkinfo = root.find('linkinfo')
+        return {
+            'linkinfo': linkinfo.get('package') if linkinfo is not None else None,
+            'specs': [entry.get('name').replace('.spec', '') for entry in root.findall('entry')
+                      if entry.get('name').endswith('.spec')],
+        }
+
+    def _ensure_loaded(self):
+        with self.lock:
+            if self.srcmd5s is None:
+                self.load()
+
+    def prefetch(self, packages):
+        """Fetch the packages not known by srcmd5 yet, concurrently."""
+        self._ensure_loaded()
+        missing = [package for package in packages
+                   if self.srcmd5s.get(package) and self.srcmd5s[package] not in self.by_srcmd5]
+        logging.debug("%s: fetching spec files of %d packages" % (self.project, len(missing)))
+        for package, data in zip(missing, pool.ordered_map(self.fetch, missing, self.jobs)):
+            if data is not None:
+                self.by_srcmd5[self.srcmd5s[package]] = data
+        if missing:
+            self.save()
+
+    def get(self, package):
+        """
+        Return {'specs': [...], 'linkinfo': package or None} of a package,
+        None if it does not exist in the project.
+        """
+        self._ensure_loaded()
+        if package not in self.srcmd5s:
+            return None
+        srcmd5 = self.srcmd5s[package]
+        if srcmd5 in self.by_srcmd5:
+            return self.by_srcmd5[srcmd5]
+        data = self.fetch(package)
+        if data is not None and srcmd5:
+            self.by_srcmd5[srcmd5] = data
+        return data
@@ -0,0 +1,226 @@
+"""
+Where the time of a script goes.
+
+Every OBS request made through leaplib.transport is counted under its
+endpoint class (see leaplib.endpoints) with the time until the reply
+headers arrived, the status and the bytes read from the body, both as
+decoded and as sent over the wire. The streaming parsers of
+leaplib.xmlstream add the time spent parsing, without the time spent
+waiting for the body. Requests that osc.core helpers send themselves
+(request listings, submit request creation, package meta) do not go
+through leaplib.transport; they are missing from the endpoint table and
+only show up in the per connection counts of the summary. Recording is
+always on and costs a few clock reads per request; --stats prints the
+summary to stderr when the script exits and --stats-json writes it as
+JSON, e.g. to track regressions over the nightly runs.
+"""
+
+import atexit
+import json
+import sys
+import threading
+import time
+
+from leaplib import endpoints
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# per thread seconds spent reading response bodies
+_local = threading.local()
+
+
+def read_time():
+    """Return the seconds the current thread spent reading response bodies."""
+    return getattr(_local, 'read', 0.0)
+
+
+def add_read_time(seconds):
+    _local.read = read_time() + seconds
+
+
+def bucket_label(bound):
+    if bound == float('inf'):
+        return 'inf'
+    return '%gms' % (bound * 1000)
+
+
+class Histogram(object):
+    """Counts of values per bucket of LATENCY_BUCKETS."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        """Return the upper bound of the bucket holding the given fraction of values."""
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': dict((bucket_label(bound), count) for bound, count in zip(self.bounds, self.counts)),
+        }
+
+
+class EndpointStats(object):
+    """Requests, errors, bytes and latencies of one endpoint class."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.wire_bytes = 0
+        self.latency = Histogram()
+
+    def as_dict(self):
+        return {'requests': self.requests, 'errors': self.errors, 'bytes': self.bytes,
+                'wire_bytes': self.wire_bytes, 'latency': self.latency.as_dict()}
+
+
+class Recorder(object):
+    """Request, transfer and parse figures of the whole process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sections = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.endpoints = dict((name, EndpointStats()) for name in endpoints.CLASSES)
+            self.parse_seconds = 0.0
+            self.parsed = 0
+            self.counters = {}
+
+    def request(self, endpoint, seconds, status):
+        """Count a request of an endpoint class that got `status` after `seconds`."""
+        with self.lock:
+            stats = self.endpoints[endpoint]
+            stats.requests += 1
+            stats.latency.add(seconds)
+            # 304 answers a conditional request, it is not a failure
+            if status >= 400:
+                stats.errors += 1
+
+    def transferred(self, endpoint, size, wire_size):
+        with self.lock:
+            stats = self.endpoints[endpoint]
+            stats.bytes += size
+            stats.wire_bytes += wire_size
+
+    def parse(self, seconds):
+        """Add the time one document took to parse."""
+        with self.lock:
+            self.parse_seconds += seconds
+            self.parsed += 1
+
+    def count(self, name, n=1):
+        """Bump a free form counter, e.g. cache hits."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def register_section(self, name, func):
+        """Include func() under `name` in the summary."""
+        self.sections[name] = func
+
+    def as_dict(self):
+        with self.lock:
+            summary = {
+                'elapsed': time.monotonic() - self.started,
+                'requests': sum(stats.requests for stats in self.endpoints.values()),
+                'bytes': sum(stats.bytes for stats in self.endpoints.values()),
+                'wire_bytes': sum(stats.wire_bytes for stats in self.endpoints.values()),
+                'parse': {'documents': self.parsed, 'seconds': self.parse_seconds},
+                'counters': dict(self.counters),
+                'endpoints': dict((name, stats.as_dict()) for name, stats in self.endpoints.items()
+                                  if stats.requests),
+            }
+        for name, func in self.sections.items():
+            summary[name] = func()
+        return summary
+
+
+_recorder = Recorder()
+
+
+def recorder():
+    """Return the process wide Recorder."""
+    return _recorder
+
+
+def format_summary(summary):
+    """Return the summary as a table for humans."""
+    lines = ['%-15s %8s %6s %10s %10s %8s %8s %8s' %
+             ('endpoint', 'requests', 'errors', 'bytes', 'wire', 'mean', 'p90', 'max')]
+    for name in endpoints.CLASSES:
+        stats = summary['endpoints'].get(name)
+        if stats is None:
+            continue
+        latency = stats['latency']
+        lines.append('%-15s %8d %6d %10d %10d %7.0fms %6.0fms %6.0fms' %
+                     (name, stats['requests'], stats['errors'], stats['bytes'], stats['wire_bytes'],
+                      latency['mean'] * 1000, latency['p90'] * 1000, latency['max'] * 1000))
+    lines.append('%-15s %8d %6s %10d %10d' %
+                 ('total', summary['requests'], '', summary['bytes'], summary['wire_bytes']))
+    lines.append('parsed %d documents in %.2fs, %.2fs elapsed' %
+                 (summary['parse']['documents'], summary['parse']['seconds'], summary['elapsed']))
+    for name, value in sorted(summary['counters'].items()):
+        lines.append('%s: %d' % (name, value))
+    for apiurl, stats in sorted(summary.get('connections', {}).items()):
+        lines.append('%s: %d new connections, %d reused' % (apiurl, stats['new'], stats['reused']))
+    return '\n'.join(lines)
+
+
+def report(text=False, json_path=None):
+    summary = _recorder.as_dict()
+    if text:
+        print(format_summary(summary), file=sys.stderr)
+    if json_path == '-':
+        json.dump(summary, sys.stderr, indent=2, sort_keys=True)
+    elif json_path:
+        with open(json_path, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+
+
+def add_arguments(parser):
+    """Add --stats and --stats-json to a script's argument parser."""
+    parser.add_argument('--stats', action='store_true',
+                        help='print request, latency and parse statistics to stderr on exit; '
+                             'requests sent by osc.core helpers (request lists, submit '
+                             'creation, ...) are only in the per connection counts')
+    parser.add_argument('--stats-json', metavar='FILE',
+                        help='write the statistics as JSON to FILE on exit (- for stderr)')
+
+
+def setup(args):
+    """Report the statistics on exit as asked for on the command line."""
+    if args.stats or args.stats_json:
+        atexit.register(report, args.stats, args.stats_json)
@@ -0,0 +1,153 @@
+"""
+Throttling of the requests that change things on OBS.
+
+A token bucket spaces out submissions, and when the server answers 429
+or 503 the call is retried after the Retry-After it asked for (or an
+exponential backoff) while the rate is halved. Successful calls bring the
+rate back up step by step, so throughput follows what the server allows.
+
+Only calls that can safely be repeated go through call(). A 503 from a
+proxy or a timeout can come after OBS already created a request, so
+request creation goes through call_once(): it is paced and a refusal
+slows the limiter down, but it is never sent twice.
+Only calls that go through the limiter are paced; loop iterations that do
+not submit anything cost no time.
+"""
+
+import email.utils
+import logging
+import os
+import threading
+import time
+
+from urllib.error import HTTPError
+
+# requests per second and how many may go out back to back
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 5
+RATE_ENV = 'LEAP_DEV_RATE'
+
+# the rate never drops below this when backing off
+MIN_RATE = 0.05
+RETRY_CODES = (429, 503)
+MAX_RETRIES = 5
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+
+
+def default_rate():
+    """Return the request rate, LEAP_DEV_RATE overrides DEFAULT_RATE."""
+    try:
+        return max(MIN_RATE, float(os.environ.get(RATE_ENV, DEFAULT_RATE)))
+    except ValueError:
+        return DEFAULT_RATE
+
+
+def retry_after(e):
+    """Return the seconds asked for by the Retry-After header of `e`, or None."""
+    headers = getattr(e, 'headers', None)
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RateLimiter(object):
+    """Token bucket with additive increase and multiplicative decrease."""
+
+    def __init__(self, rate=None, burst=DEFAULT_BURST, max_retries=MAX_RETRIES):
+        self.max_rate = rate or default_rate()
+        self.rate = self.max_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def reserve(self):
+        """Take a token if there is one, return 0, else the seconds to wait before trying again."""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def slow_down(self, delay):
+        """Halve the rate and hold back every caller for `delay` seconds."""
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0) - delay * self.rate
+            logging.debug("Throttled, waiting %.1fs, rate now %.2f/s" % (delay, self.rate))
+
+    def speed_up(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def call(self, func, *args, **kwargs):
+        """Call func(*args, **kwargs) at the allowed pace, retrying 429/503."""
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except HTTPError as e:
+                if e.code not in RETRY_CODES or attempt >= self.max_retries:
+                    raise e
+                self.slow_down(self._delay(e, attempt))
+                attempt += 1
+                continue
+            self.speed_up()
+            return result
+
+    def _delay(self, e, attempt):
+        delay = retry_after(e)
+        if delay is None:
+            delay = min(BACKOFF_MAX, BACKOFF_BASE ** attempt)
+        return delay
+
+    def call_once(self, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs) at the allowed pace without retrying,
+        for calls that must not run twice such as request creation. A
+        429/503 still slows down the calls that follow.
+        """
+        self.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except HTTPError as e:
+            if e.code in RETRY_CODES:
+                self.slow_down(self._delay(e, 0))
+            raise e
+        self.speed_up()
+        return result
+
+
+_default_limiter = None
+
+
+def default_limiter():
+    """Return the process wide RateLimiter."""
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = RateLimiter()
+    return _default_limiter
@@ -0,0 +1,221 @@
+"""
+Shared HTTP transport for the OBS calls of the scripts.
+
+Drop-in replacements for osc.core.http_GET/http_POST/http_PUT that ask
+for gzip/deflate compressed replies and let osc keep a pool of keep-alive
+connections per apiurl instead of its default single one. Worker threads
+then reuse open connections instead of opening one per request and
+throwing it away.
+
+HTTP pipelining is not done: neither urllib3 nor OBS handle it reliably.
+Idempotent reads are instead spread over the pooled connections by the
+worker pool.
+
+Every request is counted in leaplib.stats. Requests osc.core helpers
+(get_request_list, create_submit_request, show_package_meta, ...) send
+themselves bypass these wrappers and only show up in the per connection
+counts.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+from urllib.error import HTTPError
+
+import osc.conf
+import osc.connection
+import osc.core
+import urllib3
+
+from leaplib import endpoints
+from leaplib import pool
+from leaplib import stats
+
+POOL_SIZE_ENV = 'LEAP_DEV_POOL_SIZE'
+# urllib3 major versions whose pool internals _resize() knows
+SUPPORTED_URLLIB3 = ('1', '2')
+ACCEPT_ENCODING = 'gzip, deflate'
+
+makeurl = osc.core.makeurl
+
+_lock = threading.Lock()
+# apiurl -> the osc connection pool resized for it
+_pools = {}
+
+
+def pool_size():
+    """Return the connections kept open per apiurl, LEAP_DEV_POOL_SIZE overrides the job count."""
+    try:
+        return max(1, int(os.environ.get(POOL_SIZE_ENV, pool.default_jobs())))
+    except ValueError:
+        return pool.default_jobs()
+
+
+def _resizable(connection_pool):
+    """
+    Whether the pool looks like the urllib3 1.x/2.x HTTPConnectionPool that
+    _resize() knows. There is no public way to change the size of a pool
+    osc already created, so anything else is left alone.
+    """
+    if urllib3.__version__.split('.')[0] not in SUPPORTED_URLLIB3:
+        return False
+    queue = getattr(connection_pool, 'pool', None)
+    return (hasattr(connection_pool, 'QueueCls') and hasattr(connection_pool, 'block')
+            and all(hasattr(queue, name) for name in ('maxsize', 'qsize', 'empty', 'get', 'put')))
+
+
+def _resize(connection_pool, size):
+    """Let `size` connections of an urllib3 pool stay open at the same time."""
+    old = connection_pool.pool
+    # connections still checked out (the response of the first request)
+    # come back to the new queue, leave room for them
+    outstanding = old.maxsize - old.qsize()
+    connections = []
+    while not old.empty():
+        conn = old.get(block=False)
+        if conn is not None:
+            connections.append(conn)
+    size = max(size, outstanding)
+    connection_pool.pool = connection_pool.QueueCls(size)
+    for i in range(size - outstanding - len(connections[:size - outstanding])):
+        connection_pool.pool.put(None)
+    for conn in connections[:size - outstanding]:
+        connection_pool.pool.put(conn)
+    for conn in connections[size - outstanding:]:
+        conn.close()
+    # wait for a free connection rather than opening one that is dropped
+    connection_pool.block = True
+
+
+def _apiurl(url):
+    if not osc.conf.config.get('api_host_options'):
+        return None
+    return osc.conf.extract_known_apiurl(url)
+
+
+class _Response(object):
+    """An osc response that counts the body bytes it hands out."""
+
+    def __init__(self, response, endpoint):
+        self._response = response
+        self._endpoint = endpoint
+        self._size = 0
+        self._counted = False
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def _finish(self):
+        if not self._counted:
+            self._counted = True
+            stats.recorder().transferred(self._endpoint, self._size, self._response.tell())
+
+    def _timed(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        data = func(*args, **kwargs)
+        stats.add_read_time(time.perf_counter() - start)
+        self._size += len(data)
+        return data
+
+    def read(self, amt=None, *args, **kwargs):
+        data = self._timed(self._response.read, amt, *args, **kwargs)
+        if amt is None or not data:
+            self._finish()
+        return data
+
+    def readline(self, *args):
+        data = self._timed(self._response.readline, *args)
+        if not data:
+            self._finish()
+        return data
+
+    def close(self):
+        self._finish()
+        self._response.close()
+
+
+def _send(method, func, url, headers, **kwargs):
+    endpoint = endpoints.classify(method, url)
+    start = time.monotonic()
+    try:
+        response = func(url, headers=headers, **kwargs)
+    except HTTPError as e:
+        stats.recorder().request(endpoint, time.monotonic() - start, e.code)
+        raise e
+    stats.recorder().request(endpoint, time.monotonic() - start, response.status)
+    return _Response(response, endpoint)
+
+
+def _request(method, func, url, headers, **kwargs):
+    headers = dict(headers or {})
+    headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+    apiurl = _apiurl(url)
+    if apiurl is None or apiurl in _pools:
+        return _send(method, func, url, headers, **kwargs)
+
+    # osc creates the pool of an apiurl on its first request, send that one
+    # alone and resize the pool before anything else uses it
+    with _lock:
+        if apiurl in _pools:
+            return _send(method, func, url, headers, **kwargs)
+        try:
+            return _send(method, func, url, headers, **kwargs)
+        finally:
+            connection_pool = osc.connection.CONNECTION_POOLS.get(apiurl)
+            if connection_pool is not None:
+                if _resizable(connection_pool):
+                    _resize(connection_pool, pool_size())
+                else:
+                    logging.warning("Can not resize the connection pool of urllib3 %s, "
+                                    "requests to %s share one connection" % (urllib3.__version__, apiurl))
+                _pools[apiurl] = connection_pool
+
+
+def http_GET(url, headers=None, data=None, file=None):
+    return _request('GET', osc.core.http_GET, url, headers, data=data, file=file)
+
+
+def http_POST(url, headers=None, data=None, file=None):
+    return _request('POST', osc.core.http_POST, url, headers, data=data, file=file)
+
+
+def http_PUT(url, headers=None, data=None, file=None):
+    return _request('PUT', osc.core.http_PUT, url, headers, data=data, file=file)
+
+
+def connection_counts():
+    """
+    Return {apiurl: {'requests', 'new', 'reused'}} of the resized pools.
+
+    These count every request on the pool, including the ones osc.core
+    helpers send themselves, which the endpoint table of leaplib.stats
+    does not see.
+    """
+    counts = {}
+    for apiurl, connection_pool in _pools.items():
+        requests = connection_pool.num_requests
+        new = connection_pool.num_connections
+        counts[apiurl] = {'requests': requests, 'new': new, 'reused': max(0, requests - new)}
+    return counts
+
+
+def log_connection_counts():
+    for apiurl, counts in sorted(connection_counts().items()):
+        logging.debug("%s: %d requests, %d new connections, %d reused" %
+                      (apiurl, counts['requests'], counts['new'], counts['reused']))
+
+
+atexit.register(log_connection_counts)
+stats.recorder().register_section('connections', connection_counts)
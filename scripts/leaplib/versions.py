@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import threading
+
+from urllib.error import HTTPError
+
+import osc.core
+
+from leaplib import cache
+from leaplib import transport
+from leaplib import xmlstream
+
+makeurl = osc.core.makeurl
+http_GET = transport.http_GET
+
+# packages asked for in one view=info&parse=1 request
+PARSE_BATCH = 100
+
+
+class VersionResolver(object):
+    """
+    Package versions for whole projects at a time.
+
+    One view=info listing gives the srcmd5 of every package in a project.
+    Versions are remembered on disk per srcmd5, so only packages whose
+    sources changed since the last run are parsed again, and those are
+    asked for in batches rather than one _history request each.
+    """
+
+    def __init__(self, apiurl, cachedir=None):
+        self.apiurl = apiurl
+        self.path = os.path.join(cachedir or cache.cache_dir(), 'versions.json')
+        self.projects = {}
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, 'r') as f:
+                self.by_srcmd5 = json.load(f)
+        except (OSError, ValueError):
+            self.by_srcmd5 = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.by_srcmd5, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def _sourceinfo(self, project, query):
+        """Yield (package, srcmd5, version) from a view=info listing."""
+        query = dict(query, view='info', nofilename='1')
+        url = makeurl(self.apiurl, ['source', project], query)
+        with cache.default_cache().open(url, cache.ttl_for(project)) as f:
+            for si in xmlstream.iter_elements(f, 'sourceinfo'):
+                yield si.get('package'), si.get('verifymd5') or si.get('srcmd5'), si.findtext('version')
+
+    def load_project(self, project):
+        """Resolve the versions of every package in a project."""
+        srcmd5s = {}
+        for package, srcmd5, version in self._sourceinfo(project, {}):
+            srcmd5s[package] = srcmd5
+
+        unknown = sorted(package for package, srcmd5 in srcmd5s.items()
+                         if srcmd5 and srcmd5 not in self.by_srcmd5)
+        logging.debug("%s: %d of %d package versions unknown" % (project, len(unknown), len(srcmd5s)))
+        for i in range(0, len(unknown), PARSE_BATCH):
+            query = {'parse': '1', 'package': unknown[i:i + PARSE_BATCH]}
+            for package, srcmd5, version in self._sourceinfo(project, query):
+                if srcmd5 and version:
+                    self.by_srcmd5[srcmd5] = version
+
+        self.projects[project] = srcmd5s
+        if unknown:
+            self.save()
+
+    def history_version(self, project, package):
+        """Version of the latest revision, for packages view=info can not parse."""
+        try:
+            url = makeurl(self.apiurl, ['source', project, package, '_history'], {'limit': 1})
+            root = xmlstream.parse(http_GET(url)).getroot()
+        except HTTPError as e:
+            if e.code == 404:
+                return False
+
+            raise e
+
+        return str(root.find('./revision/version').text)
+
+    def version(self, project, package):
+        """Return the version of project/package, False if it does not exist."""
+        with self.lock:
+            if project not in self.projects:
+                self.load_project(project)
+        srcmd5 = self.projects[project].get(package)
+        if srcmd5 in self.by_srcmd5:
+            return self.by_srcmd5[srcmd5]
+        return self.history_version(project, package)
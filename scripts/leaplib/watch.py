@@ -0,0 +1,131 @@
+"""
+Follow the build results of a project as they change.
+
+Instead of pulling the whole _result of a project from cron, a Watcher
+keeps the latest results in memory and is fed by an event source:
+
+  LongPollSource  _result?oldstate=, the server answers once something
+                  changed (or its timeout passed)
+  PollSource      a plain _result every few seconds, for servers that
+                  do not hold the reply back
+  QueueSource     results pushed from elsewhere, e.g. by a local stand-in
+
+Each new set of results is compared with the previous one and only the
+packages that went to succeeded in between are handed on. The first
+results count as all new, so a freshly started watcher catches up with
+what already built.
+"""
+
+import logging
+import queue
+import time
+
+from urllib.error import HTTPError
+from urllib.error import URLError
+
+from leaplib import buildresult
+from leaplib import throttle
+
+# seconds between two plain _result requests of a PollSource
+POLL_INTERVAL = 60
+# long-poll requests per second, in case the server answers right away
+LONG_POLL_RATE = 0.2
+# seconds to wait after a failed request before asking again
+RETRY_DELAY = 60
+
+
+class LongPollSource(object):
+    """Build results from _result?oldstate= long-polls."""
+
+    def __init__(self, apiurl, project, repository=None, arch=None, limiter=None):
+        self.apiurl = apiurl
+        self.project = project
+        self.repository = repository
+        self.arch = arch
+        self.limiter = limiter or throttle.RateLimiter(rate=LONG_POLL_RATE, burst=1)
+        self.state = None
+
+    def next(self):
+        results = self.limiter.call(buildresult.get_build_results, self.apiurl, self.project,
+                                    self.repository, self.arch, oldstate=self.state)
+        self.state = results.state
+        return results
+
+
+class PollSource(object):
+    """Build results from a plain _result every `interval` seconds."""
+
+    def __init__(self, apiurl, project, repository=None, arch=None, interval=POLL_INTERVAL):
+        self.apiurl = apiurl
+        self.project = project
+        self.repository = repository
+        self.arch = arch
+        self.interval = interval
+        self.last = None
+
+    def next(self):
+        if self.last is not None:
+            time.sleep(max(0, self.last + self.interval - time.monotonic()))
+        self.last = time.monotonic()
+        return buildresult.get_build_results(self.apiurl, self.project, self.repository, self.arch)
+
+
+class QueueSource(object):
+    """
+    Build results put() by someone else.
+
+    Anything BuildResults.parse() reads can be put as well as ready
+    BuildResults; putting None ends the watch.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def put(self, results):
+        self.queue.put(results)
+
+    def next(self):
+        results = self.queue.get()
+        if results is None or isinstance(results, buildresult.BuildResults):
+            return results
+        return buildresult.BuildResults.parse(results)
+
+
+class Watcher(object):
+    """The current build results of one repository/arch, kept up to date from a source."""
+
+    def __init__(self, source, repository, arch):
+        self.source = source
+        self.repository = repository
+        self.arch = arch
+        self.results = None
+
+    def succeeded(self):
+        if self.results is None:
+            return set()
+        return self.results.succeeded(self.repository, self.arch)
+
+    def update(self, results):
+        """Take new results, return the packages that went to succeeded since the last ones."""
+        before = self.succeeded()
+        self.results = results
+        return self.succeeded() - before
+
+    def run(self, callback):
+        """
+        Call callback(packages) with every batch of newly succeeded
+        packages, until the source runs dry.
+        """
+        while True:
+            try:
+                results = self.source.next()
+            except (HTTPError, URLError) as e:
+                logging.warning("Fetching build results failed, retrying in %ds: %s" % (RETRY_DELAY, e))
+                time.sleep(RETRY_DELAY)
+                continue
+            if results is None:
+                return
+            succeeded = self.update(results)
+            logging.debug("Build results changed, %d packages newly succeeded" % len(succeeded))
+            if succeeded:
+                callback(succeeded)
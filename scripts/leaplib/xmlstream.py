@@ -0,0 +1,125 @@
+"""
+Streaming parsing of large OBS XML responses.
+
+Project wide listings (view=info, view=binaryversions, _result of a big
+project) are parsed with iterparse. Every record element is handed to the
+caller once it is complete and dropped from the tree afterwards, so memory
+stays flat however large the project is. A record is only valid until the
+caller asks for the next one; copy what has to be kept (e.g. dict(attrib)).
+
+The time spent parsing, not counting the wait for the body, is added to
+leaplib.stats.
+"""
+
+import time
+
+from xml.etree import ElementTree as ET
+
+from leaplib import stats
+
+# bytes handed to the parser at a time
+CHUNK_SIZE = 64 * 1024
+
+
+def _iterparse(source):
+    """
+    ET.iterparse with start and end events that keeps track of its parse time.
+
+    The document is fed to the parser a chunk at a time, only the feeding
+    is timed; waiting for the body and the caller's work are not.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    opened = not hasattr(source, 'read')
+    if opened:
+        source = open(source, 'rb')
+    spent = 0.0
+    try:
+        while True:
+            data = source.read(CHUNK_SIZE)
+            start = time.perf_counter()
+            if data:
+                parser.feed(data)
+            else:
+                parser.close()
+            spent += time.perf_counter() - start
+            for event in parser.read_events():
+                yield event
+            if not data:
+                return
+    finally:
+        if opened:
+            source.close()
+        stats.recorder().parse(spent)
+
+
+def parse(source):
+    """ET.parse that keeps track of its parse time."""
+    start = time.perf_counter()
+    read = stats.read_time()
+    try:
+        return ET.parse(source)
+    finally:
+        stats.recorder().parse(time.perf_counter() - start - (stats.read_time() - read))
+
+
+def iter_with_ancestors(source, tag):
+    """Yield (ancestors, element) for every `tag` element of `source`.
+
+    `ancestors` lists the open elements from the document root down to
+    the parent; they keep their attributes but not their children, and
+    the list is only valid until the next element is asked for.
+    """
+    stack = []
+    for event, elem in _iterparse(source):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag == tag:
+            yield stack, elem
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+def iter_with_parent(source, tag):
+    """Yield (parent, element) for every `tag` element of `source`.
+
+    `source` is a file name or a binary file object such as an http_GET()
+    response. The parent keeps its attributes but not its children.
+    """
+    for ancestors, elem in iter_with_ancestors(source, tag):
+        yield ancestors[-1] if ancestors else None, elem
+
+
+def iter_elements(source, tag):
+    """Yield every `tag` element of `source` as soon as it is complete."""
+    for parent, elem in iter_with_parent(source, tag):
+        yield elem
+
+
+def iter_children(source):
+    """Yield every child of the document root as soon as it is complete.
+
+    For listings whose records share the tag of the root, such as
+    view=binaryversions.
+    """
+    depth = 0
+    root = None
+    for event, elem in _iterparse(source):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield elem
+            elem.clear()
+            root.remove(elem)
+
+
+def iter_entry_names(source):
+    """Yield the names of a /source directory listing."""
+    for entry in iter_elements(source, 'entry'):
+        yield entry.get('name')
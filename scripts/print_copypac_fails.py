@@ -1,9 +1,9 @@
 #!/usr/bin/python3
 
 import argparse
+import asyncio
 import logging
 import sys
-from urllib.error import HTTPError
 
 import re
 from xml.etree import cElementTree as ET
@@ -13,6 +13,13 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import aio
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+from leaplib.reqindex import RequestIndex
+from leaplib.diff import DiffEngine
+
 OPENSUSE = 'openSUSE:Leap:15.6'
 FACTORY = 'openSUSE:Factory'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.5:Update'
@@ -21,9 +28,9 @@ SLEFORKS = 'openSUSE:Backports:SLE-15-SP6:SLEFork'
 SLE = 'SUSE:SLE-15-SP6:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindSLE(object):
     def __init__(self, project, verbose):
@@ -31,50 +38,19 @@ class FindSLE(object):
         self.verbose = verbose
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.differ = DiffEngine(self.apiurl)
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
-
-    def item_exists(self, project, package=None):
-        """
-        Return true if the given project or package exists
-        """
-        if package:
-            url = makeurl(self.apiurl, ['source', project, package, '_meta'])
-        else:
-            url = makeurl(self.apiurl, ['source', project, '_meta'])
-        try:
-            http_GET(url)
-        except HTTPError as e:
-            if e.code == 404:
-                return False
-            else:
-                raise e
-        return True
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
+
+    async def packages_exist(self, project, packages):
+        """Return whether each of the packages exists in the project, all looked up at once."""
+        async with aio.AsyncOBS(self.apiurl) as obs:
+            return await obs.crawl(lambda package: obs.exists(project, package), packages)
 
     def has_diff(self, project, package, target_prj, target_pkg):
-        changes_file = package + ".changes"
-        query = {'cmd': 'diff',
-                 'view': 'xml',
-                 'file': changes_file,
-                 'oproject': project,
-                 'opackage': package}
-        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
-        root = ET.parse(http_POST(u)).getroot()
-        if root:
-            # check if it has diff element
-            diffs = root.findall('files/file/diff')
-            if diffs:
-                return True
-        return False
+        return self.differ.has_diff(project, package, target_prj, target_pkg)
 
     def get_prj_results(self, prj, arch, code='failed'):
         url = makeurl(self.apiurl, ['build', prj, "_result?arch=x86_64&repository=standard&view=status"])
@@ -106,13 +82,16 @@ class FindSLE(object):
         forks_pkglist = self.get_source_packages(SLEFORKS)
         rebuild_pkglist = self.get_source_packages(self.project)
         haskell_pkglist = self.get_source_packages('devel:languages:haskell')
-        pending_requests = \
-                [r.actions[0].tgt_package for r in osc.core.get_request_list(self.apiurl, project=BACKPORTS, req_state=('new', 'review'))]
+        pending_requests = RequestIndex(self.apiurl, BACKPORTS, ('new', 'review')).target_packages(('new', 'review'))
         sle_ones = []
         nodiffs = []
         deletes = []
 
-        cleanups = set(build_succeeds) & set(rebuild_pkglist)
+        # look up every failed package concurrently before walking the lists
+        in_factory = dict(zip(build_fails, asyncio.run(self.packages_exist(FACTORY, build_fails))))
+        self.differ.prefetch([(FACTORY, pkg, BACKPORTS, pkg) for pkg in build_fails if in_factory[pkg]])
+
+        cleanups = rebuild_pkglist & build_succeeds
         for pkg in rebuild_pkglist:
             if pkg not in bp_pkglist:
                 list(cleanups).append(pkg)
@@ -121,7 +100,7 @@ class FindSLE(object):
             if pkg in sle_pkglist:
                 sle_ones.append(pkg)
             else:
-                if self.item_exists(FACTORY, pkg):
+                if in_factory[pkg]:
                     if pkg in haskell_pkglist and self.has_diff(FACTORY, pkg, BACKPORTS, pkg):
                         #if pkg not in rebuild_pkglist and pkg not in pending_requests:
                         #    print("eval \"osc copypac -e -m 'updated package from Factory' %s %s %s %s\"" %
@@ -138,7 +117,7 @@ class FindSLE(object):
         print("\nExists in SLE:")
         for pkg in sle_ones:
             msg = ("%s" % pkg)
-            if self.item_exists(FACTORY, pkg):
+            if in_factory[pkg]:
                 if self.has_diff(FACTORY, pkg, BACKPORTS, pkg):
                     if pkg not in rebuild_pkglist:
                         if pkg in forks_pkglist:
@@ -182,12 +161,14 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the target project where do submit to')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='show the diff')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
@@ -13,6 +13,10 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+
 OPENSUSE = 'openSUSE:Leap:15.4'
 FACTORY = 'openSUSE:Factory'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.3:Update'
@@ -20,9 +24,9 @@ BACKPORTS = 'openSUSE:Backports:SLE-15-SP4'
 SLE = 'SUSE:SLE-15-SP4:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindSLE(object):
     def __init__(self, project, verbose):
@@ -33,14 +37,7 @@ class FindSLE(object):
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def item_exists(self, project, package=None):
         """
@@ -143,12 +140,14 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the target project where do submit to')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='show the diff')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
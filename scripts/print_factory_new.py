@@ -19,6 +19,16 @@ from osclib.core import project_pseudometa_package
 from osc import oscerr
 from osclib.memoize import memoize
 
+from leaplib import buildresult
+from leaplib import devel
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+from leaplib import xmlstream
+from leaplib.pkgindex import PackageIndex
+from leaplib.reqindex import RequestIndex
+from leaplib.specindex import SpecIndex
+
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP4'
 OPENSUSE = 'openSUSE:Leap:15.4'
 SLE = 'SUSE:SLE-15-SP4:GA'
@@ -26,39 +36,29 @@ REBUILD_PROJECT = '{}:RebuildFactoryCandidates'.format(BACKPORTS)
 FACTORYFORK = '{}:FactoryFork'.format(BACKPORTS)
 SUPPORTED_ARCHS = ['x86_64', 'aarch64', 'ppc64le']
 FACTORY = 'openSUSE:Factory'
+# requests that keep a package from being submitted again
+REQUESTED_STATES = ('new', 'review', 'declined', 'revoked')
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FccFreezer(object):
     def __init__(self, freeze_rebuild):
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
         self.freeze_rebuild = freeze_rebuild
+        self.unresolved_links = {}
+        self.build_results = {}
+        self.spec_indexes = {}
 
     def list_packages(self, project):
-        url = makeurl(self.apiurl, ['source', project])
-        pkglist = []
-
-        root = ET.parse(http_GET(url)).getroot()
-        xmllines = root.findall("./entry")
-        for pkg in xmllines:
-            pkglist.append(pkg.attrib['name'])
-
-        return set(pkglist)
+        return set(listing.get_source_packages(self.apiurl, project))
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def check_one_source(self, flink, si, pkglist, os_pkglist, ignored_pkgs, sle_pkglist, bp_pkglist, factoryfork_pkglist):
         """
@@ -92,13 +92,12 @@ class FccFreezer(object):
 
         for linked in si.findall('linked'):
             if linked.get('project') == FACTORY:
-                url = makeurl(self.apiurl, ['source', FACTORY, package], {'view': 'info', 'nofilename': '1'})
-                f = http_GET(url)
-                proot = ET.parse(f).getroot()
-                lsrcmd5 = proot.get('lsrcmd5')
+                # the project listing carries lsrcmd5 of expanded links,
+                # the rest is looked up in bulk by resolve_links()
+                lsrcmd5 = si.get('lsrcmd5')
+                node = ET.SubElement(flink, 'package', {'name': package, 'srcmd5': lsrcmd5 or '', 'vrev': si.get('vrev')})
                 if lsrcmd5 is None:
-                    raise Exception("{}/{} is not a link but we expected one".format(FACTORY, package))
-                ET.SubElement(flink, 'package', {'name': package, 'srcmd5': lsrcmd5, 'vrev': si.get('vrev')})
+                    self.unresolved_links[package] = node
                 return None
 
         if package in ['rpmlint-mini-AGGR']:
@@ -108,32 +107,44 @@ class FccFreezer(object):
         ET.SubElement(flink, 'package', {'name': package, 'srcmd5': si.get('srcmd5'), 'vrev': si.get('vrev')})
         return None
 
+    def resolve_links(self):
+        """Fill in the link srcmd5 of packages the project listing left out."""
+        if not self.unresolved_links:
+            return
+        lsrcmd5s = listing.get_link_srcmd5s(self.apiurl, FACTORY, self.unresolved_links.keys())
+        for package, node in self.unresolved_links.items():
+            if package not in lsrcmd5s:
+                raise Exception("{}/{} is not a link but we expected one".format(FACTORY, package))
+            node.set('srcmd5', lsrcmd5s[package])
+        self.unresolved_links = {}
+
     def sources_to_ignore(self, flink):
         ignored_sources = []
+        self.unresolved_links = {}
         os_pkglist = self.get_source_packages(OPENSUSE, True)
         pkglist = self.get_source_packages(FACTORY)
         sle_pkglist = self.get_source_packages(SLE, True)
         bp_pkglist = self.get_source_packages(BACKPORTS)
         factoryfork_pkglist = self.get_source_packages(FACTORYFORK)
 
-        url = makeurl(self.apiurl, ['source', FACTORY], {'view': 'info', 'nofilename': '1'})
-        f = http_GET(url)
-        root = ET.parse(f).getroot()
-
-        ignored_pkgs = []
+        ignored_pkgs = PackageIndex()
         ignored_develprjs = ['KDE:Applications', 'KDE:Qt5', 'devel:languages:haskell', 'devel:kubic', 'KDE:Frameworks5', 'mozilla:Factory', 'KDE:Qt:5.15', 'devel:languages:ruby:extensions', 'security:SELinux', 'devel:languages:rust', 'science:HPC', 'devel:tools:building', 'server:php:extensions', 'devel:CaaSP', 'devel:CaaSP:Head:ControllerNode', 'system:install:head', 'mobile:synchronization:FACTORY', 'X11:Deepin', 'Java:Factory', 'devel:languages:javascript', 'devel:languages:ruby', 'Base:System', 'windows:mingw:win32', 'Java:packages', 'Virtualization:containers:images', 'X11:Pantheon', 'Virtualization:Appliances:Images:openSUSE-Tumbleweed', 'Application:ERP:GNUHealth:Factory', 'devel:languages:python:jupyter', 'devel:languages:python:azure', 'devel:languages:python:aws', 'devel:languages:python', 'Cloud:OpenStack:Factory', 'devel:languages:python:flask', 'devel:languages:python:avocado', 'devel:languages:python:django', 'devel:languages:python:aliyun', 'devel:languages:python:pytest', 'devel:languages:python:pyramid', 'server:monitoring', 'server:monitoring:zabbix','server:monitoring:thruk','server:monitoring:gearman', 'windows:mingw:win64', 'Application:Dochazka', 'devel:languages:python:numeric', 'science:machinelearning', 'Emulators', 'devel:openQA:tested', 'electronics', 'X11:Cinnamon:Factory', 'X11:MATE:Factory', 'X11:LXQt', 'Publishing:TeXLive', 'devel:languages:perl', 'devel:languages:ocaml', 'science', 'devel:languages:python:Factory', 'devel:languages:lua']
 
-        for prj in ignored_develprjs:
-            ignored_pkgs = ignored_pkgs + self.get_source_packages(prj)
+        # one search over Factory's package meta instead of listing every
+        # devel project
+        ignored_pkgs |= devel.packages_developed_in(self.apiurl, FACTORY, ignored_develprjs)
 
-        pending_requests = [r.actions[0].tgt_package for r in self.get_request_list(BACKPORTS)]
-        ignored_pkgs = ignored_pkgs + pending_requests
+        pending_requests = self.get_requested_packages(BACKPORTS)
+        ignored_pkgs |= pending_requests
 
-
-        for si in root.findall('sourceinfo'):
+        # Factory's view=info is the largest listing we read, walk it once
+        # and decide every package as its sourceinfo arrives
+        url = makeurl(self.apiurl, ['source', FACTORY], {'view': 'info', 'nofilename': '1'})
+        for si in xmlstream.iter_elements(http_GET(url), 'sourceinfo'):
             package = self.check_one_source(flink, si, pkglist, os_pkglist, ignored_pkgs, sle_pkglist, bp_pkglist, factoryfork_pkglist)
             if package is not None:
                 ignored_sources.append(str(package))
+        self.resolve_links()
         return ignored_sources
 
     def freeze(self, project):
@@ -167,62 +178,35 @@ class FccFreezer(object):
                                              message=msg)
         return res
 
-    def get_request_list(self, project):
-        return osc.core.get_request_list(self.apiurl, project, req_state=('new', 'review', 'declined', 'revoked'))
+    def get_requested_packages(self, project):
+        """Return the packages with a new, in review, declined or revoked request to project."""
+        return RequestIndex(self.apiurl, project, REQUESTED_STATES).target_packages(REQUESTED_STATES)
 
-    def check_multiple_specfiles(self, project, package):
-        try:
-            url = makeurl(self.apiurl, ['source', project, package], { 'expand': '1' } )
-        except HTTPError as e:
-            if e.code == 404:
-                return None
-            raise e
-        root = ET.fromstring(http_GET(url).read())
-        data = {}
-        linkinfo = root.find('linkinfo')
-        if linkinfo is not None:
-            data['linkinfo'] = linkinfo.attrib['package']
-        else:
-            data['linkinfo'] = None
+    def get_spec_index(self, project):
+        if project not in self.spec_indexes:
+            self.spec_indexes[project] = SpecIndex(self.apiurl, project)
+        return self.spec_indexes[project]
 
-        files = [ entry.get('name').replace('.spec', '') for entry in root.findall('entry') if entry.get('name').endswith('.spec') ]
-        data['specs'] = files
+    def check_multiple_specfiles(self, project, package):
+        data = self.get_spec_index(project).get(package)
+        if data is None:
+            return None
 
-        if len(files) > 1:
+        if len(data['specs']) > 1:
             return data
         else:
             return False
 
+    def get_build_results(self, project):
+        """Return the rolled up standard repository results of `project`, all arches."""
+        if project not in self.build_results:
+            self.build_results[project] = buildresult.get_build_results(self.apiurl, project, 'standard')
+        return self.build_results[project]
+
     def get_build_succeeded_packages(self, project, arch):
-        """Get the build succeeded packages from `from_prj` project.
+        """Get the build succeeded packages from `project` project.
         """
-        buildresult = osc.core.show_prj_results_meta(self.apiurl, REBUILD_PROJECT)
-        root = ET.fromstringlist(buildresult)
-        failed_multibuild_pacs = []
-        pacs = []
-        for node in root.findall('result'):
-            if node.get('repository') == 'standard' and node.get('arch') == arch:
-                for pacnode in node.findall('status'):
-                    if ':' in pacnode.get('package'):
-                        mainpac = pacnode.get('package').split(':')[0]
-                        if pacnode.get('code') not in ['succeeded', 'excluded']:
-                            failed_multibuild_pacs.append(pacnode.get('package'))
-                            if mainpac not in failed_multibuild_pacs:
-                                failed_multibuild_pacs.append(mainpac)
-                            if mainpac in pacs:
-                                pacs.remove(mainpac)
-                        else:
-                            if mainpac in failed_multibuild_pacs:
-                                failed_multibuild_pacs.append(pacnode.get('package'))
-                            elif mainpac not in pacs:
-                                pacs.append(mainpac)
-                        continue
-                    if pacnode.get('code') == 'succeeded':
-                        pacs.append(pacnode.get('package'))
-                    else:
-                        failed_multibuild_pacs.append(pacnode.get('package'))
-
-        return pacs
+        return self.get_build_results(project).succeeded('standard', arch)
 
     def list_pkgs(self):
         """List build succeeded packages"""
@@ -241,9 +225,10 @@ class FccFreezer(object):
             print("Found {} build succeded packages for {}".format(len(succeeded_packages), arch))
 
     def send_updates(self):
-        pending_requests = [r.actions[0].tgt_package for r in self.get_request_list(BACKPORTS)]
+        pending_requests = self.get_requested_packages(BACKPORTS)
         ms_packages = []
         succeeded_packages = self.get_build_succeeded_packages(REBUILD_PROJECT, 'x86_64')
+        self.get_spec_index(FACTORY).prefetch(succeeded_packages)
         for package in sorted(succeeded_packages):
             to_submit = True
 
@@ -305,11 +290,13 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-l', '--list', dest='list_packages', action='store_true', help='list build succeeded packages')
     parser.add_argument('-f', '--freeze', dest='freeze_rebuild', action='store_true', help='update frozenlinks of RebuildFactoryCandidates')
     parser.add_argument('-s', '--submit', dest='submit', action='store_true', help='submit updates from Factory to Backports')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
@@ -3,7 +3,6 @@
 import argparse
 import logging
 import sys
-import time
 
 from urllib.error import HTTPError, URLError
 
@@ -19,6 +18,19 @@ from osclib.core import project_pseudometa_package
 from osc import oscerr
 from osclib.memoize import memoize
 
+from leaplib import buildresult
+from leaplib import devel
+from leaplib import listing
+from leaplib import stats
+from leaplib import throttle
+from leaplib import transport
+from leaplib import watch
+from leaplib import xmlstream
+from leaplib.pkgindex import PackageIndex
+from leaplib.reqindex import RequestIndex
+from leaplib.specindex import SpecIndex
+from leaplib.diff import DiffEngine
+
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP6'
 OPENSUSE = 'openSUSE:Leap:15.6'
 SLE = 'SUSE:SLE-15-SP6:GA'
@@ -26,39 +38,34 @@ REBUILD_PROJECT = '{}:FactoryCandidates'.format(BACKPORTS)
 FACTORYFORK = '{}:FactoryFork'.format(BACKPORTS)
 SUPPORTED_ARCHS = ['x86_64']
 FACTORY = 'openSUSE:Factory'
+# requests that keep a package from being submitted again
+REQUESTED_STATES = ('new', 'review', 'declined', 'revoked')
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FccFreezer(object):
     def __init__(self, freeze_rebuild):
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
         self.freeze_rebuild = freeze_rebuild
+        self.unresolved_links = {}
+        self.build_results = {}
+        self.spec_indexes = {}
+        # spec file -> packages waiting for it to build
+        self.waiting_for = {}
+        self.watcher = None
+        self.limiter = throttle.default_limiter()
+        self.differ = DiffEngine(self.apiurl)
 
     def list_packages(self, project):
-        url = makeurl(self.apiurl, ['source', project])
-        pkglist = []
-
-        root = ET.parse(http_GET(url)).getroot()
-        xmllines = root.findall("./entry")
-        for pkg in xmllines:
-            pkglist.append(pkg.attrib['name'])
-
-        return set(pkglist)
+        return set(listing.get_source_packages(self.apiurl, project))
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def check_one_source(self, flink, si, pkglist, os_pkglist, ignored_pkgs, sle_pkglist, bp_pkglist, factory_srcmd5, bp_srcmd5, factoryfork_pkglist):
         """
@@ -94,13 +101,12 @@ class FccFreezer(object):
 
         for linked in si.findall('linked'):
             if linked.get('project') == FACTORY:
-                url = makeurl(self.apiurl, ['source', FACTORY, package], {'view': 'info', 'nofilename': '1'})
-                f = http_GET(url)
-                proot = ET.parse(f).getroot()
-                lsrcmd5 = proot.get('lsrcmd5')
+                # the project listing carries lsrcmd5 of expanded links,
+                # the rest is looked up in bulk by resolve_links()
+                lsrcmd5 = si.get('lsrcmd5')
+                node = ET.SubElement(flink, 'package', {'name': package, 'srcmd5': lsrcmd5 or '', 'vrev': si.get('vrev')})
                 if lsrcmd5 is None:
-                    raise Exception("{}/{} is not a link but we expected one".format(FACTORY, package))
-                ET.SubElement(flink, 'package', {'name': package, 'srcmd5': lsrcmd5, 'vrev': si.get('vrev')})
+                    self.unresolved_links[package] = node
                 return None
 
         if package in ['rpmlint-mini-AGGR']:
@@ -110,8 +116,20 @@ class FccFreezer(object):
         ET.SubElement(flink, 'package', {'name': package, 'srcmd5': si.get('srcmd5'), 'vrev': si.get('vrev')})
         return None
 
+    def resolve_links(self):
+        """Fill in the link srcmd5 of packages the project listing left out."""
+        if not self.unresolved_links:
+            return
+        lsrcmd5s = listing.get_link_srcmd5s(self.apiurl, FACTORY, self.unresolved_links.keys())
+        for package, node in self.unresolved_links.items():
+            if package not in lsrcmd5s:
+                raise Exception("{}/{} is not a link but we expected one".format(FACTORY, package))
+            node.set('srcmd5', lsrcmd5s[package])
+        self.unresolved_links = {}
+
     def sources_to_ignore(self, flink):
         ignored_sources = []
+        self.unresolved_links = {}
         os_pkglist = self.get_source_packages(OPENSUSE, True)
         pkglist = self.get_source_packages(FACTORY)
         sle_pkglist = self.get_source_packages(SLE, True)
@@ -120,29 +138,26 @@ class FccFreezer(object):
         factory_srcmd5 = {}
         bp_srcmd5 = {}
 
-        url = makeurl(self.apiurl, ['source', FACTORY], {'view': 'info', 'nofilename': '1'})
-        f = http_GET(url)
-        root = ET.parse(f).getroot()
-
-        for si in root.findall('sourceinfo'):
-            factory_srcmd5[si.get('package')] = [si.get('verifymd5')]
-
         url = makeurl(self.apiurl, ['source', BACKPORTS], {'view': 'info', 'nofilename': '1'})
-        f = http_GET(url)
-        root2 = ET.parse(f).getroot()
-        for si in root2.findall('sourceinfo'):
+        for si in xmlstream.iter_elements(http_GET(url), 'sourceinfo'):
             bp_srcmd5[si.get('package')] = [si.get('verifymd5')]
 
-        ignored_pkgs = []
+        ignored_pkgs = PackageIndex()
         ignored_develprjs = ['KDE:Applications', 'KDE:Qt5', 'devel:languages:haskell', 'devel:kubic', 'KDE:Frameworks5', 'mozilla:Factory', 'KDE:Qt:5.15', 'devel:languages:ruby:extensions', 'security:SELinux', 'devel:languages:rust', 'science:HPC', 'devel:tools:building', 'server:php:extensions', 'devel:CaaSP', 'devel:CaaSP:Head:ControllerNode', 'system:install:head', 'mobile:synchronization:FACTORY', 'Java:Factory', 'devel:languages:javascript', 'devel:languages:ruby', 'Base:System', 'windows:mingw:win32', 'Java:packages', 'Virtualization:containers:images', 'X11:Pantheon', 'Virtualization:Appliances:Images:openSUSE-Tumbleweed', 'Application:ERP:GNUHealth:Factory', 'devel:languages:python:jupyter', 'devel:languages:python:azure', 'devel:languages:python:aws', 'Cloud:OpenStack:Factory', 'devel:languages:python:flask', 'devel:languages:python:avocado', 'devel:languages:python:django', 'devel:languages:python:aliyun', 'devel:languages:python:pytest', 'devel:languages:python:pyramid', 'server:monitoring', 'server:monitoring:zabbix','server:monitoring:thruk','server:monitoring:gearman', 'windows:mingw:win64', 'Application:Dochazka', 'devel:languages:python:numeric', 'science:machinelearning', 'Emulators', 'devel:openQA:tested', 'electronics', 'Publishing:TeXLive', 'devel:languages:python', 'devel:languages:lua', 'devel:languages:ocaml', 'X11:Cinnamon:Factory', 'devel:gcc']
 
-        for prj in ignored_develprjs:
-            ignored_pkgs = ignored_pkgs + self.get_source_packages(prj)
+        # one search over Factory's package meta instead of listing every
+        # devel project
+        ignored_pkgs |= devel.packages_developed_in(self.apiurl, FACTORY, ignored_develprjs)
 
-        for si in root.findall('sourceinfo'):
+        # Factory's view=info is the largest listing we read, walk it once
+        # and decide every package as its sourceinfo arrives
+        url = makeurl(self.apiurl, ['source', FACTORY], {'view': 'info', 'nofilename': '1'})
+        for si in xmlstream.iter_elements(http_GET(url), 'sourceinfo'):
+            factory_srcmd5[si.get('package')] = [si.get('verifymd5')]
             package = self.check_one_source(flink, si, pkglist, os_pkglist, ignored_pkgs, sle_pkglist, bp_pkglist, factory_srcmd5, bp_srcmd5, factoryfork_pkglist)
             if package is not None:
                 ignored_sources.append(str(package))
+        self.resolve_links()
         return ignored_sources
 
     def freeze(self, project):
@@ -165,24 +180,12 @@ class FccFreezer(object):
         except HTTPError as e:
             raise e
 
-    def has_diff(self, project, package, target_prj, target_pkg):                                                                                 
-        # if package does not exist in taget project return True
-        if not self.item_exists(target_prj, target_pkg):
+    def has_diff(self, project, package, target_prj, target_pkg):
+        # if package does not exist in taget project return True, the
+        # listing misses packages inherited through a project link
+        if not self.differ.exists(target_prj, target_pkg) and not self.item_exists(target_prj, target_pkg):
             return True
-        changes_file = package + ".changes"
-        query = {'cmd': 'diff',
-                 'view': 'xml',
-                 'file': changes_file,
-                 'oproject': project,
-                 'opackage': package}
-        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
-        root = ET.parse(http_POST(u)).getroot()
-        if root:
-            # check if it has diff element
-            diffs = root.findall('files/file/diff')
-            if diffs:
-                return True
-        return False
+        return self.differ.has_diff(project, package, target_prj, target_pkg)
 
     def item_exists(self, project, package=None):
         """
@@ -207,70 +210,44 @@ class FccFreezer(object):
         msg = ("Automatically create request by update submitter."
                "This is going to update package to %s from %s."
                "Please review this change and decline it if Leap do not need it." % (dst_project, src_project))
-        res = osc.core.create_submit_request(self.apiurl,
-                                             src_project,
-                                             package,
-                                             dst_project,
-                                             package,
-                                             message=msg)
+        res = self.limiter.call_once(osc.core.create_submit_request,
+                                     self.apiurl,
+                                     src_project,
+                                     package,
+                                     dst_project,
+                                     package,
+                                     message=msg)
         return res
 
-    def get_request_list(self, project):
-        return osc.core.get_request_list(self.apiurl, project, req_state=('new', 'review', 'declined', 'revoked'))
+    def get_requested_packages(self, project):
+        """Return the packages with a new, in review, declined or revoked request to project."""
+        return RequestIndex(self.apiurl, project, REQUESTED_STATES).target_packages(REQUESTED_STATES)
 
-    def check_multiple_specfiles(self, project, package):
-        try:
-            url = makeurl(self.apiurl, ['source', project, package], { 'expand': '1' } )
-        except HTTPError as e:
-            if e.code == 404:
-                return None
-            raise e
-        root = ET.fromstring(http_GET(url).read())
-        data = {}
-        linkinfo = root.find('linkinfo')
-        if linkinfo is not None:
-            data['linkinfo'] = linkinfo.attrib['package']
-        else:
-            data['linkinfo'] = None
+    def get_spec_index(self, project):
+        if project not in self.spec_indexes:
+            self.spec_indexes[project] = SpecIndex(self.apiurl, project)
+        return self.spec_indexes[project]
 
-        files = [ entry.get('name').replace('.spec', '') for entry in root.findall('entry') if entry.get('name').endswith('.spec') ]
-        data['specs'] = files
+    def check_multiple_specfiles(self, project, package):
+        data = self.get_spec_index(project).get(package)
+        if data is None:
+            return None
 
-        if len(files) > 1:
+        if len(data['specs']) > 1:
             return data
         else:
             return False
 
+    def get_build_results(self, project):
+        """Return the rolled up standard repository results of `project`, all arches."""
+        if project not in self.build_results:
+            self.build_results[project] = buildresult.get_build_results(self.apiurl, project, 'standard')
+        return self.build_results[project]
+
     def get_build_succeeded_packages(self, project, arch):
-        """Get the build succeeded packages from `from_prj` project.
+        """Get the build succeeded packages from `project` project.
         """
-        buildresult = osc.core.show_prj_results_meta(self.apiurl, REBUILD_PROJECT)
-        root = ET.fromstringlist(buildresult)
-        failed_multibuild_pacs = []
-        pacs = []
-        for node in root.findall('result'):
-            if node.get('repository') == 'standard' and node.get('arch') == arch:
-                for pacnode in node.findall('status'):
-                    if ':' in pacnode.get('package'):
-                        mainpac = pacnode.get('package').split(':')[0]
-                        if pacnode.get('code') not in ['succeeded', 'excluded']:
-                            failed_multibuild_pacs.append(pacnode.get('package'))
-                            if mainpac not in failed_multibuild_pacs:
-                                failed_multibuild_pacs.append(mainpac)
-                            if mainpac in pacs:
-                                pacs.remove(mainpac)
-                        else:
-                            if mainpac in failed_multibuild_pacs:
-                                failed_multibuild_pacs.append(pacnode.get('package'))
-                            elif mainpac not in pacs:
-                                pacs.append(mainpac)
-                        continue
-                    if pacnode.get('code') == 'succeeded':
-                        pacs.append(pacnode.get('package'))
-                    else:
-                        failed_multibuild_pacs.append(pacnode.get('package'))
-
-        return pacs
+        return self.get_build_results(project).succeeded('standard', arch)
 
     def list_pkgs(self):
         """List build succeeded packages"""
@@ -288,11 +265,21 @@ class FccFreezer(object):
             print('-------------------------------------')
             print("Found {} build succeded packages for {}".format(len(succeeded_packages), arch))
 
-    def send_updates(self):
-        pending_requests = [r.actions[0].tgt_package for r in self.get_request_list(BACKPORTS)]
+    def send_updates(self, packages=None, succeeded_packages=None):
+        """
+        Submit the build succeeded packages of FactoryCandidates to Backports,
+        only `packages` of them if given. Return the multi-spec packages skipped.
+        """
+        pending_requests = self.get_requested_packages(BACKPORTS)
         ms_packages = []
-        succeeded_packages = self.get_build_succeeded_packages(REBUILD_PROJECT, 'x86_64')
-        for package in sorted(succeeded_packages):
+        if succeeded_packages is None:
+            succeeded_packages = self.get_build_succeeded_packages(REBUILD_PROJECT, 'x86_64')
+        if packages is None:
+            packages = succeeded_packages
+        self.get_spec_index(FACTORY).prefetch(packages)
+        self.differ.prefetch([(FACTORY, package, BACKPORTS, package) for package in packages
+                              if package not in pending_requests])
+        for package in sorted(packages):
             to_submit = True
 
             multi_specs = self.check_multiple_specfiles(FACTORY, package)
@@ -309,6 +296,7 @@ class FccFreezer(object):
                 for spec in multi_specs['specs']:
                     if spec not in succeeded_packages:
                         logging.debug('%s is sub-pacakge of %s but build failed, skip it!' % (spec, package))
+                        self.waiting_for.setdefault(spec, set()).add(package)
                         to_submit = False
 
             if not to_submit:
@@ -322,8 +310,10 @@ class FccFreezer(object):
                     logging.error('Error occurred when creating submit request for %s' % package)
             else:
                 logging.info('%s has a pending submission on %s or it has been declined/revoked, skip!' % (package, BACKPORTS))
-            time.sleep(5)
 
+        return ms_packages
+
+    def print_multispec(self, ms_packages):
         # dump multi specs packages
         print("Multi-specfile packages:")
         if len(ms_packages) > 0:
@@ -332,6 +322,25 @@ class FccFreezer(object):
         else:
             print('None')
 
+    def submit_succeeded(self, packages):
+        """Submit packages that just finished building, with fresh sources."""
+        succeeded_packages = self.watcher.succeeded()
+        # packages held back for a spec file that has built now
+        for package in list(packages):
+            packages |= self.waiting_for.pop(package, set()) & succeeded_packages
+        logging.info('%d packages newly succeeded in %s' % (len(packages), REBUILD_PROJECT))
+
+        self.differ.refresh(FACTORY, packages)
+        self.differ.refresh(BACKPORTS, packages)
+        self.get_spec_index(FACTORY).refresh(packages)
+        for package in self.send_updates(packages, succeeded_packages):
+            logging.info('%s is a multi-specfile package, skipped' % package)
+
+    def watch(self, source):
+        """Submit packages of FactoryCandidates as soon as they built."""
+        self.watcher = watch.Watcher(source, 'standard', 'x86_64')
+        self.watcher.run(self.submit_succeeded)
+
 
 def main(args):
     # Configure OSC
@@ -341,8 +350,14 @@ def main(args):
     freezer = FccFreezer(args.freeze_rebuild)
     if args.list_packages:
         freezer.list_pkgs()
+    elif args.watch:
+        if args.poll_interval:
+            source = watch.PollSource(freezer.apiurl, REBUILD_PROJECT, 'standard', 'x86_64', args.poll_interval)
+        else:
+            source = watch.LongPollSource(freezer.apiurl, REBUILD_PROJECT, 'standard', 'x86_64')
+        freezer.watch(source)
     elif args.submit:
-        freezer.send_updates()
+        freezer.print_multispec(freezer.send_updates())
     elif args.freeze_rebuild:
         freezer.freeze(REBUILD_PROJECT)
 
@@ -352,11 +367,17 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-l', '--list', dest='list_packages', action='store_true', help='list build succeeded packages')
     parser.add_argument('-f', '--freeze', dest='freeze_rebuild', action='store_true', help='update frozenlinks of RebuildFactoryCandidates')
     parser.add_argument('-s', '--submit', dest='submit', action='store_true', help='submit updates from Factory to Backports')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='keep running and submit packages as soon as they built in FactoryCandidates')
+    parser.add_argument('--poll-interval', type=int, metavar='SECONDS',
+                        help='with --watch, fetch the build results every SECONDS instead of long-polling')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
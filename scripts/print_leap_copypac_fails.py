@@ -13,6 +13,11 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+from leaplib.diff import DiffEngine
+
 OPENSUSE = 'openSUSE:Leap:15.4'
 FACTORY = 'openSUSE:Factory'
 OPENSUSE_UPDATE = 'openSUSE:Leap:15.3:Update'
@@ -20,9 +25,9 @@ BACKPORTS = 'openSUSE:Backports:SLE-15-SP4'
 SLE = 'SUSE:SLE-15-SP4:GA'
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindSLE(object):
     def __init__(self, project, verbose):
@@ -30,17 +35,11 @@ class FindSLE(object):
         self.verbose = verbose
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.differ = DiffEngine(self.apiurl)
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def item_exists(self, project, package=None):
         """
@@ -60,24 +59,12 @@ class FindSLE(object):
         return True
 
     def has_diff(self, project, package, target_prj, target_pkg):
-        changes_file = package + ".changes"
-        query = {'cmd': 'diff',
-                 'view': 'xml',
-                 'file': changes_file,
-                 'oproject': project,
-                 'opackage': package}
-        u = makeurl(self.apiurl, ['source', target_prj, target_pkg], query=query)
         try:
-            root = ET.parse(http_POST(u)).getroot()
+            return self.differ.has_diff(project, package, target_prj, target_pkg)
         except HTTPError as e:
             if e.code == 404:
                 return False
-        if root:
-            # check if it has diff element
-            diffs = root.findall('files/file/diff')
-            if diffs:
-                return True
-        return False
+            raise e
 
     def get_prj_results(self, prj, arch, code='failed'):
         url = makeurl(self.apiurl, ['build', prj, "_result?arch=x86_64&repository=standard&view=status"])
@@ -109,8 +96,10 @@ class FindSLE(object):
         nodiffs = []
         deletes = []
 
-        cands = set(leap_pkglist) - set(bp_pkglist)
-        for pkg in list(cands):
+        cands = leap_pkglist - bp_pkglist
+        self.differ.prefetch([(FACTORY, pkg, OPENSUSE, pkg) for pkg in cands
+                              if pkg not in sle_pkglist and pkg not in rebuild_pkglist])
+        for pkg in cands:
             if pkg in sle_pkglist or pkg in rebuild_pkglist:
                 continue
             if self.has_diff(FACTORY, pkg, OPENSUSE, pkg):
@@ -134,12 +123,14 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the target project where do submit to')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='show the diff')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
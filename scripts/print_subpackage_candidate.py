@@ -1,40 +1,70 @@
 #!/usr/bin/python3
 
-import repomd
+import argparse
+import logging
+import sys
 
-# Get Leap released binary packages
-repo = repomd.load('http://download.opensuse.org/distribution/leap/15.6/repo/oss/')
+from leaplib import pkglist
+from leaplib import repodata
 
-packages = {}
+# Leap released binary packages
+REPO = 'http://download.opensuse.org/distribution/leap/15.6/repo/oss/'
 
-for p in repo:
-    if p.arch not in packages:
-        packages[p.arch] = []
-    if p.name not in packages[p.arch] and '-bp156.' not in p.nevr and '-lp156.' not in p.nevr:
-        packages[p.arch].append(p.name)
-
-# The extracted SLE15 released packages from rpmlint-backports-data
+# The extracted SLE15 released packages from rpmlint-backports-data, as
+# text or packed with leaplib.pkglist
 FILES = ['sle-product-packages-x86_64', 'sle-product-packages-aarch64',
         'sle-product-packages-ppc64le', 'sle-product-packages-s390x']
 
-for file in FILES:
-    finput = open(file, 'r')
 
-    while True:
-        line = finput.readline()
+def built_in_leap(name, arch, epoch, version, release):
+    """Return true for packages built in Backports or Leap rather than taken from SLE."""
+    return release.startswith('bp156.') or release.startswith('lp156.')
+
+
+def read_names(file):
+    names = set()
+    for section in pkglist.read(file).values():
+        names.update(section)
+    return names
+
+
+def main(args):
+    packages = repodata.names_by_arch(args.repo, skip=built_in_leap)
+
+    for file in FILES:
+        sle_packages = read_names(file)
+        arch = file.split('-')[3]
+        if arch in packages:
+            packages[arch] -= sle_packages
+        if 'noarch' in packages:
+            packages['noarch'] -= sle_packages
+
+    candidates = dict((arch, sorted(packages[arch])) for arch in packages)
+    if args.compare:
+        # what changed since an earlier list, like diff -u of the two
+        for line in pkglist.unified_diff(pkglist.read(args.compare), candidates,
+                                         pkglist.file_label(args.compare), 'candidates'):
+            print(line)
+        return
+
+    for line in pkglist.text_lines(candidates):
+        print(line)
+
 
-        if not line:
-            break
-        if line.strip() in packages[file.split('-')[3]]:
-            packages[file.split('-')[3]].remove(line.strip())
-        if line.strip() in packages['noarch']:
-            packages['noarch'].remove(line.strip())
+if __name__ == '__main__':
+    description = 'List Leap binary packages that SLE does not ship'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='print info useful for debuging')
+    parser.add_argument('-r', '--repo', metavar='REPO', default=REPO,
+                        help='repository URL, local repository directory or primary.xml file (default: %(default)s)')
+    parser.add_argument('-c', '--compare', metavar='FILE',
+                        help='print what changed since an earlier candidate list (text or packed) instead of the list')
 
-    finput.close()
+    args = parser.parse_args()
 
-for arch in packages:
-    print("=== %s ===" % arch)
-    for pkg in sorted(packages[arch]):
-        print(pkg)
-    print("\n")
+    # Set logging configuration
+    logging.basicConfig(level=logging.DEBUG if args.debug
+                        else logging.INFO)
 
+    sys.exit(main(args))
@@ -13,16 +13,23 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+from leaplib.pkgindex import IncidentIndex
+
 OPENSUSE = 'openSUSE:Leap:15.6'
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP6'
 SLE = 'SUSE:SLE-15-SP4:GA'
 SLE15SP6 = 'SUSE:SLE-15-SP6:GA'
 SLE_PY311 = 'SUSE:SLE-15-SP4:Update'
+PY311_INCIDENTS = ('30661', '30963')
+PYRENAME_INCIDENTS = ('29613',)
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindBP(object):
     def __init__(self, project, verbose, identical):
@@ -34,14 +41,7 @@ class FindBP(object):
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def item_exists(self, project, package=None):
         """
@@ -97,26 +97,11 @@ class FindBP(object):
         slega_pkglist = self.get_source_packages(SLE, True)
         sle_pkglist = self.get_source_packages(SLE_PY311)
         bp_pkglist = self.get_source_packages(BACKPORTS)
-        py311_pkglist = []
-        pyrenamed_pkglist = []
+        incidents = IncidentIndex(sle_pkglist)
         # PSP maint incident number: 3.6 to 3.11
-        # 30661
-        # 30963
-        for pkg in sle_pkglist:
-            if pkg.endswith('.30661') and not pkg.startswith('patchinfo') and pkg.startswith('python'):
-                if pkg.replace('.30661','') not in py311_pkglist:
-                    py311_pkglist.append(pkg.replace('.30661',''))
-
-            if pkg.endswith('.30963') and not pkg.startswith('patchinfo') and pkg.startswith('python'):
-                if pkg.replace('.30963','') not in py311_pkglist:
-                    py311_pkglist.append(pkg.replace('.30963',''))
-
+        py311_pkglist = [pkg for pkg in incidents.packages(PY311_INCIDENTS) if pkg.startswith('python')]
         # PSP maint incident number: 3.6 rename to python3-FOO
-        # 29613
-        for pkg in sle_pkglist:
-            if pkg.endswith('.29613') and not pkg.startswith('patchinfo') and pkg.startswith('python'):
-                if pkg.replace('.29613', '') not in pyrenamed_pkglist:
-                    pyrenamed_pkglist.append(pkg.replace('.29613', ''))
+        pyrenamed_pkglist = [pkg for pkg in incidents.packages(PYRENAME_INCIDENTS) if pkg.startswith('python')]
 
         #for pkg in py311_pkglist:
         #    o_prj, o_pkg = self.origin_metadata_get(SLE, pkg)
@@ -146,6 +131,7 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
@@ -155,6 +141,7 @@ if __name__ == '__main__':
                         help='show the diff')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug
@@ -13,16 +13,24 @@ import osc.core
 
 from osc import oscerr
 
+from leaplib import listing
+from leaplib import stats
+from leaplib import transport
+from leaplib.linkgraph import LinkGraph
+from leaplib.pkgindex import IncidentIndex
+
 OPENSUSE = 'openSUSE:Leap:15.6'
 BACKPORTS = 'openSUSE:Backports:SLE-15-SP6'
 SLE = 'SUSE:SLE-15-SP4:GA'
 SLE15SP6 = 'SUSE:SLE-15-SP6:GA'
 SLE_PY311 = 'SUSE:SLE-15-SP4:Update'
+# PSP maint incident numbers
+PY311_INCIDENTS = ('33743', '33463', '33600', '33601', '34006')
 
 makeurl = osc.core.makeurl
-http_GET = osc.core.http_GET
-http_POST = osc.core.http_POST
-http_PUT = osc.core.http_PUT
+http_GET = transport.http_GET
+http_POST = transport.http_POST
+http_PUT = transport.http_PUT
 
 class FindBP(object):
     def __init__(self, project, verbose, identical):
@@ -31,17 +39,11 @@ class FindBP(object):
         self.identical = identical
         self.apiurl = osc.conf.config['apiurl']
         self.debug = osc.conf.config['debug']
+        self.links = LinkGraph(self.apiurl)
 
     def get_source_packages(self, project, expand=False):
         """Return the list of packages in a project."""
-        query = {}
-        if expand:
-            query['expand'] = 1
-        root = ET.parse(http_GET(makeurl(self.apiurl, ['source', project],
-                                 query=query))).getroot()
-        packages = [i.get('name') for i in root.findall('entry')]
-
-        return packages
+        return listing.get_source_packages(self.apiurl, project, expand=expand)
 
     def item_exists(self, project, package=None):
         """
@@ -73,22 +75,11 @@ class FindBP(object):
                 return True
         return False
 
-    def origin_metadata_get(self, project, package):
-        meta = ET.fromstringlist(osc.core.show_package_meta(self.apiurl, project, package))
-        if meta is not None:
-            return meta.get('project'), meta.get('name')
-
-        return None, None
-
     def get_linkinfo(self, project, package):
-        query = {'withlinked': 1}
-        u = makeurl(self.apiurl, ['source', project, package], query=query)
-        root = ET.parse(http_GET(u)).getroot()
-        links = root.findall('linkinfo/linked')
-
-        for linked in links:
-            if linked.get('project') == project:
-                return linked.get('package')
+        """Return the first package of the link chain of `package` that lives in `project` itself."""
+        for prj, pkg in self.links.chain(project, package)[1:]:
+            if prj == project:
+                return pkg
         return package
 
     def crawl(self):
@@ -97,52 +88,20 @@ class FindBP(object):
         slega_pkglist = self.get_source_packages(SLE, True)
         sle_pkglist = self.get_source_packages(SLE_PY311)
         bp_pkglist = self.get_source_packages(BACKPORTS)
-        py311_pkglist = []
-        # PSP maint incident number
-        # 30661
-        # 30963
-        # 32605
-        # 33743
-        # 33463
-        # 33600
-        # 33601
-        cand_list = []
-        finput = open('43521', 'r')
-
-        while True:
-            line = finput.readline()                                                                                                                  
-
-            if not line:
-                break
-            if line.strip() not in cand_list:
-                cand_list.append(line.strip())
-
-        finput.close()
-
-        for pkg in sle_pkglist:
-            if pkg.endswith('.33743') and not pkg.startswith('patchinfo') and pkg.replace('.33743', '') in slega_pkglist:
-                if pkg.replace('.33743','') not in py311_pkglist and pkg.replace('.33743','') in cand_list:
-                    cand_list.remove(pkg.replace('.33743',''))
-                    py311_pkglist.append(pkg.replace('.33743',''))
-            if pkg.endswith('.33463') and not pkg.startswith('patchinfo') and pkg.replace('.33463', '') in slega_pkglist:
-                if pkg.replace('.33463','') not in py311_pkglist and pkg.replace('.33463','') in cand_list:
-                    cand_list.remove(pkg.replace('.33463',''))
-                    py311_pkglist.append(pkg.replace('.33463',''))
-            if pkg.endswith('.33600') and not pkg.startswith('patchinfo') and pkg.replace('.33600', '') in slega_pkglist:
-                if pkg.replace('.33600','') not in py311_pkglist and pkg.replace('.33600','') in cand_list:
-                    cand_list.remove(pkg.replace('.33600',''))
-                    py311_pkglist.append(pkg.replace('.33600',''))
-            if pkg.endswith('.33601') and not pkg.startswith('patchinfo') and pkg.replace('.33601', '') in slega_pkglist:
-                if pkg.replace('.33601','') not in py311_pkglist and pkg.replace('.33601','') in cand_list:
-                    cand_list.remove(pkg.replace('.33601',''))
-                    py311_pkglist.append(pkg.replace('.33601',''))
-            if pkg.endswith('.34006') and not pkg.startswith('patchinfo') and pkg.replace('.34006', '') in slega_pkglist:
-                if pkg.replace('.34006','') not in py311_pkglist and pkg.replace('.34006','') in cand_list:
-                    cand_list.remove(pkg.replace('.34006',''))
-                    py311_pkglist.append(pkg.replace('.34006',''))
-
+        with open('43521', 'r') as finput:
+            cand_list = list(dict.fromkeys(line.strip() for line in finput))
+
+        # candidates released by one of the PSP incidents, in listing order
+        incidents = IncidentIndex(sle_pkglist)
+        released = set(incidents.matching(cand_list, PY311_INCIDENTS))
+        py311_pkglist = [pkg for pkg in incidents.packages(PY311_INCIDENTS)
+                         if pkg in released and pkg in slega_pkglist]
+        found = set(py311_pkglist)
+        cand_list = [pkg for pkg in cand_list if pkg not in found]
+
+        self.links.prefetch(SLE, py311_pkglist)
         for pkg in py311_pkglist:
-            o_prj, o_pkg = self.origin_metadata_get(SLE, pkg)
+            o_prj, o_pkg = self.links.origin(SLE, pkg)
             if o_prj.endswith(':Update'):
                 o_pkg = self.get_linkinfo(o_prj, o_pkg)
             print("%s_%s" % (o_prj, o_pkg))
@@ -163,6 +122,7 @@ if __name__ == '__main__':
     parser.add_argument('-A', '--apiurl', metavar='URL', help='API URL')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='print info useful for debuging')
+    stats.add_arguments(parser)
     parser.add_argument('-p', '--project', dest='project', metavar='PROJECT',
                         help='the project where to check (default: %s)' % OPENSUSE,
                         default=OPENSUSE)
@@ -172,6 +132,7 @@ if __name__ == '__main__':
                         help='show the diff')
 
     args = parser.parse_args()
+    stats.setup(args)
 
     # Set logging configuration
     logging.basicConfig(level=logging.DEBUG if args.debug